@@ -0,0 +1,140 @@
+"""
+Delivery acknowledgements.
+Both ends acknowledge chat cumulatively: a client acks the highest host
+sequence number it has taken in, and the host acks how many of the
+client's CHAT frames it has handled, listing any it dropped. The sender
+keeps what it sent in an AckWindow until it is acknowledged; a full
+window stops further chat to that peer until acks free it, so a peer that
+falls behind is held back at the sender instead of in socket buffers.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+# Unacknowledged messages in flight to one peer, unless the peer asks for another size
+DEFAULT_WINDOW = 64
+# Largest window a peer may ask for
+MAX_WINDOW = 1024
+
+
+class AckWindow:
+    """Messages sent to one peer and not acknowledged yet, oldest first."""
+    
+    def __init__(self, size=DEFAULT_WINDOW):
+        """
+        Args:
+            size: Most messages in flight before sending stops
+        """
+        self.size = size
+        self.lock = threading.Lock()
+        self.unacked = deque()  # (position, time sent, item)
+        self.held = 0  # messages waiting for room (see try_send)
+        self.acked = 0
+        self.last_ack = time.monotonic()  # time of the last ack, or of creation
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+    
+    def full(self):
+        return len(self.unacked) >= self.size
+    
+    def sent(self, position, item=None):
+        """Record a message as sent.
+        
+        Args:
+            position: Position the peer will acknowledge it by
+            item: Anything to hand back when it is acknowledged (optional)
+        """
+        with self.lock:
+            self.unacked.append((position, time.monotonic(), item))
+    
+    def try_send(self, position):
+        """Record a message as sent if there is room and nothing is held.
+        
+        Otherwise the message counts as held, and the sender must keep it
+        until an ack reports held messages and try_release() admits it.
+        
+        Returns:
+            bool: True if the message may be sent now
+        """
+        with self.lock:
+            if self.held or len(self.unacked) >= self.size:
+                self.held += 1
+                return False
+            self.unacked.append((position, time.monotonic(), None))
+            return True
+    
+    def try_release(self, position):
+        """Record the oldest held message as sent if there is room.
+        
+        Returns:
+            bool: True if the message may be sent now
+        """
+        with self.lock:
+            if len(self.unacked) >= self.size:
+                return False
+            self.held -= 1
+            self.unacked.append((position, time.monotonic(), None))
+            return True
+    
+    def drop_held(self):
+        """Forget the held messages the sender gave up on."""
+        with self.lock:
+            self.held = 0
+    
+    def ack(self, position):
+        """Acknowledge every message up to a position.
+        
+        Args:
+            position: Cumulative position acknowledged by the peer
+        
+        Returns:
+            tuple: (list of acknowledged (position, item) pairs, whether
+                messages are held)
+        """
+        now = time.monotonic()
+        acked = []
+        with self.lock:
+            self.last_ack = now
+            while self.unacked and self.unacked[0][0] <= position:
+                sent_position, sent_at, item = self.unacked.popleft()
+                latency = now - sent_at
+                self.acked += 1
+                self.latency_total += latency
+                if latency > self.latency_max:
+                    self.latency_max = latency
+                acked.append((sent_position, item))
+            return acked, self.held > 0
+    
+    def clear(self):
+        """Give up on every unacknowledged message.
+        
+        Returns:
+            list: Items of the messages that were never acknowledged
+        """
+        with self.lock:
+            items = [item for position, sent_at, item in self.unacked]
+            self.unacked.clear()
+            self.held = 0
+        return items
+    
+    @property
+    def outstanding(self):
+        return len(self.unacked)
+    
+    def summary(self):
+        """Return acknowledgement statistics.
+        
+        Returns:
+            dict: outstanding and held messages, acked count, and mean/max
+                ack latency in seconds
+        """
+        with self.lock:
+            return {
+                "outstanding": len(self.unacked),
+                "held": self.held,
+                "acked": self.acked,
+                "mean_latency": self.latency_total / self.acked if self.acked else 0.0,
+                "max_latency": self.latency_max,
+            }
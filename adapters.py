@@ -0,0 +1,182 @@
+"""
+Local radios the host listens on.
+Each Adapter owns one transport endpoint: a Bluetooth adapter, or a
+loopback endpoint standing in for one. The host accepts on every adapter
+at once and shares one message store and broadcast domain between them;
+an adapter only limits how many peers it carries and meters the bytes
+they move, so throughput can be reported per radio.
+
+Peers are balanced by load: an adapter only admits a connection while no
+other adapter of the host carries fewer peers, so a client trying the
+host's adapters in turn ends up on one of the least loaded.
+"""
+
+import threading
+import time
+
+
+# Active connections one Bluetooth Classic radio can keep (one piconet)
+DEFAULT_CAPACITY = 7
+
+
+class AdapterStats:
+    """Traffic counters of one adapter."""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections = 0  # connections admitted
+        self.refused = 0  # connections turned away while full
+        self.redirected = 0  # connections turned away for a less loaded adapter
+        self.sampled = (self.started, 0, 0)  # (time, bytes in, bytes out) at the last sample
+    
+    def add(self, bytes_in=0, bytes_out=0):
+        with self.lock:
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+    
+    def sample(self):
+        """Return the traffic rates since the previous sample.
+        
+        Returns:
+            tuple: (bytes/s in, bytes/s out, seconds covered)
+        """
+        now = time.monotonic()
+        with self.lock:
+            last, last_in, last_out = self.sampled
+            self.sampled = (now, self.bytes_in, self.bytes_out)
+            bytes_in, bytes_out = self.bytes_in - last_in, self.bytes_out - last_out
+        elapsed = now - last
+        if elapsed <= 0:
+            return 0.0, 0.0, 0.0
+        return bytes_in / elapsed, bytes_out / elapsed, elapsed
+
+
+class Adapter:
+    """One listening endpoint of the host and the peers connected through it."""
+    
+    def __init__(self, transport, name=None, capacity=DEFAULT_CAPACITY):
+        """
+        Args:
+            transport: Endpoint to listen on (BluetoothTransport, LoopbackTransport, ...)
+            name: Label for status output (default: the transport's address)
+            capacity: Most peers connected at once (None for no limit)
+        """
+        self.transport = transport
+        self.label = name
+        self.capacity = capacity
+        self.stats = AdapterStats()
+        self.server_socket = None
+        self.peers = 0
+        self.lock = threading.Lock()
+        self.group = [self]  # adapters sharing the host's peers, set by the host
+    
+    def listen(self, backlog=5):
+        """Open the transport's server socket.
+        
+        Returns:
+            Listening socket
+        """
+        self.server_socket = self.transport.listen(backlog)
+        return self.server_socket
+    
+    def accept(self):
+        """Wait for a connection.
+        
+        A connection beyond the adapter's capacity, or one arriving while
+        another adapter in the group carries fewer peers, is closed at
+        once, so the client can try another of the host's adapters.
+        
+        Returns:
+            tuple: (MeteredSocket, client address), with None in place of
+                the socket if the connection was refused
+        """
+        client_socket, client_info = self.transport.accept(self.server_socket)
+        with self.lock:
+            full = self.full
+            busier = self.peers > min(adapter.peers for adapter in self.group)
+            admitted = not full and not busier
+            if admitted:
+                self.peers += 1
+        with self.stats.lock:
+            if admitted:
+                self.stats.connections += 1
+            elif full:
+                self.stats.refused += 1
+            else:
+                self.stats.redirected += 1
+        if admitted:
+            return MeteredSocket(client_socket, self), client_info
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+        return None, client_info
+    
+    def release(self):
+        """Free the slot of a peer that disconnected."""
+        with self.lock:
+            self.peers -= 1
+    
+    @property
+    def full(self):
+        """Whether the adapter carries as many peers as it can take."""
+        return self.capacity is not None and self.peers >= self.capacity
+    
+    @property
+    def name(self):
+        return self.label or _describe(self.transport)
+    
+    def close(self):
+        """Stop listening."""
+        if self.server_socket:
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+
+
+class MeteredSocket:
+    """Socket wrapper that counts a connection's bytes against its adapter.
+    
+    Closing it frees the peer's slot on the adapter. Anything other than
+    recv, sendall and close is passed through to the wrapped socket.
+    """
+    
+    def __init__(self, sock, adapter):
+        self.sock = sock
+        self.adapter = adapter
+        self.closed = False
+        self.close_lock = threading.Lock()
+    
+    def recv(self, bufsize):
+        data = self.sock.recv(bufsize)
+        self.adapter.stats.add(bytes_in=len(data))
+        return data
+    
+    def sendall(self, data):
+        self.sock.sendall(data)
+        self.adapter.stats.add(bytes_out=len(data))
+    
+    def close(self):
+        with self.close_lock:
+            first, self.closed = not self.closed, True
+        if first:
+            self.adapter.release()
+        self.sock.close()
+    
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def _describe(transport):
+    """Return a short label for a transport's local endpoint."""
+    transport = getattr(transport, "inner", transport)  # emulated links
+    address = getattr(transport, "address", None)
+    if address is not None:
+        return address or "default adapter"
+    if hasattr(transport, "host"):
+        return f"{transport.host}:{transport.port}"
+    return type(transport).__name__
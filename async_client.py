@@ -0,0 +1,768 @@
+"""
+Asyncio client API for bots, automation and load generators.
+Connects to a host, authenticates and exchanges messages without touching
+stdin or stdout, and reports failures as exceptions. Sessions hold no
+threads of their own (except on platforms without native RFCOMM sockets),
+so one process can run hundreds of them.
+
+Example:
+    client = await connect("00:11:22:33:44:55", "123456")
+    delivered = await client.send("hello")
+    if not await delivered:
+        print("the host dropped it")
+    async for msg in client.messages():
+        print(msg)
+"""
+
+import asyncio
+import random
+import socket
+import threading
+from collections import deque
+from datetime import datetime
+
+import bluetooth
+
+from acks import DEFAULT_WINDOW, AckWindow
+from message_manager import Message
+from protocol import (
+    ACK, AUTH, AUTH_FAILED, AUTH_REQUEST, AUTH_SUCCESS, CHAT, HISTORY, KEEPALIVE, MAX_CHAT_SIZE,
+    MESSAGE, NICK, ROSTER, ROSTER_DELTA, SEALED, FrameParser, ProtocolError, decode_ack,
+    decode_history, decode_json, decode_message, encode_ack, encode_frame, encode_json
+)
+from lanes import BULK, CONTROL, LaneScheduler, LaneStats
+from roster import Roster
+from secure_channel import MAX_SEALED_SIZE, KeyExchange
+
+
+SERVICE_NAME = "BluetoothMessenger"
+# Most bytes of queued frames the sender task coalesces into one write
+WRITE_BYTES = 64 * 1024
+
+
+class ClientError(Exception):
+    """Base class for client errors."""
+
+
+class ConnectionFailed(ClientError):
+    """The host could not be reached or broke off the handshake."""
+
+
+class ServiceNotFound(ConnectionFailed):
+    """The device does not advertise the messenger service."""
+
+
+class AuthenticationFailed(ClientError):
+    """The host rejected the PIN."""
+
+
+class Disconnected(ClientError):
+    """The connection to the host was lost."""
+
+
+def find_service_port(address):
+    """Look up the RFCOMM port of the messenger service on a device.
+    
+    Blocks for the SDP query; run it in an executor from async code.
+    
+    Args:
+        address: Bluetooth address of the device
+    
+    Returns:
+        int: RFCOMM port
+    
+    Raises:
+        ServiceNotFound: If the device does not advertise the service
+    """
+    matches = bluetooth.find_service(name=SERVICE_NAME, address=address)
+    if not matches:
+        raise ServiceNotFound(f"{SERVICE_NAME} service not found on {address}")
+    return matches[0]["port"]
+
+
+async def open_bluetooth(address, port=None):
+    """Open asyncio streams to a host over RFCOMM.
+    
+    Args:
+        address: Bluetooth address of the host
+        port: RFCOMM port (looked up with SDP if None)
+    
+    Returns:
+        tuple: (StreamReader, StreamWriter)
+    
+    Raises:
+        ConnectionFailed: If the host cannot be reached
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        if port is None:
+            port = await loop.run_in_executor(None, find_service_port, address)
+        # Connected in an executor: event loops only connect some socket
+        # families themselves (Windows' proactor loop only INET ones)
+        sock = await loop.run_in_executor(None, _connect_rfcomm, address, port)
+        return await asyncio.open_connection(sock=sock)
+    except OSError as e:
+        raise ConnectionFailed(f"Could not connect to {address}: {e}")
+
+
+def _connect_rfcomm(address, port):
+    """Open an RFCOMM connection with a blocking connect.
+    
+    Uses a native AF_BLUETOOTH socket where the platform has one. Elsewhere
+    (macOS) a pybluez socket is bridged to a local socket pair, since
+    asyncio can only use real sockets.
+    
+    Args:
+        address: Bluetooth address of the host
+        port: RFCOMM port
+    
+    Returns:
+        socket.socket: Connected non-blocking socket
+    """
+    if hasattr(socket, "AF_BLUETOOTH") and hasattr(socket, "BTPROTO_RFCOMM"):
+        sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
+    else:
+        sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+    try:
+        sock.connect((address, port))
+    except BaseException:
+        sock.close()
+        raise
+    if not isinstance(sock, socket.socket):
+        sock = _bridge(sock)
+    sock.setblocking(False)
+    return sock
+
+
+def _bridge(remote):
+    """Relay a connected socket-like object through a local socket pair.
+    
+    Returns:
+        socket.socket: Local end to use in place of remote
+    """
+    local, inner = socket.socketpair()
+    
+    def pump(source, target):
+        try:
+            while True:
+                data = source.recv(4096)
+                if not data:
+                    break
+                while data:
+                    data = data[target.send(data):]
+        except OSError:
+            pass
+        # Either side closing ends both directions
+        for sock in (inner, remote):
+            try:
+                sock.close()
+            except OSError:
+                pass
+    
+    for source, target in ((remote, inner), (inner, remote)):
+        threading.Thread(target=pump, args=(source, target), daemon=True).start()
+    return local
+
+
+class AsyncClient:
+    """One client session with a host.
+    
+    Received messages are stored in ``message_manager`` (if one is given)
+    and queued for ``messages()``. The queue is bounded, but reading from
+    the host never waits for it: acks and roster updates must keep flowing
+    for clients that only send. When nobody reads the queue, the oldest
+    unread messages are dropped from it (they are still stored) and
+    counted in ``overflowed``.
+    """
+    
+    # Seconds to wait for each handshake frame from the host
+    HANDSHAKE_TIMEOUT = 15
+    # Bytes buffered by the stream before a write waits; frames beyond that
+    # stay in the outbox, where control frames can still overtake them
+    WRITE_BUFFER = 8192
+    # Seconds without sending anything before a KEEPALIVE frame is sent
+    KEEPALIVE_INTERVAL = 30
+    # Received messages acknowledged together, and the longest an ack waits for more
+    ACK_EVERY = 16
+    ACK_DELAY = 0.05
+    
+    def __init__(self, message_manager=None, history=None, queue_size=1000, encryption=True,
+                 keepalive=KEEPALIVE_INTERVAL, ack_window=DEFAULT_WINDOW):
+        """
+        Args:
+            message_manager: MessageManager to store messages in (optional)
+            history: Most messages to ask the host for on joining (None for the host's default)
+            queue_size: Most received messages buffered for messages()
+            encryption: Require a PIN key exchange and an encrypted session
+                (False sends the PIN in cleartext; for benchmarks only)
+            keepalive: Longest silence, in seconds, before telling the host
+                the session is still alive (None to send no keepalives)
+            ack_window: Most messages in flight unacknowledged in each
+                direction; send() waits while this many are (None to turn
+                acknowledgements off)
+        """
+        self.message_manager = message_manager
+        self.history_limit = history
+        self.queue_size = queue_size
+        self.encryption = encryption
+        self.cursor = 0  # newest host sequence number received
+        self.epoch = None  # host numbering the cursor belongs to
+        self.peer_id = None  # stable id the host assigned to this session
+        self.peer_name = None
+        self.roster = Roster()  # peers online, kept current by the host
+        self.history = []  # Messages from the snapshot sent on joining
+        self.reader = None
+        self.writer = None
+        self.parser = None
+        self.cipher = None
+        self.sealed_parser = None  # frames inside SEALED frames
+        self.pending = deque()
+        self.incoming = None
+        self.overflowed = 0  # received messages dropped from a full queue
+        self.receive_task = None
+        self.outbox = None
+        self.outbox_ready = None
+        self.lane_stats = LaneStats()  # queueing delay of sent frames
+        self.send_task = None
+        self.keepalive = keepalive
+        self.keepalive_task = None
+        self.keepalive_changed = None
+        self.last_sent = 0.0  # event loop time of the last frame written
+        self.ack_window = ack_window
+        self.chat_window = None  # AckWindow of sent messages, with their delivery futures
+        self.chat_count = 0  # CHAT frames sent this connection, the position the host acks
+        self.window_open = None
+        self.unacked_received = 0  # messages received since the last ack sent
+        self.ack_timer = None
+        self.connected = False
+        self.closing = False
+        self.error = None
+    
+    async def connect(self, target, pin):
+        """Connect to a host and authenticate.
+        
+        Reconnecting with the same client only fetches the history it missed.
+        
+        Args:
+            target: Bluetooth address of the host, a transport with an
+                ``open()`` coroutine, an already connected
+                (StreamReader, StreamWriter) pair, or a list of addresses
+                or transports of one host's adapters, tried in random order
+                until the least loaded one admits the client
+            pin: Authentication PIN, or a function returning it; the
+                function is called in an executor once the host asks for it
+        
+        Returns:
+            AsyncClient: self
+        
+        Raises:
+            ConnectionFailed: If the host cannot be reached
+            AuthenticationFailed: If the host rejected the PIN
+        """
+        if isinstance(target, list):
+            return await self._connect_any(target, pin)
+        # Tasks of the previous connection would otherwise keep running
+        # against the new streams and outbox
+        await self._stop_tasks()
+        if self.writer:
+            self.writer.close()
+        if isinstance(target, str):
+            self.reader, self.writer = await open_bluetooth(target)
+        elif hasattr(target, "open"):
+            try:
+                self.reader, self.writer = await target.open()
+            except OSError as e:
+                raise ConnectionFailed(f"Could not connect: {e}")
+        else:
+            self.reader, self.writer = target
+        self.parser = FrameParser(MAX_SEALED_SIZE)
+        self.cipher = None
+        self.sealed_parser = FrameParser()
+        self.pending.clear()
+        self.closing = False
+        self.error = None
+        
+        try:
+            await self._handshake(pin)
+        except (asyncio.TimeoutError, OSError, ProtocolError) as e:
+            self._abort()
+            raise ConnectionFailed(f"Handshake with the host failed: {str(e) or 'timed out'}")
+        except BaseException:
+            self._abort()
+            raise
+        
+        self.incoming = asyncio.Queue(self.queue_size)
+        self.outbox = LaneScheduler(stats=self.lane_stats)
+        self.outbox_ready = asyncio.Event()
+        self.writer.transport.set_write_buffer_limits(high=self.WRITE_BUFFER)
+        self.chat_window = AckWindow(self.ack_window) if self.ack_window else None
+        self.chat_count = 0
+        self.window_open = asyncio.Event()
+        self.unacked_received = 0
+        self.connected = True
+        self.receive_task = asyncio.ensure_future(self._receive())
+        self.send_task = asyncio.ensure_future(self._send_queued())
+        self.keepalive_changed = asyncio.Event()
+        if self.keepalive:
+            self.keepalive_task = asyncio.ensure_future(self._send_keepalives())
+        return self
+    
+    async def _connect_any(self, targets, pin):
+        """Connect to the first of a host's adapters that accepts.
+        
+        An adapter that is full, or carries more peers than another one,
+        closes the connection before the handshake, so the next one is
+        tried; a rejected PIN ends the attempt.
+        """
+        error = ConnectionFailed("No adapter to connect to")
+        for target in random.sample(targets, len(targets)):
+            try:
+                return await self.connect(target, pin)
+            except ConnectionFailed as e:
+                error = e
+        raise error
+    
+    async def _handshake(self, pin):
+        """Answer the host's PIN request and load the roster and history snapshots."""
+        frame = await self._read_frame(self.HANDSHAKE_TIMEOUT)
+        if frame is None or frame[0] != AUTH_REQUEST:
+            raise ProtocolError("Expected an AUTH_REQUEST frame")
+        offer = decode_json(frame[1]) if frame[1] else {}
+        if self.encryption and not offer.get("pake"):
+            raise ProtocolError("The host does not support encryption")
+        
+        if callable(pin):
+            pin = await asyncio.get_running_loop().run_in_executor(None, pin)
+        request = {"cursor": self.cursor or None, "epoch": self.epoch, "history": self.history_limit,
+                   "ack_window": self.ack_window}
+        if self.encryption:
+            exchange = KeyExchange(pin, is_host=False)
+            try:
+                cipher = exchange.finish(bytes.fromhex(str(offer["pake"])))
+            except ValueError as e:
+                raise ProtocolError(f"Invalid key exchange offer: {e}")
+            request.update(pake=exchange.message.hex(), confirm=cipher.confirmation().hex())
+        else:
+            request["pin"] = pin
+        self.writer.write(encode_frame(AUTH, encode_json(request)))
+        await self.writer.drain()
+        if self.encryption:
+            # Only AUTH_FAILED may come unsealed from here on
+            self.cipher = cipher
+        
+        frame = await self._read_frame(self.HANDSHAKE_TIMEOUT)
+        if frame is not None and frame[0] == AUTH_FAILED:
+            raise AuthenticationFailed("The host rejected the PIN")
+        if frame is None or frame[0] != AUTH_SUCCESS:
+            raise ProtocolError("Expected an AUTH_SUCCESS frame")
+        welcome = decode_json(frame[1])
+        self.peer_id = self.peer_name = welcome.get("peer")
+        if welcome.get("epoch") != self.epoch:
+            # The host restarted and numbers messages from 1 again
+            self.epoch = welcome.get("epoch")
+            self.cursor = 0
+        
+        # The host follows up with the roster and the history snapshot
+        while True:
+            frame = await self._read_frame(self.HANDSHAKE_TIMEOUT)
+            if frame is None:
+                raise ProtocolError("Connection closed during the handshake")
+            if frame[0] in (ROSTER, ROSTER_DELTA):
+                self._handle_roster(*frame)
+                continue
+            if frame[0] == HISTORY:
+                self._load_history(frame[1])
+            else:
+                self.pending.appendleft(frame)
+            break
+    
+    async def _read_frame(self, timeout=None):
+        """Return the next frame, or None once the host closed the connection."""
+        while not self.pending:
+            if timeout is None:
+                data = await self.reader.read(4096)
+            else:
+                data = await asyncio.wait_for(self.reader.read(4096), timeout)
+            if not data:
+                return None
+            frames = self.parser.feed(data)
+            if self.cipher:
+                frames = self._unseal(frames)
+            self.pending.extend(frames)
+        return self.pending.popleft()
+    
+    def _unseal(self, frames):
+        """Return the frames carried by received SEALED frames.
+        
+        Raises:
+            ProtocolError: If a frame was not sealed, or not by this session's key
+        """
+        plaintext = []
+        for frame_type, payload in frames:
+            if frame_type == SEALED:
+                plaintext.append(self.cipher.open(payload))
+            elif frame_type == AUTH_FAILED and not self.connected:
+                return [(frame_type, payload)]
+            else:
+                raise ProtocolError("Unencrypted frame from the host")
+        # One pass over everything that was opened from this read
+        return self.sealed_parser.feed(b"".join(plaintext))
+    
+    def _load_history(self, payload):
+        """Store a HISTORY snapshot, skipping messages already received."""
+        records = [record for record in decode_history(payload) if record[0] > self.cursor]
+        if not records:
+            self.history = []
+            return
+        self.cursor = records[-1][0]
+        self.history = [Message(sender, content, datetime.fromtimestamp(timestamp),
+                                seq=seq, expires_at=expires_at)
+                        for seq, timestamp, expires_at, sender, content in records]
+        if self.message_manager:
+            # The whole snapshot in one call
+            self.message_manager.add_messages(
+                (timestamp, sender, content, expires_at)
+                for seq, timestamp, expires_at, sender, content in records
+            )
+    
+    def _handle_roster(self, frame_type, payload):
+        """Update the roster from a ROSTER snapshot or a ROSTER_DELTA."""
+        if frame_type == ROSTER:
+            self.roster.load(decode_json(payload))
+        else:
+            self.roster.apply(decode_json(payload))
+        self.peer_name = self.roster.name(self.peer_id)
+    
+    async def _receive(self):
+        """Background task: read frames from the host until it disconnects."""
+        try:
+            while True:
+                frame = await self._read_frame()
+                if frame is None:
+                    break
+                
+                frame_type, payload = frame
+                if frame_type == HISTORY:
+                    self._load_history(payload)
+                elif frame_type in (ROSTER, ROSTER_DELTA):
+                    self._handle_roster(frame_type, payload)
+                elif frame_type == ACK:
+                    self._handle_ack(payload)
+                elif frame_type == MESSAGE:
+                    seq, timestamp, expires_at, sender, content = decode_message(payload)
+                    # Messages already in the history snapshot are skipped, but still acked
+                    if not seq or seq > self.cursor:
+                        self.cursor = max(self.cursor, seq)
+                        if self.message_manager:
+                            self.message_manager.add_messages([(timestamp, sender, content, expires_at)])
+                        self._queue_incoming(Message(sender, content, datetime.fromtimestamp(timestamp),
+                                                     seq=seq, expires_at=expires_at))
+                    if seq and self.ack_window:
+                        self._received()
+        except (OSError, ProtocolError) as e:
+            self.error = e
+        
+        self.connected = False
+        self._fail_queued(Disconnected("Connection to the host lost"))
+        self._give_up_deliveries()
+        self._queue_incoming(None)
+    
+    def _queue_incoming(self, item):
+        """Queue a received message, or the end marker, for messages().
+        
+        Never waits for the reader: a full queue drops its oldest message.
+        """
+        if self.incoming.full():
+            self.incoming.get_nowait()
+            self.overflowed += 1
+        self.incoming.put_nowait(item)
+    
+    async def messages(self):
+        """Iterate over messages relayed by the host as they arrive.
+        
+        The iteration ends after close().
+        
+        Yields:
+            Message: Received message; ``seq`` is the host's sequence number
+        
+        Raises:
+            Disconnected: If the connection to the host is lost
+        """
+        if self.incoming is None:
+            raise Disconnected("Not connected")
+        while True:
+            msg = await self.incoming.get()
+            if msg is None:
+                # Leave the end marker for any other reader
+                self.incoming.put_nowait(None)
+                if self.closing:
+                    return
+                raise Disconnected(f"Connection to the host lost: {self.error or 'closed by the host'}")
+            yield msg
+    
+    async def send(self, message):
+        """Send a chat message to the host.
+        
+        Waits while the ack window is full, so a sender cannot run further
+        ahead of the host than the window allows.
+        
+        Args:
+            message: Message content (str or UTF-8 bytes)
+        
+        Returns:
+            asyncio.Future: Resolves to True once the host acknowledged the
+                message (or, with acknowledgements off, once it was
+                written), or to False if the host dropped it or the
+                connection was lost first
+        
+        Raises:
+            Disconnected: If the client is not connected
+            ValueError: If the message is larger than the host accepts
+        """
+        if not self.connected:
+            raise Disconnected("Not connected")
+        data = message.encode('utf-8') if isinstance(message, str) else message
+        if len(data) > MAX_CHAT_SIZE:
+            raise ValueError(f"Message of {len(data)} bytes exceeds the {MAX_CHAT_SIZE} byte limit")
+        
+        window = self.chat_window
+        while window is not None and window.full():
+            self.window_open.clear()
+            await self.window_open.wait()
+            if not self.connected:
+                raise Disconnected("Connection to the host lost")
+        
+        delivery = asyncio.get_running_loop().create_future()
+        if window is not None:
+            # Numbered in the order the host counts them: the bulk lane keeps it
+            self.chat_count += 1
+            window.sent(self.chat_count, delivery)
+        written = self._queue_frame(BULK, CHAT, data)
+        if self.message_manager:
+            self.message_manager.add_message("me", data)
+        await written
+        if window is None:
+            delivery.set_result(True)
+        return delivery
+    
+    def delivery_stats(self):
+        """Return the acknowledgement statistics of sent messages.
+        
+        Returns:
+            dict: See AckWindow.summary(), or None with acknowledgements off
+        """
+        return self.chat_window.summary() if self.chat_window else None
+    
+    def _handle_ack(self, payload):
+        """Resolve the delivery futures of the messages the host acknowledged."""
+        position, dropped = decode_ack(payload)
+        if self.chat_window is None:
+            return
+        for sent, delivery in self.chat_window.ack(position)[0]:
+            if not delivery.done():
+                delivery.set_result(sent not in dropped)
+        self.window_open.set()
+    
+    def _received(self):
+        """Acknowledge received messages, a batch at a time."""
+        self.unacked_received += 1
+        # At least twice per window, so the host never waits out ACK_DELAY on a full one
+        if self.unacked_received >= min(self.ACK_EVERY, max(1, self.ack_window // 2)):
+            self._send_ack()
+        elif self.ack_timer is None:
+            self.ack_timer = asyncio.get_running_loop().call_later(self.ACK_DELAY, self._send_ack)
+    
+    def _send_ack(self):
+        """Queue a cumulative ack of every message received so far."""
+        if self.ack_timer:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+        self.unacked_received = 0
+        if not self.connected:
+            return
+        written = self._queue_frame(CONTROL, ACK, encode_ack(self.cursor))
+        # A lost connection is reported by the receive task
+        written.add_done_callback(lambda future: future.cancelled() or future.exception())
+    
+    def _give_up_deliveries(self):
+        """Resolve the deliveries still unacknowledged to False."""
+        if self.ack_timer:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+        if self.chat_window:
+            for delivery in self.chat_window.clear():
+                if not delivery.done():
+                    delivery.set_result(False)
+        if self.window_open:
+            # Wakes senders waiting for room, which then see the connection is gone
+            self.window_open.set()
+    
+    async def rename(self, name):
+        """Ask the host to show this peer under another name.
+        
+        The host confirms with a roster update, which changes ``peer_name``,
+        or turns the name down with a message from "host".
+        
+        Args:
+            name: Name to go by
+        
+        Raises:
+            Disconnected: If the client is not connected
+        """
+        if not self.connected:
+            raise Disconnected("Not connected")
+        await self._queue_frame(CONTROL, NICK, name.encode('utf-8'))
+    
+    def _queue_frame(self, lane, frame_type, payload):
+        """Queue a frame for the sender task.
+        
+        Args:
+            lane: CONTROL or BULK
+            frame_type: One of the frame type constants
+            payload: Frame payload bytes
+        
+        Returns:
+            asyncio.Future: Done once the frame is written to the stream
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.outbox.push(lane, ((frame_type, payload), future))
+        self.outbox_ready.set()
+        return future
+    
+    async def _send_queued(self):
+        """Background task: write queued frames, control lane first.
+        
+        Frames queued by the time the task gets to run are written
+        together, up to WRITE_BYTES, and sealed as one.
+        """
+        while True:
+            entry = self.outbox.pop()
+            if entry is None:
+                self.outbox_ready.clear()
+                await self.outbox_ready.wait()
+                continue
+            frames, futures, size = [], [], 0
+            while entry is not None:
+                lane, ((frame_type, payload), future) = entry
+                frames.append(encode_frame(frame_type, payload))
+                futures.append(future)
+                size += len(frames[-1])
+                if size >= WRITE_BYTES:
+                    break
+                entry = self.outbox.pop()
+            data = b"".join(frames)
+            try:
+                # Sealed only now, so the frames are encrypted in the order they are written
+                self.writer.write(self.cipher.seal(data) if self.cipher else data)
+                await self.writer.drain()
+            except OSError as e:
+                self._fail_queued(Disconnected(f"Error sending message: {e}"), *futures)
+                return
+            self.last_sent = asyncio.get_running_loop().time()
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+    
+    def set_keepalive(self, interval):
+        """Change the keepalive interval, for example while the app is in the background.
+        
+        The host is told the new interval right away, so it keeps waiting
+        for a client that is about to go quiet for longer. Call from the
+        event loop's thread.
+        
+        Args:
+            interval: Longest silence in seconds (None to stop keepalives)
+        """
+        self.keepalive = interval
+        if not self.connected:
+            return
+        if self.keepalive_task is None:
+            self.keepalive_task = asyncio.ensure_future(self._send_keepalives())
+        else:
+            self.keepalive_changed.set()
+    
+    async def _send_keepalives(self):
+        """Background task: send a KEEPALIVE frame whenever nothing else was
+        sent for a keepalive interval, and whenever the interval changes.
+        """
+        loop = asyncio.get_running_loop()
+        announce = True  # the host learns the interval from the first keepalive
+        try:
+            while self.connected:
+                idle = loop.time() - self.last_sent
+                if announce or (self.keepalive and idle >= self.keepalive):
+                    announce = False
+                    await self._queue_frame(CONTROL, KEEPALIVE, encode_json({"interval": self.keepalive}))
+                    continue
+                if not self.keepalive:
+                    break
+                self.keepalive_changed.clear()
+                try:
+                    await asyncio.wait_for(self.keepalive_changed.wait(), self.keepalive - idle)
+                    announce = True
+                except asyncio.TimeoutError:
+                    pass
+        except Disconnected:
+            pass
+        # A later set_keepalive() starts a new task
+        self.keepalive_task = None
+    
+    def _fail_queued(self, error, *futures):
+        """Fail the given futures and those of every frame still queued."""
+        for future in futures + tuple(future for frame, future in self.outbox.drain()):
+            if not future.done():
+                future.set_exception(error)
+    
+    async def close(self):
+        """Disconnect from the host."""
+        self.closing = True
+        self.connected = False
+        await self._stop_tasks()
+        if self.outbox:
+            self._fail_queued(Disconnected("Connection closed"))
+        self._give_up_deliveries()
+        
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        
+        if self.incoming:
+            self._queue_incoming(None)
+    
+    async def _stop_tasks(self):
+        """Cancel the background tasks of the current connection and wait for them."""
+        for task in (self.receive_task, self.send_task, self.keepalive_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self.receive_task = self.send_task = self.keepalive_task = None
+    
+    def _abort(self):
+        """Close the streams after a failed handshake."""
+        if self.writer:
+            self.writer.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+async def connect(target, pin, **kwargs):
+    """Create a client and connect it to a host.
+    
+    Args:
+        target: Bluetooth address of the host, a transport, or a connected
+            (StreamReader, StreamWriter) pair
+        pin: Authentication PIN, or a function returning it
+        **kwargs: Passed on to AsyncClient
+    
+    Returns:
+        AsyncClient: Connected client
+    """
+    client = AsyncClient(**kwargs)
+    return await client.connect(target, pin)
@@ -1,11 +1,15 @@
 """
 Simple authentication module for Bluetooth messenger.
-Generates and validates PINs for secure connections.
+Generates PINs and authenticates clients with them, either through a key
+exchange that also sets up session encryption or by direct comparison.
 """
 
-import random
+import hmac
+import secrets
 import string
 
+from secure_channel import KeyExchange
+
 
 class AuthManager:
     """Manages authentication for Bluetooth connections."""
@@ -22,7 +26,7 @@ class AuthManager:
         Returns:
             str: Generated PIN
         """
-        self.pin = ''.join(random.choices(string.digits, k=length))
+        self.pin = ''.join(secrets.choice(string.digits) for _ in range(length))
         return self.pin
     
     def validate_pin(self, provided_pin):
@@ -34,4 +38,14 @@ class AuthManager:
         Returns:
             bool: True if PIN matches, False otherwise
         """
-        return self.pin is not None and provided_pin == self.pin
+        if self.pin is None:
+            return False
+        return hmac.compare_digest(provided_pin.encode('utf-8'), self.pin.encode('utf-8'))
+    
+    def key_exchange(self):
+        """Start a PIN-authenticated key exchange with a connecting client.
+        
+        Returns:
+            KeyExchange: Host side of the exchange
+        """
+        return KeyExchange(self.pin, is_host=True)
@@ -0,0 +1,137 @@
+"""
+Benchmark for hosts that listen on several adapters.
+Stands in loopback endpoints for the radios, connects a group of clients
+that each try the host's endpoints in random order, relays messages from
+one of them to the rest and reports how the peers and the traffic were
+spread over the adapters; the host balances peers by load, so the split
+must be even. Then fills the adapters to capacity to show that clients
+fall over to an adapter with room.
+
+No Bluetooth hardware is needed.
+
+Run from the repository root:
+    python benchmarks/bench_adapters.py
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from async_client import AsyncClient, ConnectionFailed
+from host import BluetoothHost
+from transport import LoopbackTransport
+
+
+ADAPTERS = (1, 2, 4)
+PEERS = 12
+MESSAGES = 1000
+PAYLOAD = b"multi-adapter benchmark message with a realistic amount of chat text"
+
+CAPACITY = 3
+CAPACITY_ADAPTERS = 2
+
+
+async def relay(transports, pin):
+    """Connect PEERS clients, then send MESSAGES from one of them and wait
+    until every other peer received them all.
+    
+    Returns:
+        float: Wall seconds of the relay
+    """
+    clients = [AsyncClient(history=0, encryption=False) for _ in range(PEERS)]
+    for client in clients:
+        await client.connect(list(transports), pin)
+    
+    async def receive(client):
+        received = 0
+        async for msg in client.messages():
+            received += 1
+            if received == MESSAGES:
+                break
+    
+    sender, receivers = clients[0], clients[1:]
+    tasks = [asyncio.ensure_future(receive(client)) for client in receivers]
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        await sender.send(PAYLOAD)
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - start
+    
+    for client in clients:
+        await client.close()
+    return wall
+
+
+async def fill(transports, pin, count):
+    """Connect count clients, each holding its place until all of them tried.
+    
+    Returns:
+        int: Clients that found an adapter with room
+    """
+    clients = []
+    for i in range(count):
+        client = AsyncClient(history=0, encryption=False)
+        try:
+            clients.append(await client.connect(list(transports), pin))
+        except ConnectionFailed:
+            pass
+    for client in clients:
+        await client.close()
+    return len(clients)
+
+
+def run_host(adapters, capacity, session):
+    """Start a host on loopback adapters and run a client session against it.
+    
+    Returns:
+        tuple: (session result, host adapters)
+    """
+    transports = [LoopbackTransport() for _ in range(adapters)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        host = BluetoothHost(transport=transports, encryption=False, adapter_capacity=capacity)
+        pin = host.auth.generate_pin()
+        host.serve()
+        result = asyncio.run(session(transports, pin))
+        host.shutdown()
+    return result, host.adapters
+
+
+def check_even(adapters):
+    """Fail unless the peers were spread over the adapters evenly."""
+    peers = [adapter.stats.connections for adapter in adapters]
+    assert max(peers) - min(peers) <= 1, f"uneven split of peers over adapters: {peers}"
+
+
+def main():
+    deliveries = MESSAGES * (PEERS - 1)
+    print(f"Relaying {MESSAGES:,} messages to {PEERS - 1} peers spread over loopback adapters\n")
+    for count in ADAPTERS:
+        wall, adapters = run_host(count, None, relay)
+        print(f"{count} adapter(s): {deliveries / wall:,.0f} deliveries/s")
+        for adapter in adapters:
+            stats = adapter.stats
+            print(f"  {adapter.name:<18} {stats.connections:>3} peers "
+                  f"{stats.bytes_out / 1024:>9,.0f} KiB out "
+                  f"({stats.bytes_out / wall / 1024:>8,.0f} KiB/s), "
+                  f"{stats.redirected} sent elsewhere")
+        check_even(adapters)
+    
+    total = CAPACITY * CAPACITY_ADAPTERS
+    print(f"\nConnecting {total + 2} clients to {CAPACITY_ADAPTERS} adapters "
+          f"of {CAPACITY} peers each")
+    connected, adapters = run_host(CAPACITY_ADAPTERS, CAPACITY,
+                                   lambda transports, pin: fill(transports, pin, total + 2))
+    print(f"  connected: {connected} of {total + 2}")
+    for adapter in adapters:
+        print(f"  {adapter.name:<18} {adapter.stats.connections:>3} peers, "
+              f"{adapter.stats.refused} refused, {adapter.stats.redirected} sent elsewhere")
+    check_even(adapters)
+    assert connected == total, f"only {connected} of {total} places were filled"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Multi-threaded benchmark for MessageManager reads.
+One writer thread adds messages while 1, 8 or 64 reader threads poll
+get_messages(), the way receive threads, the CLI and the Kivy
+update_messages tick do. The lock-free snapshot reads are compared with
+the previous design, where every read took the lock and copied the deque.
+
+Run from the repository root:
+    python benchmarks/bench_concurrent_reads.py
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from message_manager import Message, MessageManager
+
+
+DURATION = 2.0
+HISTORY = 2000
+READ_LIMIT = 50
+READER_COUNTS = [1, 8, 64]
+
+
+class LockedDequeManager:
+    """The previous MessageManager read/write path, for comparison."""
+    
+    def __init__(self):
+        self.messages = deque()
+        self.lock = threading.Lock()
+    
+    def add_message(self, sender, content):
+        with self.lock:
+            self.messages.append(Message(sender, content))
+    
+    def get_messages(self, limit=None):
+        with self.lock:
+            if limit:
+                return list(self.messages)[-limit:]
+            return list(self.messages)
+    
+    def stop(self):
+        pass
+
+
+def run(manager, readers, limit):
+    for i in range(HISTORY):
+        manager.add_message("peer1", f"history {i}")
+    
+    stop = threading.Event()
+    adds = [0]
+    reads = [0] * readers
+    
+    def writer():
+        while not stop.is_set():
+            manager.add_message("peer2", "hello")
+            adds[0] += 1
+    
+    def reader(slot):
+        while not stop.is_set():
+            manager.get_messages(limit=limit)
+            reads[slot] += 1
+    
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    manager.stop()
+    return adds[0] / DURATION, sum(reads) / DURATION
+
+
+def main():
+    print(f"{'store':<10} {'read':<12} {'readers':>7} {'adds/s':>12} {'gets/s':>12}")
+    for limit, label in ((READ_LIMIT, f"last {READ_LIMIT}"), (None, "full copy")):
+        for readers in READER_COUNTS:
+            for name, factory in (("locked", LockedDequeManager), ("snapshot", MessageManager)):
+                add_rate, get_rate = run(factory(), readers, limit)
+                print(f"{name:<10} {label:<12} {readers:>7} {add_rate:>12,.0f} {get_rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
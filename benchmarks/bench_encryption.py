@@ -0,0 +1,169 @@
+"""
+Benchmark for session encryption.
+First measures sealing and opening frames on their own, and what share
+of one CPU core that costs at full Bluetooth link rate. Then relays
+messages through a local host to a group of clients with encryption on
+and off, and compares throughput and the CPU time of the whole process.
+Relay runs alternate between off and on and are repeated, and the median
+of each is reported, since a single run varies a lot with how the
+threads happen to batch their writes.
+
+Clients connect over loopback, so no Bluetooth hardware is needed.
+
+Run from the repository root:
+    python benchmarks/bench_encryption.py
+"""
+
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from async_client import AsyncClient
+from host import BluetoothHost
+from protocol import CHAT, FRAME_HEADER, encode_frame, encode_message
+from secure_channel import TAG_SIZE, KeyExchange
+from transport import LoopbackTransport
+
+
+# Sustained RFCOMM throughput: a typical link and a good EDR link, in bytes/s
+LINK_RATES = (("128 KiB/s", 128 * 1024), ("300 KiB/s", 300 * 1024))
+FRAME_SIZES = (64, 1024, 16 * 1024)
+CIPHER_BYTES = 32 * 1024 * 1024
+
+PEERS = 10
+MESSAGES = 2000
+RUNS = 7
+# Most extra CPU encryption may add while a link runs at full rate, as a
+# share of one core. The relative overhead on the loopback relay is only
+# reported: with no link to wait for, it measures the relay flat out.
+TARGET_SHARE = 0.05
+PAYLOAD = b"encryption benchmark message with a realistic amount of chat text"
+SEALED_OVERHEAD = FRAME_HEADER.size + TAG_SIZE
+
+
+def session_ciphers(pin="123456"):
+    """Run a key exchange and return the (host, client) ciphers."""
+    host = KeyExchange(pin, is_host=True)
+    client = KeyExchange(pin, is_host=False)
+    return host.finish(client.message), client.finish(host.message)
+
+
+def measure_cipher(size):
+    """Seal and open frames of one size.
+    
+    Returns:
+        tuple: (seconds per byte to seal, seconds per byte to open)
+    """
+    host, client = session_ciphers()
+    frame = encode_frame(CHAT, b"x" * (size - FRAME_HEADER.size))
+    count = max(1, CIPHER_BYTES // size)
+    
+    start = time.process_time()
+    sealed = [client.seal(frame) for _ in range(count)]
+    seal_time = time.process_time() - start
+    
+    start = time.process_time()
+    for data in sealed:
+        host.open(data[FRAME_HEADER.size:])
+    open_time = time.process_time() - start
+    return seal_time / (count * size), open_time / (count * size)
+
+
+async def relay(transport, pin, encryption):
+    """Connect PEERS clients, then send MESSAGES from one of them and wait
+    until every other peer received them all.
+    
+    Returns:
+        tuple: (wall seconds, process CPU seconds, handshake seconds per client)
+    """
+    start = time.perf_counter()
+    clients = [AsyncClient(history=0, encryption=encryption) for _ in range(PEERS)]
+    for client in clients:
+        await client.connect(transport, pin)
+    handshake = (time.perf_counter() - start) / PEERS
+    
+    async def receive(client, expected):
+        received = 0
+        async for msg in client.messages():
+            received += 1
+            if received == expected:
+                break
+    
+    sender, receivers = clients[0], clients[1:]
+    tasks = [asyncio.ensure_future(receive(client, MESSAGES)) for client in receivers]
+    # CPU of the whole process: host threads and clients
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        await sender.send(PAYLOAD)
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    
+    for client in clients:
+        await client.close()
+    return wall, cpu, handshake
+
+
+def measure_relay(encryption):
+    """Relay through a loopback host.
+    
+    Returns:
+        tuple: (wall seconds, process CPU seconds, handshake seconds per client)
+    """
+    transport = LoopbackTransport()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # No rate limits: the sender is meant to saturate the host
+        host = BluetoothHost(transport=transport, encryption=encryption)
+        pin = host.auth.generate_pin()
+        host.serve()
+        result = asyncio.run(relay(transport, pin, encryption))
+        host.shutdown()
+    return result
+
+
+def main():
+    print("Sealing and opening frames (one CPU core)\n")
+    header = "".join(f"{'CPU at ' + name:>18}" for name, rate in LINK_RATES)
+    print(f"{'frame':>8} {'seal':>12} {'open':>12}{header}")
+    for size in FRAME_SIZES:
+        seal, opening = measure_cipher(size)
+        shares = "".join(f"{max(seal, opening) * rate * 100:>17.3f}%" for name, rate in LINK_RATES)
+        print(f"{size:>7}B {1 / seal / 1e6:>8.0f} MB/s {1 / opening / 1e6:>7.0f} MB/s{shares}")
+    
+    deliveries = MESSAGES * (PEERS - 1)
+    print(f"\nRelaying {MESSAGES:,} messages to {PEERS - 1} peers over loopback\n")
+    print(f"{'encryption':<12} {'deliveries/s':>14} {'CPU/delivery':>14} {'handshake':>12}")
+    runs = {False: [], True: []}
+    for run in range(RUNS):
+        for encryption in (False, True):
+            runs[encryption].append(measure_relay(encryption))
+    results = {}
+    for encryption in (False, True):
+        # Median of each column over the runs
+        wall, cpu, handshake = results[encryption] = [statistics.median(column)
+                                                      for column in zip(*runs[encryption])]
+        print(f"{'on' if encryption else 'off':<12} {deliveries / wall:>14,.0f} "
+              f"{cpu / deliveries * 1e6:>11.2f} us {handshake * 1000:>9.1f} ms")
+    
+    overhead = results[True][1] / results[False][1] - 1
+    print(f"\nCPU overhead of encryption on the relay path: {overhead * 100:+.1f}% (median of {RUNS} runs)")
+    
+    # What that costs when a link is kept full of messages like these
+    extra = (results[True][1] - results[False][1]) / deliveries
+    frame_size = len(encode_message(1, 0.0, 0.0, "peer1", PAYLOAD).joined()) + SEALED_OVERHEAD
+    for name, rate in LINK_RATES:
+        print(f"  at {name} ({rate / frame_size:,.0f} messages/s): "
+              f"{extra * rate / frame_size * 100:.2f}% of a core per link")
+    share = extra * max(rate for name, rate in LINK_RATES) / frame_size
+    print(f"Target under {TARGET_SHARE:.0%} of a core per link at full rate: "
+          f"{'met' if share < TARGET_SHARE else 'missed'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Load benchmark for broadcast fan-out latency and fairness.
+50 peers are attached to a host through local socket pairs; a few of them
+drain their socket slowly, like a peer at the edge of Bluetooth range. The
+host broadcasts a steady stream of messages and the per-peer delivery
+latency is compared for different sender pool sizes. With one sender the
+fan-out is serial, as before: peers later in dict order wait for every
+peer in front of them.
+
+Run from the repository root:
+    python benchmarks/bench_fanout.py
+"""
+
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from host import BluetoothHost
+from message_manager import Message
+
+
+PEERS = 50
+SLOW_PEERS = {5, 25, 45}
+MESSAGES = 200
+INTERVAL = 0.005
+PAYLOAD = b"x" * 512
+WORKER_COUNTS = [1, 4, 8]
+
+
+def drain(sock, slow):
+    # Slow peers take about half the offered load
+    buffer = bytearray(512 if slow else 4096)
+    try:
+        while sock.recv_into(buffer):
+            if slow:
+                time.sleep(0.01)
+    except OSError:
+        pass
+
+
+def run(workers):
+    host = BluetoothHost(sender_workers=workers)
+    ends = []
+    order = []
+    for i in range(PEERS):
+        near, far = socket.socketpair()
+        near.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        far.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        host.clients[near] = f"peer{i + 1}"
+        host.fanout.add_peer(near)
+        threading.Thread(target=drain, args=(far, i in SLOW_PEERS), daemon=True).start()
+        ends += [near, far]
+        order.append(near)
+    
+    fanout = None
+    for i in range(MESSAGES):
+        msg = Message("host", PAYLOAD, seq=i + 1, expires_at=time.time() + 300)
+        fanout = host._broadcast_message(msg)
+        time.sleep(INTERVAL)
+    fanout.wait()
+    
+    summary = host.fanout.stats.summary()
+    host.fanout.stop()
+    host.message_manager.stop()
+    for sock in ends:
+        sock.close()
+    
+    fast = [summary["peers"][sock][1] for i, sock in enumerate(order) if i not in SLOW_PEERS]
+    return summary, fast
+
+
+def main():
+    print(f"{PEERS} peers ({len(SLOW_PEERS)} slow), {MESSAGES} broadcasts every {INTERVAL * 1000:.0f} ms\n")
+    print(f"{'senders':>7} {'completion':>12} {'fast peers: min':>16} {'median':>9} {'max':>9} {'>10 ms':>7}")
+    for workers in WORKER_COUNTS:
+        summary, fast = run(workers)
+        print(f"{workers:>7} {summary['mean_completion'] * 1000:>9.1f} ms "
+              f"{min(fast) * 1000:>13.1f} ms {statistics.median(fast) * 1000:>6.1f} ms "
+              f"{max(fast) * 1000:>6.1f} ms {sum(1 for latency in fast if latency > 0.01):>4}/{len(fast)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmark for the host relay path at 50 peers.
+Compares the previous framing (format and encode the message once per
+recipient) with the current one (frame header encoded once per message,
+joined once with the payload bytes and reused for every peer) and with a
+scatter-gather sendmsg variant. Each framing is measured on both sender
+paths: written inline by the relaying thread, and queued to the host's
+pool of sender threads.
+
+Peers are local socket pairs, so no Bluetooth hardware is needed.
+
+Run from the repository root:
+    python benchmarks/bench_relay.py
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from host import BluetoothHost
+from message_manager import Message
+from protocol import OutboundMessage, encode_message
+
+
+PEERS = 50
+MESSAGES = 2000
+PAYLOADS = (
+    ("short", "relay benchmark message with a realistic amount of chat text".encode('utf-8')),
+    ("1 KiB", "é".encode('utf-8') * 512),
+)
+
+
+def legacy_inline(host, msg, exclude=None):
+    """The previous relay path: decode, format and encode per recipient."""
+    message = msg.payload.decode('utf-8')
+    formatted_msg = f"{msg.sender}: {message}"
+    with host.lock:
+        for client_socket in list(host.clients.keys()):
+            if client_socket != exclude:
+                client_socket.sendall(formatted_msg.encode('utf-8'))
+    return ()
+
+
+def current_inline(host, msg, exclude=None):
+    """Current framing, written to every peer by the relaying thread."""
+    outbound = encode_message(msg.seq, msg.timestamp.timestamp(), msg.expires_at,
+                              msg.sender, msg.payload)
+    with host.lock:
+        for client_socket in host.clients:
+            if client_socket != exclude:
+                outbound.send(client_socket)
+    return ()
+
+
+def vectored_inline(host, msg, exclude=None):
+    """Current framing, sent with scatter-gather sendmsg instead of one join."""
+    outbound = encode_message(msg.seq, msg.timestamp.timestamp(), msg.expires_at,
+                              msg.sender, msg.payload)
+    with host.lock:
+        for client_socket in host.clients:
+            if client_socket != exclude:
+                outbound.send_vectored(client_socket)
+    return ()
+
+
+def legacy_pool(host, msg, exclude=None):
+    """Previous framing on the sender pool: one encode and one item per recipient."""
+    message = msg.payload.decode('utf-8')
+    formatted_msg = f"{msg.sender}: {message}"
+    fanouts = []
+    with host.lock:
+        for client_socket in list(host.clients.keys()):
+            if client_socket != exclude:
+                outbound = OutboundMessage(formatted_msg.encode('utf-8'))
+                fanouts.append(host.fanout.broadcast(outbound, [client_socket]))
+    return fanouts
+
+
+def current_pool(host, msg, exclude=None):
+    """The host's relay path: one frame queued once for every sender thread."""
+    return [host._broadcast_message(msg, exclude)]
+
+
+def connect_peers(host):
+    """Attach PEERS socket pairs to the host and drain their far ends."""
+    drains = []
+    for i in range(PEERS):
+        near, far = socket.socketpair()
+        host.clients[near] = f"peer{i + 1}"
+        host.fanout.add_peer(near)
+        thread = threading.Thread(target=drain, args=(far,), daemon=True)
+        thread.start()
+        drains.append(far)
+    return drains
+
+
+def drain(sock):
+    buffer = bytearray(65536)
+    try:
+        while sock.recv_into(buffer):
+            pass
+    except OSError:
+        pass
+
+
+def measure(relay, payload):
+    host = BluetoothHost()
+    far_ends = connect_peers(host)
+    exclude = next(iter(host.clients))
+    msg = Message("peer1", payload, seq=1, expires_at=time.time() + 300)
+    
+    # CPU of the whole process: relaying, sender and drain threads
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        fanouts = relay(host, msg, exclude)
+    # Each sender thread sends in order, so the last message is sent last
+    for fanout in fanouts:
+        fanout.wait()
+    cpu = time.process_time() - start_cpu
+    wall = time.perf_counter() - start
+    
+    # Memory allocated on top of the baseline while relaying one message
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    peak = 0
+    for i in range(100):
+        tracemalloc.reset_peak()
+        for fanout in relay(host, msg, exclude):
+            fanout.wait()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    
+    for sock in list(host.clients) + far_ends:
+        sock.close()
+    host.fanout.stop()
+    host.message_manager.stop()
+    return cpu, wall, peak
+
+
+def main():
+    print(f"Relaying {MESSAGES:,} messages to {PEERS - 1} peers\n")
+    print(f"{'payload':<8} {'sender':<7} {'framing':<10} {'CPU/msg':>12} {'CPU/delivery':>14} "
+          f"{'wall/msg':>12} {'alloc/msg':>12}")
+    paths = (
+        ("inline", "legacy", legacy_inline),
+        ("inline", "current", current_inline),
+        ("inline", "sendmsg", vectored_inline),
+        ("pool", "legacy", legacy_pool),
+        ("pool", "current", current_pool),
+    )
+    for label, payload in PAYLOADS:
+        for sender, name, relay in paths:
+            cpu, wall, peak = measure(relay, payload)
+            print(f"{label:<8} {sender:<7} {name:<10} {cpu / MESSAGES * 1e6:>9.1f} us "
+                  f"{cpu / MESSAGES / (PEERS - 1) * 1e6:>11.2f} us "
+                  f"{wall / MESSAGES * 1e6:>9.1f} us {peak:>10,} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark for full-text search over retained messages.
+Compares indexed MessageManager.search against a linear scan of
+get_messages() with 10^5 retained messages.
+
+Run from the repository root:
+    python benchmarks/bench_search.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from message_manager import MessageManager
+
+
+COUNT = 100000
+WORDS = [f"word{i}" for i in range(5000)] + ["bluetooth", "meeting", "tomorrow", "lunch"]
+QUERIES = ["meeting tomorrow", "blue*", "lunch from:peer3", "word42*", "word4999"]
+
+
+def linear_search(manager, query):
+    terms = query.lower().split()
+    return [msg for msg in manager.get_messages()
+            if all(term.rstrip("*") in msg.content.lower() for term in terms if ":" not in term)]
+
+
+def main():
+    rng = random.Random(1)
+    manager = MessageManager()
+    start = time.perf_counter()
+    for i in range(COUNT):
+        content = " ".join(rng.choice(WORDS) for _ in range(8))
+        manager.add_message(f"peer{i % 10}", content)
+    print(f"Indexed {COUNT:,} messages in {time.perf_counter() - start:.2f} s\n")
+    
+    for query in QUERIES:
+        start = time.perf_counter()
+        results = manager.search(query)
+        indexed = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        linear_search(manager, query)
+        linear = time.perf_counter() - start
+        
+        print(f"{query:<20} {len(results):>7,} hits  "
+              f"index {indexed * 1000:>7.2f} ms  linear scan {linear * 1000:>7.1f} ms")
+    
+    manager.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark for the append-only segment log.
+Compares add_message with and without the log against raw log appends
+and a naive fsync-per-message writer, then times startup replay.
+
+Run from the repository root:
+    python benchmarks/bench_segment_log.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from message_manager import MessageManager
+from segment_log import SegmentLog
+
+
+COUNT = 100000
+NAIVE_COUNT = 500
+CONTENT = "benchmark message with a realistic amount of chat text"
+
+
+def rate(count, elapsed):
+    return f"{count / elapsed:>12,.0f} msg/s"
+
+
+def bench_add_message(log_dir=None):
+    manager = MessageManager(log_dir=log_dir)
+    start = time.perf_counter()
+    for i in range(COUNT):
+        manager.add_message("peer1", CONTENT)
+    elapsed = time.perf_counter() - start
+    manager.stop()
+    return elapsed
+
+
+def bench_raw_append(log_dir):
+    log = SegmentLog(log_dir)
+    now = time.time()
+    start = time.perf_counter()
+    for i in range(COUNT):
+        log.append(now, "peer1", CONTENT)
+    log.flush()
+    elapsed = time.perf_counter() - start
+    log.close()
+    return elapsed
+
+
+def bench_naive_fsync(log_dir):
+    path = os.path.join(log_dir, "naive.log")
+    start = time.perf_counter()
+    with open(path, "ab") as f:
+        for i in range(NAIVE_COUNT):
+            f.write(f"{time.time()}\tpeer1\t{CONTENT}\n".encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+    return time.perf_counter() - start
+
+
+def bench_replay(log_dir):
+    start = time.perf_counter()
+    manager = MessageManager(log_dir=log_dir)
+    elapsed = time.perf_counter() - start
+    count = len(manager.get_messages())
+    manager.stop()
+    return count, elapsed
+
+
+def main():
+    print(f"Appending {COUNT:,} messages\n")
+    
+    elapsed = bench_add_message()
+    print(f"add_message (memory only)    {rate(COUNT, elapsed)}")
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        elapsed = bench_add_message(log_dir)
+        print(f"add_message (segment log)    {rate(COUNT, elapsed)}")
+        
+        count, elapsed = bench_replay(log_dir)
+        print(f"\nreplay of {count:,} messages     {elapsed * 1000:>9.1f} ms")
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        elapsed = bench_raw_append(log_dir)
+        print(f"\nSegmentLog.append (raw)      {rate(COUNT, elapsed)}")
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        elapsed = bench_naive_fsync(log_dir)
+        print(f"fsync per message (naive)    {rate(NAIVE_COUNT, elapsed)}")
+
+
+if __name__ == "__main__":
+    main()
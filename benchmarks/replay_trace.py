@@ -0,0 +1,233 @@
+"""
+Replay a recorded traffic trace against a local host.
+Every recorded connection becomes a client that joins, sends its chat
+messages and leaves at the recorded times (scaled by --speed), over a
+loopback transport, so traces recorded in the field can be used as
+regression benchmarks without Bluetooth hardware.
+
+Record a trace, then replay it:
+    python host.py --record traffic.trace
+    python benchmarks/replay_trace.py traffic.trace --speed 4
+
+--speed 0 replays as fast as possible, keeping the order of each
+connection's messages; connections then stay until every delivery arrived.
+
+--link sends the traffic through an emulated RFCOMM link in both
+directions (see link_emulator.py), for results closer to real radios:
+    python benchmarks/replay_trace.py traffic.trace --link --bandwidth 65536 --seed 7
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from async_client import AsyncClient, Disconnected
+from host import BluetoothHost
+from link_emulator import EmulatedLinkTransport, LinkConditions
+from protocol import AUTH_SUCCESS, CHAT
+from traffic_trace import CLOSED, INBOUND, OUTBOUND, read_trace
+from transport import LoopbackTransport
+
+
+# Seconds without new deliveries after which the replay is considered drained
+QUIET_PERIOD = 0.5
+
+
+class Session:
+    """The inbound traffic of one recorded connection."""
+    
+    def __init__(self, start):
+        self.start = start
+        self.end = None
+        self.authenticated = False
+        self.chats = []  # (seconds since start, payload)
+
+
+def load_sessions(path):
+    """Group the inbound frames of a trace by connection.
+    
+    Returns:
+        list: Sessions that authenticated, in order of their first frame
+    """
+    sessions = {}
+    for elapsed, connection, direction, frame_type, payload in read_trace(path):
+        session = sessions.get(connection)
+        if session is None:
+            session = sessions[connection] = Session(elapsed)
+        if direction == OUTBOUND and frame_type == AUTH_SUCCESS:
+            session.authenticated = True
+        elif direction == INBOUND and frame_type == CHAT:
+            session.chats.append((elapsed, payload))
+        elif direction == INBOUND and frame_type == CLOSED:
+            session.end = elapsed
+    return [session for session in sessions.values() if session.authenticated]
+
+
+class ReplayStats:
+    """Send times of replayed messages and the latency of their deliveries."""
+    
+    def __init__(self):
+        self.sent_at = {}  # {(sender, payload): [send times]}
+        self.seen = {}  # {(receiver, sender, payload): deliveries so far}
+        self.sent = 0
+        self.latencies = []
+    
+    def record_send(self, sender, payload):
+        self.sent_at.setdefault((sender, payload), []).append(time.perf_counter())
+        self.sent += 1
+    
+    def record_delivery(self, receiver, msg):
+        key = (msg.sender, msg.payload)
+        times = self.sent_at.get(key)
+        if not times:
+            return  # not a replayed message, e.g. a notice from the host
+        index = self.seen.get((receiver,) + key, 0)
+        self.seen[(receiver,) + key] = index + 1
+        if index < len(times):
+            self.latencies.append(time.perf_counter() - times[index])
+
+
+async def sleep_until(started, offset, speed):
+    """Sleep until a recorded offset, scaled by speed (0 for no waiting)."""
+    if speed:
+        delay = started + offset / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def run_session(session, transport, pin, speed, started, stats, drained):
+    """Replay one connection."""
+    await sleep_until(started, session.start, speed)
+    client = AsyncClient(history=0, queue_size=0)
+    await client.connect(transport, pin)
+    receiver = asyncio.ensure_future(receive(client, stats))
+    
+    for offset, payload in session.chats:
+        await sleep_until(started, offset, speed)
+        stats.record_send(client.peer_name, payload)
+        await client.send(payload)
+    
+    # At maximum speed recorded departures would come before any delivery
+    if session.end is not None and speed:
+        await sleep_until(started, session.end, speed)
+    else:
+        await drained.wait()
+    await client.close()
+    await receiver
+
+
+async def receive(client, stats):
+    try:
+        async for msg in client.messages():
+            stats.record_delivery(client.peer_name, msg)
+    except Disconnected:
+        pass
+
+
+async def replay(sessions, transport, pin, speed):
+    """Replay all sessions and wait until deliveries stop.
+    
+    Returns:
+        tuple: (ReplayStats, seconds until the last message was sent)
+    """
+    stats = ReplayStats()
+    drained = asyncio.Event()
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(run_session(session, transport, pin, speed, started, stats, drained))
+             for session in sessions]
+    
+    # Wait for every message to be sent...
+    while stats.sent < sum(len(session.chats) for session in sessions):
+        if all(task.done() for task in tasks):
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    
+    # ...and for deliveries to stop
+    delivered = -1
+    while delivered != len(stats.latencies):
+        delivered = len(stats.latencies)
+        await asyncio.sleep(QUIET_PERIOD)
+    drained.set()
+    await asyncio.gather(*tasks)
+    return stats, elapsed
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a traffic trace against a local host")
+    parser.add_argument("trace", help="Trace file recorded with host.py --record")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed: 1 for real time, N for N times faster, 0 for as fast as possible")
+    parser.add_argument("--sender-workers", type=int, default=4,
+                        help="Sender threads of the replay host (default: 4)")
+    link = parser.add_argument_group("link emulation")
+    defaults = LinkConditions()
+    link.add_argument("--link", action="store_true",
+                      help="Send traffic through an emulated Bluetooth link")
+    link.add_argument("--bandwidth", type=float, default=defaults.bandwidth,
+                      help=f"Link bandwidth in bytes/s (default: {defaults.bandwidth})")
+    link.add_argument("--latency", type=float, default=defaults.latency,
+                      help=f"One-way latency in seconds (default: {defaults.latency})")
+    link.add_argument("--jitter", type=float, default=defaults.jitter,
+                      help=f"Largest random extra delay in seconds (default: {defaults.jitter})")
+    link.add_argument("--mtu", type=int, default=defaults.mtu,
+                      help=f"Largest packet in bytes (default: {defaults.mtu})")
+    link.add_argument("--stall-probability", type=float, default=defaults.stall_probability,
+                      help=f"Chance that a packet stalls the link (default: {defaults.stall_probability})")
+    link.add_argument("--seed", type=int, default=0, help="Seed for jitter and stalls (default: 0)")
+    args = parser.parse_args()
+    
+    sessions = load_sessions(args.trace)
+    messages = sum(len(session.chats) for session in sessions)
+    recorded = max([session.end or 0 for session in sessions] +
+                   [session.chats[-1][0] for session in sessions if session.chats] + [0])
+    speed = f"{args.speed:g}x" if args.speed else "maximum speed"
+    print(f"Replaying {len(sessions)} connections, {messages:,} messages "
+          f"({recorded:.1f} s recorded) at {speed}")
+    
+    host_transport = client_transport = LoopbackTransport()
+    if args.link:
+        conditions = LinkConditions(bandwidth=args.bandwidth, latency=args.latency, jitter=args.jitter,
+                                    mtu=args.mtu, stall_probability=args.stall_probability)
+        # Host and clients each shape what they send, over the same loopback endpoint
+        host_transport = EmulatedLinkTransport(client_transport, conditions, seed=args.seed)
+        client_transport = EmulatedLinkTransport(client_transport, conditions, seed=args.seed + 1)
+    
+    # Keep the host's per-message console output out of the measurement
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        host = BluetoothHost(sender_workers=args.sender_workers, transport=host_transport)
+        pin = host.auth.generate_pin()
+        host.serve()
+        stats, elapsed = asyncio.run(replay(sessions, client_transport, pin, args.speed))
+        host.shutdown()
+    
+    print(f"\n  sent:       {stats.sent:,} messages in {elapsed:.2f} s "
+          f"({stats.sent / elapsed if elapsed else 0:,.1f} msg/s)")
+    print(f"  delivered:  {len(stats.latencies):,} "
+          f"({len(stats.latencies) / elapsed if elapsed else 0:,.1f} deliveries/s)")
+    if stats.latencies:
+        latencies = sorted(stats.latencies)
+        print(f"  latency:    p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+              f"max {latencies[-1] * 1000:.2f} ms, "
+              f"mean {statistics.mean(latencies) * 1000:.2f} ms")
+    if args.link:
+        for name, transport in (("host -> peers", host_transport), ("peers -> host", client_transport)):
+            link_stats = transport.stats()
+            print(f"  link {name}: {link_stats.bytes:,} bytes in {link_stats.packets:,} packets, "
+                  f"{link_stats.stalls} stalls, longest in flight {link_stats.max_delay * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
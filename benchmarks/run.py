@@ -0,0 +1,327 @@
+"""
+Micro-benchmark suite for the core data paths.
+Times message storage and retrieval, expiry, message formatting, PIN
+checks and the host's store/encode/broadcast path at realistic scales,
+keeps the best of several runs of each, and compares the results with a
+saved baseline. A path that got slower than the baseline by more than the
+threshold fails the run, so performance work can be checked before it is
+merged.
+
+Baselines depend on the machine: save one on the machine that runs the
+comparison. No Bluetooth hardware is needed.
+
+Run from the repository root:
+    python benchmarks/run.py --save          # record a baseline
+    python benchmarks/run.py                 # compare with it
+    python benchmarks/run.py --full          # include 10^6 messages
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from auth import AuthManager
+from console import Console
+from host import BluetoothHost
+from message_manager import Message, MessageManager
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Slowdown beyond which a path counts as regressed
+DEFAULT_THRESHOLD = 0.25
+
+MESSAGE_COUNTS = (10 ** 3, 10 ** 4, 10 ** 5)
+FULL_MESSAGE_COUNTS = MESSAGE_COUNTS + (10 ** 6,)
+PEER_COUNTS = (1, 10, 100)
+SENDERS = [f"peer{i}" for i in range(10)]
+PAYLOAD = b"benchmark message with a realistic amount of chat text in it"
+
+
+def _manager(count=0, ttl=None):
+    """Return a MessageManager holding count messages, without its cleanup thread.
+    
+    Expiry is only measured when a case calls _cleanup_expired() itself.
+    """
+    manager = MessageManager()
+    manager.stop()
+    # It runs one last pass on its way out, which must not take this run's work
+    manager.cleanup_thread.join()
+    for i in range(count):
+        manager.add_message(SENDERS[i % len(SENDERS)], PAYLOAD, ttl=ttl)
+    return manager
+
+
+def _messages(count):
+    now = time.time()
+    return [Message(SENDERS[i % len(SENDERS)], PAYLOAD, seq=i + 1, expires_at=now + 300)
+            for i in range(count)]
+
+
+def bench_add_message(count):
+    """Store count messages in an empty manager; seconds per message."""
+    def run():
+        manager = _manager()
+        start = time.perf_counter()
+        for i in range(count):
+            manager.add_message(SENDERS[i % len(SENDERS)], PAYLOAD)
+        return (time.perf_counter() - start) / count
+    return run
+
+
+def bench_get_messages(count):
+    """Read every retained message; seconds per call."""
+    manager = _manager(count)
+    calls = max(1, 10 ** 5 // count)
+    
+    def run():
+        start = time.perf_counter()
+        for _ in range(calls):
+            manager.get_messages()
+        return (time.perf_counter() - start) / calls
+    return run
+
+
+def bench_get_recent(count):
+    """Read the newest 200 messages, as sent to a joining peer; seconds per call."""
+    manager = _manager(count)
+    
+    def run():
+        start = time.perf_counter()
+        for _ in range(1000):
+            manager.get_messages(limit=200)
+        return (time.perf_counter() - start) / 1000
+    return run
+
+
+def bench_cleanup_expired(count):
+    """Expire count messages in one cleanup pass; seconds per message."""
+    def run():
+        manager = _manager(count, ttl=0)
+        start = time.perf_counter()
+        manager._cleanup_expired()
+        return (time.perf_counter() - start) / count
+    return run
+
+
+def bench_message_str(count):
+    """Format messages for display; seconds per message."""
+    messages = _messages(count)
+    
+    def run():
+        start = time.perf_counter()
+        for msg in messages:
+            str(msg)
+        return (time.perf_counter() - start) / count
+    return run
+
+
+def bench_is_expired(count):
+    """Check messages for expiry; seconds per message."""
+    messages = _messages(count)
+    
+    def run():
+        start = time.perf_counter()
+        for msg in messages:
+            msg.is_expired()
+        return (time.perf_counter() - start) / count
+    return run
+
+
+def bench_validate_pin(count):
+    """Check a right and a wrong PIN in turn; seconds per check."""
+    auth = AuthManager()
+    pin = auth.generate_pin()
+    wrong = "0" * len(pin) if pin != "0" * len(pin) else "1" * len(pin)
+    attempts = [pin, wrong] * (count // 2)
+    
+    def run():
+        start = time.perf_counter()
+        for attempt in attempts:
+            auth.validate_pin(attempt)
+        return (time.perf_counter() - start) / len(attempts)
+    return run
+
+
+def _drain(sock):
+    buffer = bytearray(65536)
+    try:
+        while sock.recv_into(buffer):
+            pass
+    except OSError:
+        pass
+
+
+def bench_broadcast(peers):
+    """Store, encode and send host messages to every peer over socket
+    pairs, until the last one is written; seconds per message.
+    """
+    messages = max(200, 20000 // peers)
+    
+    def run():
+        console = Console(stream=open(os.devnull, "w"))
+        host = BluetoothHost(console=console)
+        host.message_manager.stop()
+        ends = []
+        for i in range(peers):
+            near, far = socket.socketpair()
+            host.clients[near] = f"peer{i + 1}"
+            host.fanout.add_peer(near)
+            threading.Thread(target=_drain, args=(far,), daemon=True).start()
+            ends += [near, far]
+        
+        start = time.perf_counter()
+        for i in range(messages):
+            fanout = host.send_message(PAYLOAD)
+        fanout.wait()
+        elapsed = time.perf_counter() - start
+        
+        host.fanout.stop()
+        console.stop()
+        console.stream.close()
+        for sock in ends:
+            sock.close()
+        return elapsed / messages
+    return run
+
+
+# (name, unit of the scale, scales, factory); run --full for the largest scales
+CASES = (
+    ("MessageManager.add_message", "messages", MESSAGE_COUNTS, bench_add_message),
+    ("MessageManager.get_messages", "messages", MESSAGE_COUNTS, bench_get_messages),
+    ("MessageManager.get_messages(limit=200)", "messages", MESSAGE_COUNTS, bench_get_recent),
+    ("MessageManager._cleanup_expired", "messages", MESSAGE_COUNTS, bench_cleanup_expired),
+    ("Message.__str__", "messages", MESSAGE_COUNTS, bench_message_str),
+    ("Message.is_expired", "messages", MESSAGE_COUNTS, bench_is_expired),
+    ("AuthManager.validate_pin", "checks", (10 ** 5,), bench_validate_pin),
+    ("BluetoothHost.send_message", "peers", PEER_COUNTS, bench_broadcast),
+)
+
+
+def _best(run, repeat, min_time):
+    """Return the fastest of at least repeat runs, and of as many as fit in min_time."""
+    best = None
+    runs = 0
+    deadline = time.perf_counter() + min_time
+    while runs < repeat or time.perf_counter() < deadline:
+        # Garbage left by the previous run would be collected during this one
+        gc.collect()
+        result = run()
+        best = result if best is None else min(best, result)
+        runs += 1
+    return best
+
+
+def run_suite(full=False, repeat=5, min_time=1.0, only=None):
+    """Run every case, one scale at a time.
+    
+    Args:
+        full: Also run the 10^6 message scale
+        repeat: Fewest runs of each case; the fastest counts
+        min_time: Keep running a case for at least this many seconds
+        only: Run only cases whose name contains this text (optional)
+    
+    Yields:
+        tuple: (case key, best seconds per operation)
+    """
+    for name, unit, scales, factory in CASES:
+        if only and only.lower() not in name.lower():
+            continue
+        if full and scales is MESSAGE_COUNTS:
+            scales = FULL_MESSAGE_COUNTS
+        for scale in scales:
+            key = f"{name}[{scale} {unit}]"
+            run = factory(scale)
+            yield key, _best(run, repeat, min_time)
+
+
+def load_baseline(path):
+    """Return the saved results, or None if there is no baseline."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)["results"]
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    data = {
+        "saved": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the core data paths")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="Baseline file (default: benchmarks/baseline.json)")
+    parser.add_argument("--save", action="store_true",
+                        help="Save the results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Slowdown that counts as a regression (default: {DEFAULT_THRESHOLD * 100:.0f}%%)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Fewest runs of each case; the fastest counts (default: 5)")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="Seconds to keep running each case, for a stable best time (default: 1)")
+    parser.add_argument("--full", action="store_true", help="Include 10^6 messages (slow, needs a few GB)")
+    parser.add_argument("--only", metavar="TEXT", help="Run only cases whose name contains TEXT")
+    args = parser.parse_args()
+    
+    baseline = None if args.save else load_baseline(args.baseline)
+    if not args.save and baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save to record one.\n")
+    
+    results = {}
+    regressions = []
+    print(f"{'case':<58} {'time/op':>10} {'baseline':>10}  change")
+    for key, best in run_suite(args.full, args.repeat, args.min_time, args.only):
+        results[key] = best
+        line = f"{key:<58} {_format_time(best):>10}"
+        if baseline and key in baseline:
+            change = best / baseline[key] - 1
+            regressed = change > args.threshold
+            if regressed:
+                regressions.append((key, change))
+            line += f" {_format_time(baseline[key]):>10}  {change:+.0%}{'  REGRESSED' if regressed else ''}"
+        print(line, flush=True)
+    
+    if args.save:
+        if args.only or not args.full:
+            # Keep the saved results of cases this run skipped
+            results = {**(load_baseline(args.baseline) or {}), **results}
+        save_baseline(args.baseline, results)
+        print(f"\nSaved the baseline to {args.baseline}")
+        return 0
+    
+    if regressions:
+        print(f"\n{len(regressions)} path(s) more than {args.threshold:.0%} slower than the baseline:")
+        for key, change in regressions:
+            print(f"  {key}: {change:+.0%}")
+        return 1
+    if baseline:
+        print(f"\nNo path more than {args.threshold:.0%} slower than the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
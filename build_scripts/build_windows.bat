@@ -4,7 +4,7 @@ echo.
 
 REM Install dependencies
 echo Installing dependencies...
-pip install pyinstaller kivy pybluez
+pip install pyinstaller kivy pybluez cryptography spake2
 
 echo.
 echo Building executable...
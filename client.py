@@ -1,220 +1,281 @@
 """
 Bluetooth Client
 Discovers and connects to the host, authenticates, and exchanges messages.
+The connection itself is handled by AsyncClient, on an event loop thread;
+this module is the interactive terminal front end.
 """
 
-import bluetooth
+import asyncio
 import threading
 import sys
+from async_client import SERVICE_NAME, AsyncClient, AuthenticationFailed, ClientError, Disconnected
+from console import Console
+from discovery import HostScanner
 from message_manager import MessageManager
+from transport import BluetoothTransport
 
 
 class BluetoothClient:
     """Bluetooth client that connects to the host server."""
     
-    def __init__(self):
+    # Most history messages printed after joining
+    HISTORY_DISPLAY = 20
+    
+    def __init__(self, history=None):
+        """
+        Args:
+            history: Most messages to ask the host for on joining (None for the host's default)
+        """
         self.message_manager = MessageManager(expiry_minutes=5)
-        self.socket = None
+        self.client = AsyncClient(self.message_manager, history=history)
+        self.console = Console()
+        self.loop = None
         self.running = True
         self.connected = False
     
     def discover_and_connect(self):
         """Discover nearby Bluetooth devices and connect to host."""
-        print("\n" + "="*50)
-        print("BLUETOOTH MESSENGER - CLIENT MODE")
-        print("="*50)
+        self.console.write("\n" + "="*50)
+        self.console.write("BLUETOOTH MESSENGER - CLIENT MODE")
+        self.console.write("="*50)
         
-        print("\nSearching for Bluetooth devices...")
+        self.console.write("\nSearching for Bluetooth devices...")
         
         try:
-            nearby_devices = bluetooth.discover_devices(
-                duration=8,
-                lookup_names=True,
-                flush_cache=True
-            )
+            # Devices are listed as they are found and probed for the service,
+            # so a host can be picked while the scan is still running
+            self.listed = []
+            self.list_lock = threading.Lock()
+            scanner = HostScanner(on_update=self._device_updated)
+            scanner.start()
             
-            if not nearby_devices:
-                print("No Bluetooth devices found.")
-                print("\nMake sure:")
-                print("  1. Bluetooth is enabled on both devices")
-                print("  2. The host is running and discoverable")
-                print("  3. Devices are paired (if required by your OS)")
+            if not scanner.wait_for_host() and not self.listed:
+                if scanner.error:
+                    raise scanner.error
+                self.console.write("No Bluetooth devices found.")
+                self.console.write("\nMake sure:")
+                self.console.write("  1. Bluetooth is enabled on both devices")
+                self.console.write("  2. The host is running and discoverable")
+                self.console.write("  3. Devices are paired (if required by your OS)")
                 sys.exit(1)
-            
-            print(f"\nFound {len(nearby_devices)} device(s):")
-            for i, (addr, name) in enumerate(nearby_devices):
-                print(f"  {i+1}. {name} ({addr})")
+            if scanner.first_host_after is not None and not scanner.done:
+                self.console.write(f"  (host found after {scanner.first_host_after:.1f} s; still scanning)")
             
             # Let user select device
             while True:
                 try:
-                    choice = input("\nSelect device number (or 'q' to quit): ")
+                    choice = self.console.input("Select device number (Enter to list again, 'q' to quit): ")
                     if choice.lower() == 'q':
                         sys.exit(0)
+                    if not choice.strip():
+                        self._list_devices(scanner)
+                        continue
                     
                     device_index = int(choice) - 1
-                    if 0 <= device_index < len(nearby_devices):
-                        selected_device = nearby_devices[device_index]
-                        break
-                    else:
-                        print("Invalid selection. Try again.")
+                    with self.list_lock:
+                        if 0 <= device_index < len(self.listed):
+                            selected_device = self.listed[device_index]
+                            break
+                    self.console.write("Invalid selection. Try again.")
                 except ValueError:
-                    print("Invalid input. Enter a number.")
+                    self.console.write("Invalid input. Enter a number.")
             
-            host_addr = selected_device[0]
-            host_name = selected_device[1]
+            scanner.stop()
+            if selected_device.probed and not selected_device.is_host:
+                self.console.write(f"\n{selected_device.label} does not advertise the {SERVICE_NAME} service.")
+                sys.exit(1)
+            host_addr = selected_device.address
+            host_name = selected_device.label
             
-            print(f"\nConnecting to {host_name}...")
+            self.console.write(f"\nConnecting to {host_name}...")
             
-            # Find the service
-            service_matches = bluetooth.find_service(
-                name="BluetoothMessenger",
-                address=host_addr
-            )
+            # The connection runs on an event loop thread; input stays on this one
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, daemon=True).start()
             
-            if not service_matches:
-                print("BluetoothMessenger service not found on this device.")
+            # Connect and authenticate; the PIN is asked for once the host requests it
+            try:
+                transport = BluetoothTransport(host_addr, selected_device.port)
+                self._run(self.client.connect(transport, lambda: self.console.input("Enter authentication PIN: ")))
+            except AuthenticationFailed:
+                self.console.write("✗ Authentication failed. Incorrect PIN.")
                 sys.exit(1)
             
-            first_match = service_matches[0]
-            port = first_match["port"]
-            
-            # Connect
-            self.socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-            self.socket.connect((host_addr, port))
+            self.connected = True
+            self.console.write("✓ Authentication successful!")
+            self._show_history()
+            self.console.write("\nYou can now send messages.")
+            self.console.write("Commands: /quit, /messages, /search <terms>, /who, /nick <name>")
+            self.console.write("="*50 + "\n")
             
-            print("Connected! Authenticating...")
+            # Start receiving messages
+            asyncio.run_coroutine_threadsafe(self._receive_messages(), self.loop)
             
-            # Handle authentication
-            if self._authenticate():
-                self.connected = True
-                print("✓ Authentication successful!")
-                print("\nYou can now send messages.")
-                print("Commands: /quit, /messages")
-                print("="*50 + "\n")
-                
-                # Start receiving messages
-                receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
-                receive_thread.start()
-                
-                # Handle user input
-                self._handle_input()
-            else:
-                print("✗ Authentication failed. Incorrect PIN.")
-                self.socket.close()
-                sys.exit(1)
+            # Handle user input
+            self._handle_input()
                 
         except Exception as e:
-            print(f"\nError: {e}")
-            print("\nTroubleshooting:")
-            print("  - Ensure Bluetooth is enabled")
-            print("  - Make sure devices are paired")
-            print("  - Check that the host is running")
+            self.console.write(f"\nError: {e}")
+            self.console.write("\nTroubleshooting:")
+            self.console.write("  - Ensure Bluetooth is enabled")
+            self.console.write("  - Make sure devices are paired")
+            self.console.write("  - Check that the host is running")
             sys.exit(1)
+        finally:
+            # Also on sys.exit(): write what is still queued
+            self.console.stop()
     
-    def _authenticate(self):
-        """Authenticate with the host.
-        
-        Returns:
-            bool: True if authentication successful, False otherwise
-        """
-        try:
-            # Wait for auth request
-            data = self.socket.recv(1024).decode('utf-8')
-            
-            if data == "AUTH_REQUEST":
-                # Get PIN from user
-                pin = input("Enter authentication PIN: ")
-                
-                # Send PIN
-                self.socket.send(pin.encode('utf-8'))
-                
-                # Wait for response
-                response = self.socket.recv(1024).decode('utf-8')
-                
-                return response == "AUTH_SUCCESS"
-            
-            return False
-            
-        except Exception as e:
-            print(f"Authentication error: {e}")
-            return False
+    def _device_updated(self, device):
+        """Print a device once its service probe is done (called by the scanner)."""
+        with self.list_lock:
+            if not device.probed or device in self.listed:
+                return
+            self.listed.append(device)
+            number = len(self.listed)
+        self.console.write(self._describe_device(number, device))
+    
+    def _list_devices(self, scanner):
+        """Print every device probed so far."""
+        with self.list_lock:
+            listed = list(self.listed)
+        state = "done" if scanner.done else "still scanning"
+        self.console.write(f"\nFound {len(listed)} device(s) ({state}):")
+        for number, device in enumerate(listed, 1):
+            self.console.write(self._describe_device(number, device))
     
-    def _receive_messages(self):
+    def _describe_device(self, number, device):
+        mark = f"✓ {SERVICE_NAME}" if device.is_host else "(no messenger service)"
+        return f"  {number}. {device.label} ({device.address}) {mark}"
+    
+    def _run(self, coro):
+        """Run a coroutine on the connection's event loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+    
+    def _show_history(self):
+        """Show the newest messages of the snapshot sent by the host on joining."""
+        history = self.client.history
+        if not history:
+            return
+        self.console.write(f"\n--- {len(history)} earlier message(s) ---")
+        if len(history) > self.HISTORY_DISPLAY:
+            self.console.write("  (use /messages to see all)")
+        for msg in history[-self.HISTORY_DISPLAY:]:
+            self.console.write(msg)
+        self.console.write("-----------------------")
+    
+    async def _receive_messages(self):
         """Receive messages from the host and other peers."""
         try:
-            while self.running and self.connected:
-                data = self.socket.recv(1024)
-                if not data:
-                    break
-                
-                message = data.decode('utf-8')
-                
-                # Parse sender and content
-                if ': ' in message:
-                    sender, content = message.split(': ', 1)
-                    self.message_manager.add_message(sender, content)
-                    
-                    # Display the message
-                    messages = self.message_manager.get_messages(limit=1)
-                    if messages:
-                        print(f"\n{messages[-1]}")
-                        print("\nme> ", end='', flush=True)
-                
-        except Exception as e:
+            async for msg in self.client.messages():
+                # Display the message
+                self.console.write(f"\n{msg}")
+        except Disconnected as e:
             if self.running:
-                print(f"\n\nConnection lost: {e}")
-        finally:
-            self.connected = False
-            print("\n\nDisconnected from host.")
-            self.stop()
+                self.console.write(f"\n\n{e}")
+        self.connected = False
+        if self.running:
+            self.console.write("\n\nDisconnected from host.")
     
     def _handle_input(self):
         """Handle user input for sending messages."""
         try:
             while self.running and self.connected:
-                message = input("\nme> ")
+                message = self.console.input("me> ")
                 
                 if message.lower() == '/quit':
-                    print("\nDisconnecting...")
+                    self.console.write("\nDisconnecting...")
                     self.stop()
                     break
+                elif message.lower().startswith('/search'):
+                    self._search(message[len('/search'):].strip())
+                elif message.lower() == '/who':
+                    self._show_roster()
+                elif message.lower().startswith('/nick'):
+                    name = message[len('/nick'):].strip()
+                    if not name:
+                        self.console.write("Usage: /nick <name>")
+                        continue
+                    # The host replies with a roster update, or says why not
+                    try:
+                        self._run(self.client.rename(name))
+                    except ClientError as e:
+                        self.console.write(f"\nError changing name: {e}")
                 elif message.lower() == '/messages':
-                    print("\n--- Recent Messages ---")
+                    self.console.write("\n--- Recent Messages ---")
                     messages = self.message_manager.get_messages()
                     if messages:
                         for msg in messages:
-                            print(msg)
+                            self.console.write(msg)
                     else:
-                        print("  (no messages)")
-                    print("-----------------------")
+                        self.console.write("  (no messages)")
+                    self.console.write("-----------------------")
                 elif message.strip():
                     # Send message to host
                     try:
-                        self.socket.send(message.encode('utf-8'))
-                        self.message_manager.add_message("me", message)
-                    except Exception as e:
-                        print(f"\nError sending message: {e}")
+                        self._run(self._send(message))
+                    except (ClientError, ValueError) as e:
+                        self.console.write(f"\nError sending message: {e}")
                         self.connected = False
                         break
                         
         except KeyboardInterrupt:
-            print("\n\nDisconnecting...")
+            self.console.write("\n\nDisconnecting...")
             self.stop()
     
+    async def _send(self, message):
+        """Send a message and report it if the host does not acknowledge it.
+        
+        Args:
+            message: Message text
+        """
+        delivery = await self.client.send(message)
+        
+        def report(delivery):
+            if not delivery.result() and self.running:
+                self.console.write(f"\n✗ Not delivered: {message}")
+        delivery.add_done_callback(report)
+    
+    def _show_roster(self):
+        """Show the peers online, from the roster the host keeps current."""
+        self.console.write(f"\n--- Online ({len(self.client.roster)}) ---")
+        for peer_id, name in self.client.roster.entries():
+            mark = " (you)" if peer_id == self.client.peer_id else ""
+            self.console.write(f"  • {name}{mark}")
+        self.console.write("-----------------------")
+    
+    def _search(self, query):
+        """Show messages matching a search query.
+        
+        Args:
+            query: Search terms (``term*`` for prefixes, ``from:<sender>`` to filter)
+        """
+        if not query:
+            self.console.write("Usage: /search <terms> [from:<sender>]")
+            return
+        
+        self.console.write(f"\n--- Search: {query} ---")
+        results = self.message_manager.search(query, limit=50)
+        if results:
+            for msg in results:
+                self.console.write(msg)
+        else:
+            self.console.write("  (no matches)")
+        self.console.write("-----------------------")
+    
     def stop(self):
         """Stop the client and cleanup."""
         self.running = False
         self.connected = False
         
-        if self.socket:
+        if self.loop:
             try:
-                self.socket.close()
-            except:
+                self._run(self.client.close())
+            except Exception:
                 pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
         
         self.message_manager.stop()
-        print("Client stopped.")
+        self.console.write("Client stopped.")
         sys.exit(0)
 
 
@@ -0,0 +1,150 @@
+"""
+Console output for the terminal front ends.
+A single renderer thread owns stdout. Other threads queue text with
+write(), which never blocks on the terminal; the renderer writes each
+burst at once, at most once per frame interval, and then redraws the
+input prompt below it, so output does not break into what is being typed.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import readline  # lets the renderer redraw half-typed input
+except ImportError:
+    readline = None
+
+
+def _enable_escape_sequences():
+    """Let the terminal interpret the sequence that erases the prompt line.
+    
+    Returns:
+        bool: True if the terminal supports it
+    """
+    if os.name != "nt":
+        return True
+    # Windows consoles need virtual terminal processing switched on
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (AttributeError, OSError):
+        return False
+
+
+class Console:
+    """Renderer thread that coalesces output and keeps the prompt last."""
+    
+    # Erase the current terminal line
+    CLEAR_LINE = "\r\x1b[K"
+    
+    def __init__(self, stream=None, interval=1 / 30, max_pending=5000):
+        """
+        Args:
+            stream: Where to write (default: sys.stdout at creation)
+            interval: Shortest time between two writes, in seconds
+            max_pending: Most lines queued; the oldest are skipped beyond that
+        """
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.max_pending = max_pending
+        try:
+            self.interactive = self.stream.isatty() and _enable_escape_sequences()
+        except (AttributeError, ValueError):
+            self.interactive = False
+        self.pending = deque()
+        self.skipped = 0
+        self.prompt = None  # shown while waiting for input
+        self.prompt_requested = False
+        self.prompt_shown = False
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def write(self, text=""):
+        """Queue text to print, followed by a newline.
+        
+        Args:
+            text: Text to print, or an object such as a Message to print
+                as str(); may span several lines
+        """
+        # Convert here, so the renderer thread only ever joins strings
+        text = str(text)
+        with self.cond:
+            if len(self.pending) >= self.max_pending:
+                self.pending.popleft()
+                self.skipped += 1
+            self.pending.append(text)
+            self.cond.notify()
+    
+    def input(self, prompt=""):
+        """Show a prompt below the output and read a line.
+        
+        Args:
+            prompt: Prompt text
+        
+        Returns:
+            str: The line that was entered
+        """
+        with self.cond:
+            self.prompt = prompt
+            self.prompt_requested = True
+            self.cond.notify()
+        try:
+            return input()
+        finally:
+            with self.cond:
+                # The entered line moved the cursor past the prompt
+                self.prompt = None
+                self.prompt_shown = False
+    
+    def _run(self):
+        """Renderer thread: write queued output in bursts."""
+        while True:
+            with self.cond:
+                while self.running and not self.pending and not self.prompt_requested:
+                    self.cond.wait()
+                if not self.running and not self.pending:
+                    break
+                lines = list(self.pending)
+                self.pending.clear()
+                skipped, self.skipped = self.skipped, 0
+                prompt = self.prompt
+                show_prompt = prompt is not None and (self.interactive or self.prompt_requested)
+                self.prompt_requested = False
+                erase = self.prompt_shown and self.interactive
+                self.prompt_shown = show_prompt
+            
+            parts = []
+            if erase:
+                parts.append(self.CLEAR_LINE)
+            if skipped:
+                parts.append(f"({skipped} lines not shown)\n")
+            parts.extend(line + "\n" for line in lines)
+            if show_prompt:
+                parts.append(prompt)
+                if readline and self.interactive:
+                    parts.append(readline.get_line_buffer())
+            try:
+                self.stream.write("".join(parts))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+            # Let the next burst gather
+            time.sleep(self.interval)
+    
+    def stop(self, timeout=1.0):
+        """Write what is still queued and stop the renderer."""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
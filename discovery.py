@@ -0,0 +1,184 @@
+"""
+Streaming discovery of nearby messenger hosts.
+Devices are reported as the inquiry finds them, and each one is probed
+for the messenger service over SDP on a small thread pool while the
+inquiry carries on, so a host can be picked long before the scan ends.
+"""
+
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bluetooth
+
+from async_client import SERVICE_NAME
+
+
+class DiscoveredDevice:
+    """A nearby device and what is known about it so far."""
+    
+    def __init__(self, address, name=None):
+        self.address = address
+        self.name = name
+        self.port = None  # RFCOMM port of the messenger service
+        self.probed = False  # True once the SDP probe finished
+        self.found_after = None  # seconds after the scan started
+        self.probed_after = None
+    
+    @property
+    def is_host(self):
+        """True if the device advertises the messenger service."""
+        return self.port is not None
+    
+    @property
+    def label(self):
+        return self.name or self.address
+
+
+class _Discoverer(bluetooth.DeviceDiscoverer):
+    """Forwards asynchronous inquiry results to a HostScanner."""
+    
+    def __init__(self, scanner):
+        super().__init__()
+        self.scanner = scanner
+        self.done = False
+    
+    def pre_inquiry(self):
+        pass
+    
+    def device_discovered(self, address, device_class, *args):
+        # pybluez passes (rssi, name) or just (name), depending on the version
+        self.scanner._found(address, args[-1] if args else None)
+    
+    def inquiry_complete(self):
+        self.done = True
+
+
+class HostScanner:
+    """Background scan that reports devices and service probes as they happen.
+    
+    ``on_update(device)`` is called from scanner threads whenever a device
+    is found or a probe finishes, and ``on_done(scanner)`` once the scan
+    and all probes are over.
+    """
+    
+    def __init__(self, on_update=None, on_done=None, duration=8, probe_workers=4):
+        """
+        Args:
+            on_update: Called with a DiscoveredDevice when it changes (optional)
+            on_done: Called with the scanner when the scan is over (optional)
+            duration: Inquiry length in 1.28 s units, as for discover_devices
+            probe_workers: Most SDP probes run at the same time
+        """
+        self.on_update = on_update
+        self.on_done = on_done
+        self.duration = duration
+        self.probe_workers = probe_workers
+        self.devices = {}  # {address: DiscoveredDevice}
+        self.lock = threading.Condition()
+        self.started = None
+        self.first_host_after = None  # seconds until the first host was confirmed
+        self.error = None
+        self.done = False
+        self.stopped = False
+        self.discoverer = None
+        self.executor = None
+    
+    def start(self):
+        """Start scanning in the background."""
+        self.started = time.monotonic()
+        self.executor = ThreadPoolExecutor(max_workers=self.probe_workers)
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def _run(self):
+        try:
+            try:
+                self._stream_inquiry()
+            except NotImplementedError:
+                # Platforms without asynchronous inquiry: report devices
+                # when the inquiry ends, but still probe them in parallel
+                for address, name in bluetooth.discover_devices(duration=self.duration, lookup_names=True,
+                                                                flush_cache=True):
+                    self._found(address, name)
+        except Exception as e:
+            self.error = e
+        
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            self.done = True
+            self.lock.notify_all()
+        if self.on_done:
+            self.on_done(self)
+    
+    def _stream_inquiry(self):
+        """Run the inquiry, handling results as they arrive."""
+        self.discoverer = _Discoverer(self)
+        # Names are looked up by the probes, so results are not held back for them
+        self.discoverer.find_devices(lookup_names=False, duration=self.duration, flush_cache=True)
+        while not self.discoverer.done and not self.stopped:
+            readable = select.select([self.discoverer], [], [], 0.5)[0]
+            if readable:
+                self.discoverer.process_event()
+    
+    def _found(self, address, name=None):
+        with self.lock:
+            if address in self.devices or self.stopped:
+                return
+            device = self.devices[address] = DiscoveredDevice(address, name)
+            device.found_after = time.monotonic() - self.started
+        self._notify(device)
+        self.executor.submit(self._probe, device)
+    
+    def _probe(self, device):
+        """Check a device for the messenger service, then look up its name."""
+        try:
+            matches = bluetooth.find_service(name=SERVICE_NAME, address=device.address)
+        except Exception:
+            matches = []
+        with self.lock:
+            device.port = matches[0]["port"] if matches else None
+            device.probed = True
+            device.probed_after = time.monotonic() - self.started
+            if device.is_host and self.first_host_after is None:
+                self.first_host_after = device.probed_after
+            self.lock.notify_all()
+        self._notify(device)
+        
+        if not device.name and not self.stopped:
+            try:
+                device.name = bluetooth.lookup_name(device.address, timeout=5)
+            except Exception:
+                pass
+            if device.name:
+                self._notify(device)
+    
+    def _notify(self, device):
+        if self.on_update and not self.stopped:
+            self.on_update(device)
+    
+    def wait_for_host(self, timeout=None):
+        """Block until a host is confirmed or the scan is over.
+        
+        Returns:
+            bool: True if a host was found
+        """
+        with self.lock:
+            self.lock.wait_for(lambda: self.first_host_after is not None or self.done, timeout)
+            return self.first_host_after is not None
+    
+    def hosts(self):
+        """Return the devices confirmed to run the messenger, in the order they were found."""
+        with self.lock:
+            return [device for device in self.devices.values() if device.is_host]
+    
+    def stop(self):
+        """Stop the inquiry and skip probes that have not started."""
+        self.stopped = True
+        if self.discoverer and not self.discoverer.done:
+            try:
+                self.discoverer.cancel_inquiry()
+            except Exception:
+                pass
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
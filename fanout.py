@@ -0,0 +1,416 @@
+"""
+Parallel broadcast fan-out for the host.
+Peers are sharded across a fixed pool of sender threads. Each peer always
+sends from the same thread, so its messages keep their order, while slow
+peers only delay the other peers in their own shard. Each thread serves
+control frames ahead of bulk ones (see lanes.py). Chat to a peer with an
+ack window is held back while the window is full (see acks.py).
+"""
+
+import threading
+import time
+from collections import deque
+
+from lanes import BULK, CONTROL, LaneQueue, LaneStats
+
+
+class Fanout:
+    """One broadcast: the message, its recipients, and how many are left.
+    
+    The tracker is also the queue item the sender threads take, and each
+    thread picks its own peers out of the recipients, so a broadcast
+    allocates nothing per sender thread.
+    """
+    
+    __slots__ = ("outbound", "recipients", "exclude", "shards", "started", "pending", "stats")
+    
+    def __init__(self, outbound, recipients, exclude, shards, count, stats):
+        """
+        Args:
+            outbound: OutboundMessage to send
+            recipients: Sockets to send to
+            exclude: Socket among them to skip (None for none)
+            shards: {socket: sender thread index} when the broadcast was made
+            count: Number of recipients in shards
+            stats: FanoutStats that records deliveries and completions
+        """
+        self.outbound = outbound
+        self.recipients = recipients
+        self.exclude = exclude
+        self.shards = shards
+        self.started = time.perf_counter()
+        self.pending = count  # guarded by stats.lock
+        self.stats = stats
+    
+    def delivered(self, count=1):
+        """Record that some recipients have been sent the message.
+        
+        Args:
+            count: Number of recipients sent to
+        """
+        self.stats.record_sent(self, count)
+    
+    def wait(self, timeout=None):
+        """Block until every recipient has been sent the message.
+        
+        Returns:
+            bool: True if the fan-out completed
+        """
+        return self.stats.wait(self, timeout)
+
+
+class FanoutStats:
+    """Fan-out completion times and per-peer delivery latency."""
+    
+    def __init__(self, history=1000):
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)  # notified when a fan-out completes
+        self.completions = deque(maxlen=history)  # seconds per broadcast
+        self.peer_latency = {}  # {peer: [deliveries, total seconds, max seconds]}
+    
+    def record_delivery(self, peer, sent_at, fanout):
+        """Record the latency of one broadcast to a peer."""
+        latency = sent_at - fanout.started
+        with self.lock:
+            entry = self.peer_latency.get(peer)
+            if entry is None:
+                entry = self.peer_latency[peer] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += latency
+            if latency > entry[2]:
+                entry[2] = latency
+    
+    def record_deliveries(self, peer, sent_at, fanouts):
+        """Record the latency of the broadcasts written to a peer at once.
+        
+        Args:
+            peer: Peer's socket
+            sent_at: perf_counter time of the write
+            fanouts: Fanout of each message in the write
+        """
+        with self.lock:
+            entry = self.peer_latency.get(peer)
+            if entry is None:
+                entry = self.peer_latency[peer] = [0, 0.0, 0.0]
+            for fanout in fanouts:
+                latency = sent_at - fanout.started
+                entry[0] += 1
+                entry[1] += latency
+                if latency > entry[2]:
+                    entry[2] = latency
+    
+    def record_sent(self, fanout, count):
+        """Count recipients of a fan-out as sent, and complete it after the last."""
+        with self.lock:
+            fanout.pending -= count
+            if fanout.pending == 0:
+                self.completions.append(time.perf_counter() - fanout.started)
+                self.finished.notify_all()
+    
+    def wait(self, fanout, timeout=None):
+        """Block until a fan-out has no recipients left.
+        
+        Returns:
+            bool: True if the fan-out completed
+        """
+        with self.lock:
+            return self.finished.wait_for(lambda: fanout.pending <= 0, timeout)
+    
+    def forget(self, peer):
+        with self.lock:
+            self.peer_latency.pop(peer, None)
+    
+    def summary(self):
+        """Return fan-out statistics.
+        
+        Returns:
+            dict: broadcasts, mean/max completion time, and
+                {peer: (deliveries, mean latency, max latency)}
+        """
+        with self.lock:
+            completions = list(self.completions)
+            peers = {peer: (count, total / count, worst)
+                     for peer, (count, total, worst) in self.peer_latency.items()}
+        return {
+            "broadcasts": len(completions),
+            "mean_completion": sum(completions) / len(completions) if completions else 0.0,
+            "max_completion": max(completions, default=0.0),
+            "peers": peers,
+        }
+
+
+class FanoutPool:
+    """Pool of sender threads that relay broadcasts to peers."""
+    
+    # A peer with HOLD_WINDOWS windows of messages held that acked nothing
+    # for ACK_TIMEOUT seconds stopped reading; one that falls HOLD_MAX
+    # messages behind cannot keep up
+    HOLD_WINDOWS = 4
+    ACK_TIMEOUT = 10
+    HOLD_MAX = 4096
+    # Queued items a sender thread takes at once, and the most bytes it
+    # coalesces into one write to a peer
+    BATCH = 64
+    WRITE_BYTES = 64 * 1024
+    
+    def __init__(self, workers=4, on_error=None):
+        """
+        Args:
+            workers: Number of sender threads
+            on_error: Called as on_error(sock, exception) when a send fails
+        """
+        self.on_error = on_error
+        self.stats = FanoutStats()
+        self.lane_stats = LaneStats()
+        self.queues = [LaneQueue(stats=self.lane_stats) for _ in range(max(1, workers))]
+        self.shard_sizes = [0] * len(self.queues)
+        # {socket: worker index}; replaced rather than changed, so each
+        # broadcast can keep the one it was made with
+        self.shards = {}
+        self.windows = {}  # {socket: AckWindow} of peers that acknowledge chat
+        self.lock = threading.Lock()
+        self.threads = []
+        for shard in range(len(self.queues)):
+            thread = threading.Thread(target=self._worker, args=(shard,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def add_peer(self, sock, window=None):
+        """Assign a peer to the least loaded sender thread.
+        
+        Args:
+            sock: Peer's socket
+            window: AckWindow limiting the chat in flight to the peer
+                (None if the peer does not acknowledge)
+        """
+        with self.lock:
+            shard = self.shard_sizes.index(min(self.shard_sizes))
+            self.shards = {**self.shards, sock: shard}
+            self.shard_sizes[shard] += 1
+            if window is not None:
+                self.windows[sock] = window
+    
+    def remove_peer(self, sock):
+        """Release a peer's slot in its sender thread."""
+        with self.lock:
+            shard = self.shards.get(sock)
+            if shard is not None:
+                self.shards = {peer: index for peer, index in self.shards.items() if peer is not sock}
+                self.shard_sizes[shard] -= 1
+            window = self.windows.pop(sock, None)
+        if window is not None and shard is not None:
+            # The sender thread drops anything it still holds for the peer
+            self.queues[shard].put(CONTROL, sock)
+        self.stats.forget(sock)
+    
+    def acknowledged(self, sock, seq):
+        """Record a peer's cumulative ack and resume chat held for it.
+        
+        Args:
+            sock: Peer's socket
+            seq: Highest sequence number the peer acknowledged
+        """
+        with self.lock:
+            window = self.windows.get(sock)
+            shard = self.shards.get(sock)
+        if window is None:
+            return
+        if window.ack(seq)[1] and shard is not None:
+            self.queues[shard].put(CONTROL, sock)
+    
+    def delivery_summary(self):
+        """Return the ack statistics of every peer that acknowledges.
+        
+        Returns:
+            dict: {socket: AckWindow.summary()}
+        """
+        with self.lock:
+            windows = dict(self.windows)
+        return {sock: window.summary() for sock, window in windows.items()}
+    
+    def broadcast(self, outbound, recipients=None, lane=BULK, exclude=None):
+        """Queue a message for every recipient without waiting for the sends.
+        
+        Args:
+            outbound: OutboundMessage to send
+            recipients: Sequence of sockets to send to, or None for every
+                peer; kept, so it must not be changed afterwards
+            lane: CONTROL to send ahead of queued bulk frames, or BULK
+            exclude: Socket not to send to (optional)
+        
+        Returns:
+            Fanout: Tracker for this broadcast
+        """
+        with self.lock:
+            shards = self.shards
+        if recipients is None:
+            recipients = shards
+        count = 0
+        used = 0  # bit i set if sender thread i has recipients
+        for sock in recipients:
+            shard = shards.get(sock)
+            if shard is not None and sock is not exclude:
+                used |= 1 << shard
+                count += 1
+        
+        # The same tracker is queued once for each sender thread with recipients
+        fanout = Fanout(outbound, recipients, exclude, shards, count, self.stats)
+        for shard, work_queue in enumerate(self.queues):
+            if used >> shard & 1:
+                work_queue.put(lane, fanout)
+        return fanout
+    
+    def _worker(self, shard):
+        """Sender thread: write queued messages to the peers of one shard.
+        
+        Takes everything already queued, up to BATCH items, and writes each
+        peer's frames from it in one go: one send, and one seal on an
+        encrypted session, instead of one per frame.
+        
+        Queue items are Fanouts, or a peer's socket once acks made room
+        for it or it left.
+        """
+        work_queue = self.queues[shard]
+        held = {}  # {socket: deque of Fanouts} waiting for ack window room
+        while True:
+            items = work_queue.get_many(self.BATCH)
+            if not items:
+                break
+            if len(items) == 1 and type(items[0]) is Fanout:
+                # Nothing to coalesce: write straight from the broadcast
+                self._write_fanout(shard, items[0], held)
+                continue
+            writes = {}  # {socket: Fanout, or a list of them in the order they were queued}
+            for item in items:
+                if type(item) is not Fanout:
+                    self._release(item, held, writes)
+                    continue
+                shards, exclude = item.shards, item.exclude
+                for sock in item.recipients:
+                    if shards.get(sock) == shard and sock is not exclude and self._admit(sock, item, held):
+                        self._add_write(writes, sock, item)
+            if writes:
+                self._flush(writes)
+    
+    def _admit(self, sock, fanout, held):
+        """Check a peer's ack window, holding the message if it is full.
+        
+        Returns:
+            bool: True if the message may be written to the peer now
+        """
+        seq = fanout.outbound.seq
+        # Only chat counts against ack windows
+        window = self.windows.get(sock) if seq else None
+        if window is None or window.try_send(seq):
+            return True
+        self._hold(sock, fanout, window, held)
+        return False
+    
+    def _write_fanout(self, shard, fanout, held):
+        """Write one broadcast to the peers of a shard and record the deliveries."""
+        sent = 0
+        shards, exclude = fanout.shards, fanout.exclude
+        for sock in fanout.recipients:
+            if shards.get(sock) == shard and sock is not exclude and self._admit(sock, fanout, held):
+                self._send(sock, fanout.outbound)
+                self.stats.record_delivery(sock, time.perf_counter(), fanout)
+                sent += 1
+        if sent:
+            fanout.delivered(sent)
+    
+    @staticmethod
+    def _add_write(writes, sock, fanout):
+        """Queue a fan-out's message for writing to a peer in this batch."""
+        queued = writes.get(sock)
+        if queued is None:
+            writes[sock] = fanout
+        elif type(queued) is Fanout:
+            writes[sock] = [queued, fanout]
+        else:
+            queued.append(fanout)
+    
+    def _flush(self, writes):
+        """Write each peer's frames and record their delivery."""
+        sent = {}  # {Fanout: recipients written to}
+        for sock, queued in writes.items():
+            if type(queued) is Fanout:
+                self._send(sock, queued.outbound)
+                self.stats.record_delivery(sock, time.perf_counter(), queued)
+                sent[queued] = sent.get(queued, 0) + 1
+                continue
+            self._send_many(sock, queued)
+            self.stats.record_deliveries(sock, time.perf_counter(), queued)
+            for fanout in queued:
+                sent[fanout] = sent.get(fanout, 0) + 1
+        for fanout, count in sent.items():
+            fanout.delivered(count)
+    
+    def _send(self, sock, outbound):
+        """Write one message to a peer."""
+        try:
+            outbound.send(sock)
+        except OSError as e:
+            if self.on_error:
+                self.on_error(sock, e)
+    
+    def _send_many(self, sock, fanouts):
+        """Write the messages of several fan-outs to a peer, at most WRITE_BYTES per write."""
+        try:
+            chunk, size = [], 0
+            for fanout in fanouts:
+                outbound = fanout.outbound
+                if chunk and size + outbound.size > self.WRITE_BYTES:
+                    sock.sendall(b"".join(chunk))
+                    chunk, size = [], 0
+                chunk.append(outbound.joined())
+                size += outbound.size
+            sock.sendall(b"".join(chunk))
+        except OSError as e:
+            if self.on_error:
+                self.on_error(sock, e)
+    
+    def _hold(self, sock, fanout, window, held):
+        """Keep a message until the peer's ack window has room.
+        
+        A peer that stopped acknowledging, or fell too far behind, is given
+        up on: its held messages are dropped and it is reported to on_error.
+        """
+        waiting = held.get(sock)
+        if waiting is None:
+            waiting = held[sock] = deque()
+        waiting.append(fanout)
+        if len(waiting) <= window.size * self.HOLD_WINDOWS:
+            return
+        silent = time.monotonic() - window.last_ack
+        if silent < self.ACK_TIMEOUT and len(waiting) <= self.HOLD_MAX:
+            return
+        window.drop_held()
+        self._drop_held(sock, held)
+        if self.on_error:
+            reason = (f"stopped acknowledging for {silent:.0f} s" if silent >= self.ACK_TIMEOUT
+                      else f"fell {self.HOLD_MAX} messages behind")
+            self.on_error(sock, OSError(f"Peer {reason} ({window.outstanding} messages unacked)"))
+    
+    def _release(self, sock, held, writes):
+        """Queue a peer's held messages for writing while its ack window has room."""
+        waiting = held.get(sock)
+        if not waiting:
+            return
+        window = self.windows.get(sock)
+        if window is None:
+            self._drop_held(sock, held)
+            return
+        while waiting and window.try_release(waiting[0].outbound.seq):
+            self._add_write(writes, sock, waiting.popleft())
+        if not waiting:
+            del held[sock]
+    
+    def _drop_held(self, sock, held):
+        """Give up on a peer's held messages, completing their fan-outs."""
+        for fanout in held.pop(sock, ()):
+            fanout.delivered()
+    
+    def stop(self):
+        """Stop the sender threads once their queues drain."""
+        for work_queue in self.queues:
+            work_queue.close()
@@ -3,72 +3,169 @@ Bluetooth Host Server
 Accepts connections from multiple clients, manages authentication, and broadcasts messages.
 """
 
-import bluetooth
+import argparse
+import socket
 import threading
 import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from acks import MAX_WINDOW, AckWindow
+from adapters import DEFAULT_CAPACITY, Adapter
 from auth import AuthManager
+from console import Console
+from fanout import FanoutPool
+from lanes import CONTROL
 from message_manager import MessageManager
+from rate_limit import RateLimiter
+from roster import Roster
+from secure_channel import SecureSocket
+from traffic_trace import TraceRecorder
+from transport import BluetoothTransport, LoopbackTransport
+from protocol import (
+    ACK, AUTH, AUTH_FAILED, AUTH_REQUEST, AUTH_SUCCESS, CHAT, HISTORY, KEEPALIVE, NICK, ROSTER,
+    ROSTER_DELTA, MAX_CHAT_SIZE, MAX_FRAME_SIZE, FrameReader, OutboundMessage, ProtocolError,
+    decode_ack, decode_json, encode_ack, encode_frame, encode_history, encode_json, encode_message,
+    send_frame
+)
 
 
 class BluetoothHost:
     """Bluetooth server that manages multiple client connections."""
     
-    def __init__(self):
+    # Minimum seconds between rate limit notices to the same peer
+    THROTTLE_NOTICE_INTERVAL = 5
+    # Keepalive intervals a peer may stay silent before it is disconnected
+    KEEPALIVE_MISSES = 3
+    # Dropped messages listed in one ACK frame at most
+    MAX_ACK_DROPS = 64
+    
+    def __init__(self, log_dir=None, sender_workers=4, rate_limiter=None,
+                 history_count=200, history_age=None, transport=None, record_path=None,
+                 encryption=True, console=None, adapter_capacity=None):
+        """
+        Args:
+            log_dir: Directory for the message log (None to keep messages in RAM only)
+            sender_workers: Number of threads sending broadcasts to peers
+            rate_limiter: RateLimiter for incoming messages (default: no limits)
+            history_count: Most messages sent to a peer when it joins
+            history_age: Oldest message, in seconds, sent to a peer when it
+                joins (None for everything retained)
+            transport: Endpoint to listen on, or a list of them to spread
+                peers over several local radios (default: BluetoothTransport
+                on the default adapter)
+            record_path: Write a trace of all traffic to this file (optional)
+            encryption: Authenticate with a PIN key exchange and encrypt
+                sessions (False sends the PIN and messages in cleartext;
+                for benchmarks only)
+            console: Console to write output to (default: a new one on stdout)
+            adapter_capacity: Most peers on each endpoint (None for no limit;
+                the command line defaults to the 7 active links of one radio)
+        """
         self.auth = AuthManager()
-        self.message_manager = MessageManager(expiry_minutes=5)
+        self.message_manager = MessageManager(expiry_minutes=5, log_dir=log_dir)
+        self.fanout = FanoutPool(workers=sender_workers, on_error=self._send_failed)
+        self.send_failures = set()  # sockets whose send failed, reported once each
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.throttle_notices = {}  # {socket: time of last notice}
+        self.history_count = history_count
+        self.history_age = history_age
+        transports = transport if isinstance(transport, (list, tuple)) else [transport or BluetoothTransport()]
+        # One message store and broadcast domain across every adapter
+        self.adapters = [Adapter(t, capacity=adapter_capacity) for t in transports]
+        self.recorder = TraceRecorder(record_path) if record_path else None
+        self.console = console or Console()
+        self.encryption = encryption
         self.clients = {}  # {socket: peer_name}
+        self.roster = Roster()  # peers online, mirrored by every client
         self.client_counter = 0
+        self.keepalives = {}  # {socket: (interval, deadline)} of peers that send keepalives
+        self.keepalive_watch = threading.Condition()
+        self.keepalive_thread = None
         self.lock = threading.Lock()
-        self.server_socket = None
         self.running = True
     
     def start(self):
         """Start the Bluetooth host server."""
         # Generate authentication PIN
         pin = self.auth.generate_pin()
-        print("\n" + "="*50)
-        print("BLUETOOTH MESSENGER - HOST MODE")
-        print("="*50)
-        print(f"\nAuthentication PIN: {pin}")
-        print("Share this PIN with clients to allow connections.")
-        print("\nWaiting for connections...")
-        print("="*50 + "\n")
-        
-        # Create Bluetooth server socket
+        self.console.write("\n" + "="*50)
+        self.console.write("BLUETOOTH MESSENGER - HOST MODE")
+        self.console.write("="*50)
+        self.console.write(f"\nAuthentication PIN: {pin}")
+        self.console.write("Share this PIN with clients to allow connections.")
+        self.console.write("\nWaiting for connections...")
+        self.console.write("="*50 + "\n")
+        
         try:
-            self.server_socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-            self.server_socket.bind(("", bluetooth.PORT_ANY))
-            self.server_socket.listen(5)
-            
-            port = self.server_socket.getsockname()[1]
-            
-            # Advertise service
-            bluetooth.advertise_service(
-                self.server_socket,
-                "BluetoothMessenger",
-                service_id="00001101-0000-1000-8000-00805F9B34FB",
-                service_classes=["00001101-0000-1000-8000-00805F9B34FB"],
-                profiles=[("00001101-0000-1000-8000-00805F9B34FB", 0x0100)]
-            )
-            
-            # Start accepting connections in a separate thread
-            accept_thread = threading.Thread(target=self._accept_connections, daemon=True)
-            accept_thread.start()
-            
-            # Start input handling
-            self._handle_input()
-            
+            self.serve()
         except Exception as e:
-            print(f"Error starting server: {e}")
-            print("\nMake sure Bluetooth is enabled and you have necessary permissions.")
+            self.console.write(f"Error starting server: {e}")
+            self.console.write("\nMake sure Bluetooth is enabled and you have necessary permissions.")
+            self.console.stop()
             sys.exit(1)
+        
+        # Start input handling
+        self._handle_input()
     
-    def _accept_connections(self):
-        """Accept incoming client connections."""
+    def serve(self):
+        """Open and advertise the server socket, then accept connections in the background.
+        
+        Used by start() and by front ends, such as the GUI, that handle
+        input themselves.
+        """
+        # Create and advertise a server socket on every adapter; a radio
+        # that fails only matters if none is left
+        listening = []
+        channel = None
+        for adapter in self.adapters:
+            # Radios share one RFCOMM channel: the local SDP server may hand
+            # out any adapter's service record, so they must all be right
+            if isinstance(adapter.transport, BluetoothTransport) and adapter.transport.port is None:
+                adapter.transport.port = channel
+            try:
+                adapter.listen(5)
+                if isinstance(adapter.transport, BluetoothTransport):
+                    channel = adapter.transport.port
+            except Exception as e:
+                if len(self.adapters) == 1:
+                    raise
+                self.console.write(f"Could not listen on {adapter.name}: {e}")
+                continue
+            listening.append(adapter)
+        if not listening:
+            raise OSError("Could not listen on any adapter")
+        self.console.write("Listening on: " + ", ".join(adapter.name for adapter in listening))
+        
+        # Only the adapters that listen count when balancing peers between them
+        for adapter in listening:
+            adapter.group = listening
+        
+        # Accept connections on each adapter in a separate thread
+        for adapter in listening:
+            accept_thread = threading.Thread(target=self._accept_connections, args=(adapter,), daemon=True)
+            accept_thread.start()
+    
+    def _accept_connections(self, adapter):
+        """Accept incoming client connections on one adapter.
+        
+        Args:
+            adapter: Adapter to accept on
+        """
         while self.running:
             try:
-                client_socket, client_info = self.server_socket.accept()
-                print(f"\nIncoming connection from {client_info}...")
+                client_socket, client_info = adapter.accept()
+                if client_socket is None:
+                    reason = "is full" if adapter.full else "has more peers than another adapter"
+                    self.console.write(f"\nRefused {client_info}: {adapter.name} {reason}")
+                    continue
+                if self.encryption:
+                    client_socket = SecureSocket(client_socket)
+                # Traces are recorded in cleartext, above the encryption
+                if self.recorder:
+                    client_socket = self.recorder.wrap(client_socket)
+                via = f" on {adapter.name}" if len(self.adapters) > 1 else ""
+                self.console.write(f"\nIncoming connection from {client_info}{via}...")
                 
                 # Handle authentication in a separate thread
                 auth_thread = threading.Thread(
@@ -80,7 +177,7 @@ class BluetoothHost:
                 
             except Exception as e:
                 if self.running:
-                    print(f"Error accepting connection: {e}")
+                    self.console.write(f"Error accepting connection: {e}")
     
     def _authenticate_client(self, client_socket, client_info):
         """Authenticate a client connection.
@@ -90,174 +187,646 @@ class BluetoothHost:
             client_info: Client's Bluetooth address
         """
         try:
-            # Request PIN
-            client_socket.send("AUTH_REQUEST".encode('utf-8'))
+            # Request PIN, opening the key exchange
+            exchange = self.auth.key_exchange() if self.encryption else None
+            offer = encode_json({"pake": exchange.message.hex()}) if exchange else b""
+            send_frame(client_socket, AUTH_REQUEST, offer)
             
-            # Receive PIN
-            received_pin = client_socket.recv(1024).decode('utf-8')
+            # Receive the client's half of the exchange (or PIN) and history cursor
+            reader = FrameReader(client_socket, max_size=MAX_CHAT_SIZE)
+            frame = reader.read_frame()
+            if frame is None or frame[0] != AUTH:
+                raise ProtocolError("Expected an AUTH frame")
+            request = decode_json(frame[1])
             
-            if self.auth.validate_pin(received_pin):
-                client_socket.send("AUTH_SUCCESS".encode('utf-8'))
-                
+            if exchange:
+                cipher = self._finish_key_exchange(exchange, request)
+                authenticated = cipher is not None
+            else:
+                authenticated = self.auth.validate_pin(str(request.get("pin", "")))
+            
+            if authenticated:
+                if exchange:
+                    # AUTH_SUCCESS is the first sealed frame, proving the host knows the PIN too
+                    client_socket.start_encryption(cipher)
                 with self.lock:
                     self.client_counter += 1
-                    peer_name = f"peer{self.client_counter}"
-                    self.clients[client_socket] = peer_name
+                    peer_id = f"peer{self.client_counter}"
+                epoch = self.message_manager.epoch
+                send_frame(client_socket, AUTH_SUCCESS, encode_json({"peer": peer_id, "epoch": epoch}))
+                # A cursor from before a restart counts other messages
+                cursor = request.get("cursor") if request.get("epoch") == epoch else None
                 
-                print(f"✓ {peer_name} connected ({client_info})")
-                self._display_status()
+                # Peers that acknowledge get a window of unacknowledged chat
+                window = request.get("ack_window")
+                if isinstance(window, int) and not isinstance(window, bool) and window > 0:
+                    window = AckWindow(min(window, MAX_WINDOW))
+                else:
+                    window = None
+                with self.lock:
+                    self.clients[client_socket] = peer_id
+                    self.fanout.add_peer(client_socket, window)
+                    # The others get a delta; the newcomer the whole roster once
+                    self._queue_roster_delta(self.roster.join(peer_id), exclude=client_socket)
+                    self.fanout.broadcast(OutboundMessage(encode_frame(ROSTER, encode_json(self.roster.snapshot()))),
+                                          [client_socket], lane=CONTROL)
+                    # Queued under the lock, so every broadcast the history
+                    # misses is queued after it
+                    self._send_history(client_socket, cursor, request.get("history"))
+                self.rate_limiter.add_peer(client_socket)
+                
+                self.console.write(f"✓ {peer_id} connected ({client_info}), {len(self.roster)} online")
                 
                 # Handle client messages
-                self._handle_client(client_socket, peer_name)
+                self._handle_client(client_socket, peer_id, reader, acks=window is not None)
             else:
-                client_socket.send("AUTH_FAILED".encode('utf-8'))
+                send_frame(client_socket, AUTH_FAILED)
                 client_socket.close()
-                print(f"✗ Authentication failed for {client_info}")
+                self.console.write(f"✗ Authentication failed for {client_info}")
                 
         except Exception as e:
-            print(f"Authentication error: {e}")
+            self.console.write(f"Authentication error: {e}")
             try:
                 client_socket.close()
-            except:
+            except OSError:
                 pass
     
-    def _handle_client(self, client_socket, peer_name):
+    def _finish_key_exchange(self, exchange, request):
+        """Complete the key exchange and check the client's key confirmation.
+        
+        Args:
+            exchange: Host side of the exchange
+            request: Decoded AUTH frame
+        
+        Returns:
+            SessionCipher: Cipher for the session, or None if the client
+                did not use the right PIN
+        """
+        try:
+            cipher = exchange.finish(bytes.fromhex(str(request.get("pake", ""))))
+            confirmation = bytes.fromhex(str(request.get("confirm", "")))
+        except (ValueError, ProtocolError):
+            return None
+        return cipher if cipher.verify(confirmation) else None
+    
+    def _send_history(self, client_socket, cursor=None, count=None):
+        """Queue one compressed HISTORY frame with recent messages for a peer.
+        
+        Args:
+            client_socket: Socket of the peer that just joined
+            cursor: Only send messages after this sequence number (optional)
+            count: Most messages the peer asked for (optional, capped by history_count)
+        """
+        limit = self.history_count
+        if isinstance(count, int) and count >= 0:
+            limit = min(limit, count)
+        if not isinstance(cursor, int) or cursor < 0:
+            cursor = None
+        
+        if cursor is not None:
+            messages = list(deque(self.message_manager.get_messages_after(cursor), maxlen=limit))
+        else:
+            messages = self.message_manager.get_messages(limit=limit) if limit else []
+        if self.history_age is not None:
+            cutoff = datetime.now() - timedelta(seconds=self.history_age)
+            messages = [msg for msg in messages if msg.timestamp >= cutoff]
+        
+        payload = encode_history(messages)
+        # Keep the newest half until the frame fits
+        while len(payload) > MAX_FRAME_SIZE and messages:
+            messages = messages[len(messages) // 2 + 1:]
+            payload = encode_history(messages)
+        self.fanout.broadcast(OutboundMessage(encode_frame(HISTORY, payload)), [client_socket])
+    
+    def _handle_client(self, client_socket, peer_id, reader, acks=False):
         """Handle messages from a connected client.
         
         Args:
             client_socket: Client's socket
-            peer_name: Name assigned to the peer
+            peer_id: Id assigned to the peer (also its name until it picks one)
+            reader: FrameReader of the client's socket
+            acks: Acknowledge the peer's messages
         """
+        peer_name = peer_id
+        chats = 0  # CHAT frames handled, the position the peer's messages are acked by
+        acked = 0  # position of the last ack sent
+        dropped = []  # positions of messages dropped since the last ack
         try:
             while self.running:
-                data = client_socket.recv(1024)
-                if not data:
+                if acks and chats > acked and not reader.pending:
+                    # Everything received so far is handled; ack before blocking
+                    acked = self._send_ack(client_socket, chats, dropped)
+                frame = reader.read_frame()
+                if frame is None:
                     break
                 
-                message = data.decode('utf-8')
-                self.message_manager.add_message(peer_name, message)
+                frame_type, data = frame
+                # Any frame shows the peer is alive, acks from a peer that only listens included
+                if client_socket in self.keepalives:
+                    self._heard_from(client_socket)
+                if frame_type == ACK:
+                    self.fanout.acknowledged(client_socket, decode_ack(data)[0])
+                    continue
+                if frame_type == KEEPALIVE:
+                    self._expect_keepalives(client_socket, data)
+                    continue
+                if frame_type == NICK:
+                    peer_name = self._rename_peer(client_socket, peer_id, peer_name, data)
+                    continue
+                if frame_type != CHAT:
+                    continue
                 
-                # Display the message
-                messages = self.message_manager.get_messages(limit=1)
-                if messages:
-                    print(f"\n{messages[-1]}")
-                    print("\nhost> ", end='', flush=True)
+                chats += 1
+                if not self.rate_limiter.admit(client_socket, len(data)):
+                    self._send_throttle_notice(client_socket)
+                    if acks:
+                        dropped.append(chats)
+                        if len(dropped) >= self.MAX_ACK_DROPS:
+                            acked = self._send_ack(client_socket, chats, dropped)
+                    continue
+                
+                # Store and broadcast to the other clients; the payload stays
+                # bytes and is decoded only for display
+                msg = self._store_and_broadcast(peer_name, data, exclude=client_socket)[0]
                 
-                # Broadcast to other clients
-                self._broadcast_message(peer_name, message, exclude=client_socket)
+                # Display the message
+                self.console.write(f"\n{msg}")
                 
         except Exception as e:
-            print(f"\nError with {peer_name}: {e}")
+            self.console.write(f"\nError with {peer_name}: {e}")
         finally:
-            self._disconnect_client(client_socket, peer_name)
+            self._disconnect_client(client_socket, peer_id)
+    
+    def send_message(self, message, ttl=None):
+        """Store a message from the host and broadcast it to every peer.
+        
+        Args:
+            message: Message text
+            ttl: Seconds until the message expires (None for the default expiry)
+        
+        Returns:
+            Fanout: Tracker that completes once every peer was sent the message
+        """
+        msg, fanout = self._store_and_broadcast("host", message, ttl=ttl)
+        return fanout
     
-    def _broadcast_message(self, sender, message, exclude=None):
-        """Broadcast a message to all connected clients.
+    def _store_and_broadcast(self, sender, content, ttl=None, exclude=None):
+        """Store a message and broadcast it to all connected clients.
+        
+        The sequence number is assigned and the broadcast queued under one
+        lock, so every peer is sent messages in sequence order; a client
+        skips anything numbered below what it already has.
         
         Args:
-            sender: Name of the message sender
-            message: Message content
+            sender: Name of the sender
+            content: Message content
+            ttl: Seconds until the message expires (None for the default expiry)
             exclude: Socket to exclude from broadcast (optional)
+        
+        Returns:
+            tuple: (stored Message, Fanout tracking its broadcast)
         """
-        formatted_msg = f"{sender}: {message}"
+        with self.lock:
+            msg = self.message_manager.add_message(sender, content, ttl=ttl)
+            return msg, self._queue_message(msg, exclude)
+    
+    def _broadcast_message(self, msg, exclude=None):
+        """Broadcast a stored message to all connected clients.
         
+        Args:
+            msg: Message returned by the message manager
+            exclude: Socket to exclude from broadcast (optional)
+            
+        Returns:
+            Fanout: Tracker that completes once every peer was sent the message
+        """
         with self.lock:
-            for client_socket in list(self.clients.keys()):
-                if client_socket != exclude:
-                    try:
-                        client_socket.send(formatted_msg.encode('utf-8'))
-                    except:
-                        # Client disconnected
-                        pass
-    
-    def _disconnect_client(self, client_socket, peer_name):
+            return self._queue_message(msg, exclude)
+    
+    def _queue_message(self, msg, exclude=None):
+        """Queue a stored message for every peer. Call with self.lock held.
+        
+        Returns:
+            Fanout: Tracker that completes once every peer was sent the message
+        """
+        # Encode the frame once and reuse it, with the payload, for every peer
+        outbound = encode_message(msg.seq, msg.timestamp.timestamp(), msg.expires_at,
+                                  msg.sender, msg.payload)
+        
+        # Sends happen on the sender pool, whose peers are self.clients; a
+        # peer that disconnected is cleaned up by its receive thread
+        return self.fanout.broadcast(outbound, exclude=exclude)
+    
+    def _send_ack(self, client_socket, position, dropped):
+        """Acknowledge a peer's messages up to a position, ahead of queued chat.
+        
+        Args:
+            client_socket: Socket of the peer
+            position: Count of the peer's CHAT frames handled
+            dropped: Positions of the messages among them that were dropped;
+                cleared once sent
+        
+        Returns:
+            int: The position acknowledged
+        """
+        ack = OutboundMessage(encode_frame(ACK, encode_ack(position, dropped)))
+        dropped.clear()
+        self.fanout.broadcast(ack, [client_socket], lane=CONTROL)
+        return position
+    
+    def _send_failed(self, client_socket, error):
+        """Report a failed send and hang up on the peer.
+        
+        Called from the sender threads. The peer's reader thread notices
+        the connection is gone and disconnects it.
+        
+        Args:
+            client_socket: Socket of the peer
+            error: Exception raised by the send
+        """
+        with self.lock:
+            peer_name = self.clients.get(client_socket)
+            first = peer_name is not None and client_socket not in self.send_failures
+            if first:
+                self.send_failures.add(client_socket)
+        if not first:
+            return
+        self.console.write(f"\n✗ Could not send to {peer_name}: {error}")
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def _rename_peer(self, client_socket, peer_id, peer_name, data):
+        """Change a peer's name at its request and tell every peer.
+        
+        Args:
+            client_socket: Client's socket
+            peer_id: Id of the peer
+            peer_name: Current name of the peer
+            data: Payload of the NICK frame
+        
+        Returns:
+            str: The peer's name from now on
+        """
+        try:
+            with self.lock:
+                delta = self.roster.rename(peer_id, data.decode('utf-8'))
+                self.clients[client_socket] = delta["name"]
+                self._queue_roster_delta(delta)
+        except ValueError as e:
+            self._send_notice(client_socket, f"Could not change your name: {e}")
+            return peer_name
+        self.console.write(f"\n{peer_name} is now {delta['name']}")
+        return delta["name"]
+    
+    def _expect_keepalives(self, client_socket, data):
+        """Note the keepalive interval a peer announced.
+        
+        A peer that announced one is disconnected once it stays silent for
+        KEEPALIVE_MISSES intervals; the interval grows while a phone app is
+        in the background, so the peer is not dropped for saving power.
+        
+        Args:
+            client_socket: Client's socket
+            data: Payload of the KEEPALIVE frame
+        """
+        interval = decode_json(data).get("interval")
+        with self.keepalive_watch:
+            if isinstance(interval, (int, float)) and interval > 0:
+                self.keepalives[client_socket] = (interval, time.monotonic() + interval * self.KEEPALIVE_MISSES)
+            else:
+                self.keepalives.pop(client_socket, None)
+            if self.keepalive_thread is None:
+                self.keepalive_thread = threading.Thread(target=self._watch_keepalives, daemon=True)
+                self.keepalive_thread.start()
+            self.keepalive_watch.notify()
+    
+    def _heard_from(self, client_socket):
+        """Push back the deadline of a peer that sends keepalives."""
+        with self.keepalive_watch:
+            entry = self.keepalives.get(client_socket)
+            if entry:
+                self.keepalives[client_socket] = (entry[0], time.monotonic() + entry[0] * self.KEEPALIVE_MISSES)
+    
+    def _watch_keepalives(self):
+        """Background thread: disconnect peers that went silent.
+        
+        Sleeps until the earliest deadline instead of polling.
+        """
+        while self.running:
+            with self.keepalive_watch:
+                now = time.monotonic()
+                overdue = [(client_socket, interval) for client_socket, (interval, deadline)
+                           in self.keepalives.items() if deadline <= now]
+                for client_socket, interval in overdue:
+                    del self.keepalives[client_socket]
+                if not overdue:
+                    deadline = min((deadline for interval, deadline in self.keepalives.values()), default=None)
+                    self.keepalive_watch.wait(None if deadline is None else deadline - now)
+            
+            for client_socket, interval in overdue:
+                with self.lock:
+                    peer_name = self.clients.get(client_socket, "peer")
+                self.console.write(f"\n✗ {peer_name} silent for {interval * self.KEEPALIVE_MISSES:.0f} s, "
+                                   "disconnecting")
+                # Wakes the peer's reader thread, which disconnects it
+                try:
+                    client_socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+    
+    def _queue_roster_delta(self, delta, exclude=None):
+        """Send a roster change to every peer. Call with self.lock held.
+        
+        Args:
+            delta: Change returned by the roster
+            exclude: Socket to skip (optional)
+        """
+        outbound = OutboundMessage(encode_frame(ROSTER_DELTA, encode_json(delta)))
+        self.fanout.broadcast(outbound, lane=CONTROL, exclude=exclude)
+    
+    def _send_throttle_notice(self, client_socket):
+        """Tell a peer its messages are being dropped, at most every few seconds.
+        
+        Args:
+            client_socket: Socket of the throttled peer
+        """
+        now = time.monotonic()
+        if now - self.throttle_notices.get(client_socket, 0) < self.THROTTLE_NOTICE_INTERVAL:
+            return
+        self.throttle_notices[client_socket] = now
+        self._send_notice(client_socket, "You are sending too fast; some messages were dropped.")
+    
+    def _send_notice(self, client_socket, text):
+        """Send a message from the host to one peer, ahead of queued chat.
+        
+        Args:
+            client_socket: Socket of the peer
+            text: Notice text
+        """
+        # Sequence number 0: the notice is not part of the stored history
+        notice = encode_message(
+            0, time.time(), time.time() + self.message_manager.expiry_minutes * 60, "host",
+            text.encode('utf-8')
+        )
+        self.fanout.broadcast(notice, [client_socket], lane=CONTROL)
+    
+    def _disconnect_client(self, client_socket, peer_id):
         """Disconnect a client.
         
         Args:
             client_socket: Client's socket
-            peer_name: Name of the peer
+            peer_id: Id of the peer
         """
         with self.lock:
-            if client_socket in self.clients:
-                del self.clients[client_socket]
+            peer_name = self.clients.pop(client_socket, peer_id)
+            # The sender pool's peers stay the same as self.clients
+            self.fanout.remove_peer(client_socket)
+            self.send_failures.discard(client_socket)
+            delta = self.roster.leave(peer_id)
+            if delta:
+                self._queue_roster_delta(delta)
+        self.rate_limiter.remove_peer(client_socket)
+        self.throttle_notices.pop(client_socket, None)
+        with self.keepalive_watch:
+            self.keepalives.pop(client_socket, None)
         
         try:
             client_socket.close()
-        except:
+        except OSError:
             pass
         
-        print(f"\n✗ {peer_name} disconnected")
-        self._display_status()
-        print("\nhost> ", end='', flush=True)
+        self.console.write(f"\n✗ {peer_name} disconnected, {len(self.roster)} online")
     
     def _display_status(self):
-        """Display current connection status."""
+        """Display the peers online, from the roster."""
+        entries = self.roster.entries()
+        lines = [f"\n--- Connected Peers (roster v{self.roster.version}) ---"]
+        lines += [f"  • {name}" if name == peer_id else f"  • {name} ({peer_id})"
+                  for peer_id, name in entries] or ["  (none)"]
+        lines.append("-----------------------")
+        self.console.write("\n".join(lines))
+    
+    def _display_fanout_stats(self):
+        """Display broadcast fan-out timings."""
+        summary = self.fanout.stats.summary()
         with self.lock:
-            print("\n--- Connected Peers ---")
-            if self.clients:
-                for peer_name in self.clients.values():
-                    print(f"  • {peer_name}")
-            else:
-                print("  (none)")
-            print("-----------------------")
+            names = dict(self.clients)
+        
+        self.console.write(f"\n--- Broadcast Fan-out ({len(self.fanout.threads)} senders) ---")
+        self.console.write(f"  broadcasts: {summary['broadcasts']}, "
+                           f"completion mean {summary['mean_completion'] * 1000:.1f} ms, "
+                           f"max {summary['max_completion'] * 1000:.1f} ms")
+        for sock, (count, mean, worst) in summary['peers'].items():
+            if sock in names:
+                self.console.write(f"  • {names[sock]}: {count} sent, "
+                                   f"mean {mean * 1000:.1f} ms, max {worst * 1000:.1f} ms")
+        for lane, (count, mean, worst) in self.fanout.lane_stats.summary().items():
+            self.console.write(f"  {lane} lane: {count} queued, "
+                               f"wait mean {mean * 1000:.2f} ms, max {worst * 1000:.2f} ms")
+        self.console.write("-----------------------")
+    
+    def _display_delivery_stats(self):
+        """Display the unacknowledged messages and ack latency of each peer."""
+        summary = self.fanout.delivery_summary()
+        if not summary:
+            return
+        with self.lock:
+            names = dict(self.clients)
+        
+        self.console.write("\n--- Delivery ---")
+        for sock, stats in summary.items():
+            if sock in names:
+                self.console.write(f"  • {names[sock]}: {stats['outstanding']} unacked, {stats['held']} held, "
+                                   f"{stats['acked']} acked, ack mean {stats['mean_latency'] * 1000:.1f} ms, "
+                                   f"max {stats['max_latency'] * 1000:.1f} ms")
+        self.console.write("-----------------------")
+    
+    def _display_adapter_stats(self):
+        """Display the peers and traffic of each adapter."""
+        self.console.write(f"\n--- Adapters ({len(self.adapters)}) ---")
+        for adapter in self.adapters:
+            stats = adapter.stats
+            rate_in, rate_out, elapsed = stats.sample()
+            capacity = adapter.capacity if adapter.capacity is not None else "-"
+            self.console.write(f"  • {adapter.name}: {adapter.peers}/{capacity} peers, "
+                               f"{stats.connections} joined, {stats.refused} refused, "
+                               f"{stats.redirected} sent to a less loaded adapter")
+            self.console.write(f"    in {stats.bytes_in:,} B, out {stats.bytes_out:,} B; "
+                               f"last {elapsed:.0f} s: in {rate_in / 1024:.1f} KiB/s, "
+                               f"out {rate_out / 1024:.1f} KiB/s")
+        self.console.write("-----------------------")
+    
+    def _display_throttle_stats(self):
+        """Display rate limiting counters."""
+        if not self.rate_limiter.enabled:
+            return
+        totals, peers = self.rate_limiter.stats()
+        with self.lock:
+            names = dict(self.clients)
+        
+        self.console.write(f"\n--- Rate Limiting ({self.rate_limiter.policy}) ---")
+        self.console.write(f"  delayed: {totals.delayed} ({totals.delay_seconds:.1f} s total), "
+                           f"dropped: {totals.dropped}")
+        for sock, stats in peers.items():
+            if sock in names and (stats.delayed or stats.dropped):
+                self.console.write(f"  • {names[sock]}: delayed {stats.delayed}, dropped {stats.dropped}")
+        self.console.write("-----------------------")
     
     def _handle_input(self):
         """Handle user input for sending messages."""
         try:
             while self.running:
-                message = input("\nhost> ")
+                message = self.console.input("host> ")
                 
                 if message.lower() == '/quit':
-                    print("\nShutting down...")
+                    self.console.write("\nShutting down...")
                     self.stop()
                     break
                 elif message.lower() == '/status':
                     self._display_status()
+                    self._display_adapter_stats()
+                    self._display_fanout_stats()
+                    self._display_delivery_stats()
+                    self._display_throttle_stats()
+                elif message.lower().startswith('/search'):
+                    self._search(message[len('/search'):].strip())
                 elif message.lower() == '/messages':
-                    print("\n--- Recent Messages ---")
+                    self.console.write("\n--- Recent Messages ---")
                     messages = self.message_manager.get_messages()
                     if messages:
                         for msg in messages:
-                            print(msg)
+                            self.console.write(msg)
                     else:
-                        print("  (no messages)")
-                    print("-----------------------")
+                        self.console.write("  (no messages)")
+                    self.console.write("-----------------------")
+                elif message.lower().startswith('/ttl'):
+                    self._send_with_ttl(message[len('/ttl'):].strip())
                 elif message.strip():
                     # Send message to all clients
-                    self.message_manager.add_message("host", message)
-                    self._broadcast_message("host", message)
+                    self.send_message(message)
                     
         except KeyboardInterrupt:
-            print("\n\nShutting down...")
+            self.console.write("\n\nShutting down...")
             self.stop()
     
+    def _send_with_ttl(self, args):
+        """Send a message that expires after its own time-to-live.
+        
+        Args:
+            args: "<seconds> <message>"
+        """
+        parts = args.split(None, 1)
+        try:
+            ttl = float(parts[0])
+        except (IndexError, ValueError):
+            ttl = None
+        if ttl is None or ttl <= 0 or len(parts) < 2:
+            self.console.write("Usage: /ttl <seconds> <message>")
+            return
+        
+        self.send_message(parts[1], ttl=ttl)
+    
+    def _search(self, query):
+        """Show messages matching a search query.
+        
+        Args:
+            query: Search terms (``term*`` for prefixes, ``from:<sender>`` to filter)
+        """
+        if not query:
+            self.console.write("Usage: /search <terms> [from:<sender>]")
+            return
+        
+        self.console.write(f"\n--- Search: {query} ---")
+        results = self.message_manager.search(query, limit=50)
+        if results:
+            for msg in results:
+                self.console.write(msg)
+        else:
+            self.console.write("  (no matches)")
+        self.console.write("-----------------------")
+    
     def stop(self):
-        """Stop the server and cleanup."""
+        """Stop the server, cleanup and exit."""
+        self.shutdown()
+        sys.exit(0)
+    
+    def shutdown(self):
+        """Close every connection and stop background threads."""
         self.running = False
+        with self.keepalive_watch:
+            self.keepalive_watch.notify()
         
         # Close all client connections
         with self.lock:
             for client_socket in list(self.clients.keys()):
                 try:
                     client_socket.close()
-                except:
+                except OSError:
                     pass
             self.clients.clear()
         
-        # Close server socket
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-            except:
-                pass
+        # Close server sockets
+        for adapter in self.adapters:
+            adapter.close()
         
-        # Stop message manager
+        # Stop sender threads and message manager
+        self.fanout.stop()
         self.message_manager.stop()
-        
-        print("Server stopped.")
-        sys.exit(0)
+        if self.recorder:
+            self.recorder.close()
+        self.console.write("Server stopped.")
+        self.console.stop()
 
 
 if __name__ == "__main__":
-    host = BluetoothHost()
+    parser = argparse.ArgumentParser(description="Bluetooth Messenger host")
+    parser.add_argument("--log-dir", help="Keep an append-only message log here to survive restarts")
+    parser.add_argument("--sender-workers", type=int, default=4,
+                        help="Number of threads sending broadcasts to peers (default: 4)")
+    parser.add_argument("--peer-msg-rate", type=float, default=20,
+                        help="Messages per second allowed from each peer (default: 20, 0 for no limit)")
+    parser.add_argument("--peer-byte-rate", type=float, default=32 * 1024,
+                        help="Bytes per second allowed from each peer (default: 32768, 0 for no limit)")
+    parser.add_argument("--global-msg-rate", type=float, default=200,
+                        help="Messages per second allowed from all peers together (default: 200, 0 for no limit)")
+    parser.add_argument("--global-byte-rate", type=float, default=0,
+                        help="Bytes per second allowed from all peers together (default: no limit)")
+    parser.add_argument("--rate-policy", choices=RateLimiter.POLICIES, default="drop",
+                        help="What to do with over-limit messages (default: drop)")
+    parser.add_argument("--history-count", type=int, default=200,
+                        help="Most recent messages sent to a peer when it joins (default: 200)")
+    parser.add_argument("--history-age", type=float,
+                        help="Only send a joining peer messages from the last N seconds (default: all retained)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="Record all traffic to a trace file for benchmarks/replay_trace.py")
+    endpoints = parser.add_mutually_exclusive_group()
+    endpoints.add_argument("--adapter", action="append", metavar="ADDRESS",
+                           help="Listen on this local Bluetooth adapter; repeat to spread peers "
+                                "over several radios (default: the default adapter)")
+    endpoints.add_argument("--loopback", type=int, metavar="N",
+                           help="Listen on N loopback TCP endpoints instead of Bluetooth, for testing")
+    parser.add_argument("--adapter-capacity", type=int, default=DEFAULT_CAPACITY,
+                        help=f"Most peers on each adapter (default: {DEFAULT_CAPACITY}, 0 for no limit)")
+    args = parser.parse_args()
+    
+    if args.loopback:
+        transports = [LoopbackTransport() for _ in range(args.loopback)]
+    elif args.adapter:
+        transports = [BluetoothTransport(address) for address in args.adapter]
+    else:
+        transports = None
+    
+    rate_limiter = RateLimiter(
+        message_rate=args.peer_msg_rate,
+        byte_rate=args.peer_byte_rate,
+        global_message_rate=args.global_msg_rate,
+        global_byte_rate=args.global_byte_rate,
+        policy=args.rate_policy
+    )
+    host = BluetoothHost(log_dir=args.log_dir, sender_workers=args.sender_workers,
+                         rate_limiter=rate_limiter, history_count=args.history_count,
+                         history_age=args.history_age, record_path=args.record, transport=transports,
+                         adapter_capacity=args.adapter_capacity or None)
     host.start()
@@ -0,0 +1,174 @@
+"""
+Priority lanes for outgoing frames.
+Control frames (auth replies, notices, roster updates, acks, keepalives)
+and bulk frames (chat messages, history) are queued separately. A
+weighted round robin serves the control lane first, but lets a bulk
+frame through after every few control frames, so neither lane can
+starve the other. Frames keep their order within a lane.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+CONTROL = 0
+BULK = 1
+LANE_NAMES = ("control", "bulk")
+
+# Frames served from each lane per round while both have frames waiting
+DEFAULT_WEIGHTS = (8, 1)
+
+
+class LaneStats:
+    """Queueing delay of each lane."""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.delays = [[0, 0.0, 0.0] for _ in LANE_NAMES]  # [frames, total seconds, max seconds]
+    
+    def record(self, lane, delay):
+        with self.lock:
+            entry = self.delays[lane]
+            entry[0] += 1
+            entry[1] += delay
+            if delay > entry[2]:
+                entry[2] = delay
+    
+    def summary(self):
+        """Return queueing delay statistics.
+        
+        Returns:
+            dict: {lane name: (frames, mean delay, max delay)}
+        """
+        with self.lock:
+            return {name: (count, total / count if count else 0.0, worst)
+                    for name, (count, total, worst) in zip(LANE_NAMES, self.delays)}
+
+
+class LaneScheduler:
+    """Weighted round robin over the lanes. Not thread-safe on its own."""
+    
+    def __init__(self, weights=DEFAULT_WEIGHTS, stats=None):
+        """
+        Args:
+            weights: Frames served per round from each lane, control first
+            stats: LaneStats to record queueing delay in (optional)
+        """
+        self.weights = weights
+        self.credits = list(weights)
+        self.lanes = [deque() for _ in LANE_NAMES]
+        # perf_counter time each item was queued, kept apart from the items
+        # so queueing one does not allocate a pair
+        self.queued_at = [deque() for _ in LANE_NAMES]
+        self.stats = stats or LaneStats()
+    
+    def push(self, lane, item):
+        """Queue an item at the end of a lane."""
+        self.lanes[lane].append(item)
+        self.queued_at[lane].append(time.perf_counter())
+    
+    def pop(self):
+        """Take the next item to send.
+        
+        Returns:
+            tuple: (lane, item), or None if every lane is empty
+        """
+        lane = self._next_lane()
+        if lane is None:
+            return None
+        return lane, self._take(lane)
+    
+    def pop_item(self):
+        """Take the next item to send, like pop() but without its lane.
+        
+        Returns:
+            The item, or None if every lane is empty
+        """
+        lane = self._next_lane()
+        if lane is None:
+            return None
+        return self._take(lane)
+    
+    def _next_lane(self):
+        """Charge the lane to serve next for one item and return it (None if all are empty)."""
+        for attempt in range(2):
+            for lane, queue in enumerate(self.lanes):
+                if queue and self.credits[lane] > 0:
+                    self.credits[lane] -= 1
+                    return lane
+            # Every lane with frames waiting used up its share: start a new round
+            self.credits[:] = self.weights
+        return None
+    
+    def _take(self, lane):
+        """Remove the oldest item of a lane, recording how long it waited."""
+        self.stats.record(lane, time.perf_counter() - self.queued_at[lane].popleft())
+        return self.lanes[lane].popleft()
+    
+    def drain(self):
+        """Remove and return every queued item."""
+        items = [item for queue in self.lanes for item in queue]
+        for queue in self.lanes + self.queued_at:
+            queue.clear()
+        return items
+    
+    def __len__(self):
+        return sum(len(queue) for queue in self.lanes)
+
+
+class LaneQueue:
+    """Thread-safe LaneScheduler that blocks until an item is available."""
+    
+    def __init__(self, weights=DEFAULT_WEIGHTS, stats=None):
+        self.scheduler = LaneScheduler(weights, stats)
+        self.cond = threading.Condition()
+        self.closed = False
+    
+    def put(self, lane, item):
+        with self.cond:
+            self.scheduler.push(lane, item)
+            self.cond.notify()
+    
+    def get(self):
+        """Wait for the next item.
+        
+        Returns:
+            tuple: (lane, item), or None once the queue is closed and empty
+        """
+        with self.cond:
+            while True:
+                entry = self.scheduler.pop()
+                if entry is not None or self.closed:
+                    return entry
+                self.cond.wait()
+    
+    def get_many(self, limit):
+        """Wait for the next item, and take those queued behind it too.
+        
+        Args:
+            limit: Most items to take
+        
+        Returns:
+            list: Items, without their lanes, in the order get() would
+                return them; empty once the queue is closed and empty
+        """
+        with self.cond:
+            while True:
+                item = self.scheduler.pop_item()
+                if item is not None or self.closed:
+                    break
+                self.cond.wait()
+            items = []
+            while item is not None:
+                items.append(item)
+                if len(items) == limit:
+                    break
+                item = self.scheduler.pop_item()
+            return items
+    
+    def close(self):
+        """Let get() return None, and get_many() nothing, once the queued items are taken."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
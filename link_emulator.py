@@ -0,0 +1,263 @@
+"""
+Emulated Bluetooth link for benchmarks without hardware.
+EmulatedLinkTransport wraps another transport (loopback by default) and
+sends everything the local side writes through a shaped link: limited
+bandwidth, one-way latency with jitter, MTU-sized packets, a bounded
+in-flight window and occasional stalls, all driven by a seeded random
+generator so runs are repeatable.
+
+Each side only shapes what it transmits, like a radio. Give the host and
+the clients an emulated transport to shape both directions.
+"""
+
+import asyncio
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+from transport import LoopbackTransport
+
+
+class LinkConditions:
+    """Parameters of an emulated link.
+    
+    The defaults approximate a Bluetooth Classic RFCOMM link at short range.
+    """
+    
+    def __init__(self, bandwidth=128 * 1024, latency=0.015, jitter=0.005, mtu=1011,
+                 window=16 * 1024, stall_probability=0.001, stall_duration=0.2):
+        """
+        Args:
+            bandwidth: Bytes per second (None for no limit)
+            latency: One-way delay in seconds
+            jitter: Largest extra random delay per packet, in seconds
+            mtu: Largest packet in bytes
+            window: Most bytes in flight before the sender blocks
+            stall_probability: Chance that a packet stalls the link
+            stall_duration: Seconds a stall holds up the link
+        """
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.jitter = jitter
+        self.mtu = mtu
+        self.window = window
+        self.stall_probability = stall_probability
+        self.stall_duration = stall_duration
+
+
+class LinkStats:
+    """Counters of one direction of an emulated link."""
+    
+    def __init__(self):
+        self.bytes = 0
+        self.packets = 0
+        self.stalls = 0
+        self.max_delay = 0.0  # longest time a packet spent in the link
+    
+    def add(self, other):
+        """Add another link's counters to these."""
+        self.bytes += other.bytes
+        self.packets += other.packets
+        self.stalls += other.stalls
+        self.max_delay = max(self.max_delay, other.max_delay)
+
+
+class EmulatedLink:
+    """Shapes the bytes written to ``local`` on their way to ``remote``.
+    
+    Bytes arriving from ``remote`` are passed back to ``local`` unshaped.
+    """
+    
+    def __init__(self, local, remote, conditions, rng, on_close=None):
+        self.local = local
+        self.remote = remote
+        self.conditions = conditions
+        self.rng = rng
+        self.stats = LinkStats()
+        self.in_flight = deque()  # (delivery time, packet)
+        self.in_flight_bytes = 0
+        self.closed = False
+        self.on_close = on_close  # called with the link once it is closed
+        self.cond = threading.Condition()
+        for target in (self._transmit, self._deliver, self._receive):
+            threading.Thread(target=target, daemon=True).start()
+    
+    def _transmit(self):
+        """Cut outgoing data into packets and schedule their delivery."""
+        conditions = self.conditions
+        link_free_at = time.monotonic()
+        last_delivery = 0.0
+        try:
+            while True:
+                with self.cond:
+                    while self.in_flight_bytes >= conditions.window and not self.closed:
+                        self.cond.wait()
+                packet = self.local.recv(conditions.mtu)
+                if not packet:
+                    break
+                
+                now = time.monotonic()
+                start = max(now, link_free_at)
+                if self.rng.random() < conditions.stall_probability:
+                    start += conditions.stall_duration
+                    self.stats.stalls += 1
+                if conditions.bandwidth:
+                    link_free_at = start + len(packet) / conditions.bandwidth
+                else:
+                    link_free_at = start
+                delivery = link_free_at + conditions.latency + self.rng.uniform(0, conditions.jitter)
+                # RFCOMM delivers in order: jitter cannot reorder packets
+                delivery = last_delivery = max(delivery, last_delivery)
+                
+                with self.cond:
+                    self.in_flight.append((delivery, packet))
+                    self.in_flight_bytes += len(packet)
+                    self.cond.notify_all()
+                self.stats.bytes += len(packet)
+                self.stats.packets += 1
+                self.stats.max_delay = max(self.stats.max_delay, delivery - now)
+        except OSError:
+            pass
+        with self.cond:
+            self.in_flight.append((None, b""))
+            self.cond.notify_all()
+    
+    def _deliver(self):
+        """Write packets to the remote side once their delivery time comes."""
+        try:
+            while True:
+                with self.cond:
+                    while not self.in_flight:
+                        self.cond.wait()
+                    delivery, packet = self.in_flight[0]
+                if delivery is None:
+                    self.remote.shutdown(socket.SHUT_WR)
+                    break
+                delay = delivery - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.remote.sendall(packet)
+                with self.cond:
+                    self.in_flight.popleft()
+                    self.in_flight_bytes -= len(packet)
+                    self.cond.notify_all()
+        except OSError:
+            pass
+        self._close()
+    
+    def _receive(self):
+        """Pass incoming data through to the local side."""
+        try:
+            while True:
+                data = self.remote.recv(65536)
+                if not data:
+                    self.local.shutdown(socket.SHUT_WR)
+                    break
+                self.local.sendall(data)
+        except OSError:
+            pass
+        self._close()
+    
+    def _close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        for sock in (self.local, self.remote):
+            try:
+                sock.close()
+            except OSError:
+                pass
+        if self.on_close:
+            self.on_close(self)
+
+
+class EmulatedLinkTransport:
+    """Transport whose outgoing traffic goes through an emulated link."""
+    
+    def __init__(self, inner=None, conditions=None, seed=0):
+        """
+        Args:
+            inner: Transport carrying the traffic (default: LoopbackTransport)
+            conditions: LinkConditions (default: a typical RFCOMM link)
+            seed: Seed for jitter and stalls; every connection gets its own
+                generator derived from it, so runs are repeatable
+        """
+        self.inner = inner or LoopbackTransport()
+        self.conditions = conditions or LinkConditions()
+        self.seed = seed
+        self.links = []  # open links
+        self.closed_stats = LinkStats()  # totals of the links already closed
+        self.connections = 0
+        self.lock = threading.Lock()
+    
+    def _attach(self, remote):
+        """Put a link in front of a connected socket.
+        
+        Returns:
+            socket.socket: Local end to use in place of remote
+        """
+        local, link_end = socket.socketpair()
+        # Small local buffers, so the writer feels the link's backpressure
+        for sock in (local, link_end):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        with self.lock:
+            rng = random.Random(f"{self.seed}:{self.connections}")
+            self.connections += 1
+            # Added under the lock, so _forget cannot run before the link is listed
+            self.links.append(EmulatedLink(link_end, remote, self.conditions, rng, on_close=self._forget))
+        return local
+    
+    def _forget(self, link):
+        """Drop a closed link, keeping its counters in the totals."""
+        with self.lock:
+            self.links.remove(link)
+            self.closed_stats.add(link.stats)
+    
+    def listen(self, backlog=5):
+        return self.inner.listen(backlog)
+    
+    def accept(self, server_socket):
+        """Wait for a connection and put a link in front of it.
+        
+        Returns:
+            tuple: (client socket, client address)
+        """
+        client_socket, client_info = self.inner.accept(server_socket)
+        return self._attach(client_socket), client_info
+    
+    def connect(self):
+        """Connect with a blocking socket through a link.
+        
+        Returns:
+            socket.socket: Connected socket
+        """
+        return self._attach(self.inner.connect())
+    
+    async def open(self):
+        """Connect as an asyncio client through a link.
+        
+        Returns:
+            tuple: (StreamReader, StreamWriter)
+        """
+        loop = asyncio.get_running_loop()
+        local = await loop.run_in_executor(None, self.connect)
+        return await asyncio.open_connection(sock=local)
+    
+    def stats(self):
+        """Return totals over every link of this transport.
+        
+        Returns:
+            LinkStats: Summed counters (max_delay is the largest of any link)
+        """
+        totals = LinkStats()
+        with self.lock:
+            totals.add(self.closed_stats)
+            links = list(self.links)
+        for link in links:
+            totals.add(link.stats)
+        return totals
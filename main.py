@@ -13,12 +13,17 @@ from kivy.uix.scrollview import ScrollView
 from kivy.properties import StringProperty, ListProperty
 from kivy.clock import Clock
 from kivy.core.window import Window
+from kivy.logger import Logger
 
-import bluetooth
+import asyncio
 import threading
+import time
 from datetime import datetime
-from auth import AuthManager
+from async_client import AsyncClient, AuthenticationFailed, ClientError, Disconnected, ServiceNotFound
+from discovery import HostScanner
+from host import BluetoothHost
 from message_manager import MessageManager
+from transport import BluetoothTransport
 
 
 class DeviceSelectionScreen(Screen):
@@ -79,51 +84,66 @@ class DeviceSelectionScreen(Screen):
         self.layout.add_widget(host_btn)
         
         self.add_widget(self.layout)
-        self.devices = []
+        self.scanner = None
+        self.device_buttons = {}  # {address: Button}
+        self.host_buttons = set()
     
     def scan_devices(self, instance):
         """Scan for nearby Bluetooth devices"""
         self.scan_btn.disabled = True
         self.status_label.text = 'Scanning for devices...'
         self.device_list.clear_widgets()
+        self.device_buttons = {}
+        self.host_buttons = set()
         
-        # Run scan in background thread
-        threading.Thread(target=self._scan_thread, daemon=True).start()
+        # Devices show up as they are found; the scanner probes them in the background
+        self.scanner = HostScanner(
+            on_update=lambda device: Clock.schedule_once(lambda dt: self._show_device(device)),
+            on_done=lambda scanner: Clock.schedule_once(lambda dt: self._scan_done(scanner))
+        )
+        self.scanner.start()
     
-    def _scan_thread(self):
-        """Background thread for device scanning"""
-        try:
-            nearby_devices = bluetooth.discover_devices(
-                duration=8,
-                lookup_names=True,
-                flush_cache=True
-            )
-            
-            self.devices = nearby_devices
-            Clock.schedule_once(lambda dt: self._update_device_list(nearby_devices))
-            
-        except Exception as e:
-            Clock.schedule_once(lambda dt: self._scan_error(str(e)))
+    def _show_device(self, device):
+        """Add or update the button of a found device"""
+        if self.scanner.devices.get(device.address) is not device:
+            return  # left over from an earlier scan
+        if device.is_host:
+            state, color = 'Messenger host', (0.2, 0.6, 0.3, 1)
+        elif device.probed:
+            state, color = 'No messenger service', (0.25, 0.25, 0.25, 1)
+        else:
+            state, color = 'Checking...', (0.3, 0.3, 0.3, 1)
+        
+        btn = self.device_buttons.get(device.address)
+        if btn is None:
+            btn = Button(size_hint_y=None, height=60)
+            btn.bind(on_press=lambda x, d=device: self.device_selected(d))
+            self.device_buttons[device.address] = btn
+            self.device_list.add_widget(btn)
+        if device.is_host and btn not in self.host_buttons:
+            # Move hosts to the top of the list
+            self.host_buttons.add(btn)
+            self.device_list.remove_widget(btn)
+            self.device_list.add_widget(btn, index=len(self.device_list.children))
+        btn.text = f'{device.label}\n{device.address} - {state}'
+        btn.background_color = color
+        
+        hosts = len(self.scanner.hosts())
+        self.status_label.text = f'Scanning... {len(self.device_buttons)} device(s), {hosts} host(s)'
     
-    def _update_device_list(self, devices):
-        """Update UI with found devices"""
-        self.device_list.clear_widgets()
+    def _scan_done(self, scanner):
+        """Update UI when the scan and all probes are over"""
+        if scanner is not self.scanner:
+            return
+        if scanner.error and not self.device_buttons:
+            self._scan_error(str(scanner.error))
+            return
         
-        if devices:
-            self.status_label.text = f'Found {len(devices)} device(s)'
-            
-            for addr, name in devices:
-                btn = Button(
-                    text=f'{name}\n{addr}',
-                    size_hint_y=None,
-                    height=60,
-                    background_color=(0.3, 0.3, 0.3, 1)
-                )
-                btn.bind(on_press=lambda x, a=addr, n=name: self.device_selected(a, n))
-                self.device_list.add_widget(btn)
+        hosts = len(scanner.hosts())
+        if self.device_buttons:
+            self.status_label.text = f'Found {len(self.device_buttons)} device(s), {hosts} host(s)'
         else:
             self.status_label.text = 'No devices found. Try scanning again.'
-        
         self.scan_btn.disabled = False
     
     def _scan_error(self, error):
@@ -131,10 +151,13 @@ class DeviceSelectionScreen(Screen):
         self.status_label.text = f'Error: {error}'
         self.scan_btn.disabled = False
     
-    def device_selected(self, addr, name):
+    def device_selected(self, device):
         """Handle device selection - connect as client"""
+        if self.scanner:
+            self.scanner.stop()
+            self.scan_btn.disabled = False
         app = App.get_running_app()
-        app.selected_device = (addr, name)
+        app.selected_device = (device.address, device.label, device.port)
         app.is_host = False
         self.manager.current = 'pin_entry'
     
@@ -213,7 +236,7 @@ class PinEntryScreen(Screen):
         """Called when screen is displayed"""
         app = App.get_running_app()
         if hasattr(app, 'selected_device'):
-            addr, name = app.selected_device
+            addr, name, port = app.selected_device
             self.device_label.text = f'Connecting to: {name}'
     
     def connect_to_host(self, instance):
@@ -302,8 +325,9 @@ class ChatScreen(Screen):
         
         self.add_widget(self.layout)
         
-        # Schedule message updates
-        Clock.schedule_interval(self.update_messages, 1)
+        # Message updates only run while the screen is shown and the app is in front
+        self.update_event = None
+        self.shown_key = None  # what the message label shows, to skip redundant redraws
     
     def on_enter(self):
         """Called when screen is displayed"""
@@ -314,6 +338,24 @@ class ChatScreen(Screen):
         else:
             self.header.text = 'Client Mode'
             self.status_bar.text = 'Connected'
+        if not app.paused:
+            self.start_updates()
+    
+    def on_leave(self):
+        """Called when another screen is displayed"""
+        self.stop_updates()
+    
+    def start_updates(self):
+        """Show everything that arrived meanwhile in one update, then keep polling"""
+        self.update_messages(0)
+        if self.update_event is None:
+            self.update_event = Clock.schedule_interval(self.update_messages, 1)
+    
+    def stop_updates(self):
+        """Stop polling for messages while nobody can see them"""
+        if self.update_event is not None:
+            self.update_event.cancel()
+            self.update_event = None
     
     def send_message(self, instance):
         """Send a message"""
@@ -332,15 +374,23 @@ class ChatScreen(Screen):
         app = App.get_running_app()
         messages = app.get_messages()
         
-        if messages:
+        # New messages change the newest seq, expired ones the count
+        key = (len(messages), messages[-1].seq if messages else None)
+        if messages and key != self.shown_key:
             self.message_label.text = '\n'.join([str(msg) for msg in messages])
             # Auto-scroll to bottom
             self.message_scroll.scroll_y = 0
+        self.shown_key = key
 
 
 class BluetoothMessengerApp(App):
     """Main application class"""
     
+    # Longest silence before the client tells the host it is still there;
+    # longer in the background, where every radio wakeup costs battery
+    FOREGROUND_KEEPALIVE = AsyncClient.KEEPALIVE_INTERVAL
+    BACKGROUND_KEEPALIVE = 300
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.is_host = False
@@ -348,15 +398,19 @@ class BluetoothMessengerApp(App):
         self.selected_device = None
         self.pin = None
         self.message_manager = MessageManager(expiry_minutes=5)
-        self.auth = AuthManager()
-        self.socket = None
-        self.server_socket = None
-        self.clients = {}
+        self.host = None
+        self.client = AsyncClient(self.message_manager)
+        self.client_loop = None
         self.running = True
+        self.paused = False
+        self.paused_at = None  # (wall clock, process CPU time) when the app was hidden
     
     def build(self):
         """Build the app UI"""
         Window.clearcolor = (0.1, 0.1, 0.1, 1)
+        # A minimized desktop window is hidden just like a paused phone app
+        Window.bind(on_minimize=lambda window: self.on_pause(),
+                    on_restore=lambda window: self.on_resume())
         
         sm = ScreenManager()
         sm.add_widget(DeviceSelectionScreen(name='device_selection'))
@@ -365,111 +419,81 @@ class BluetoothMessengerApp(App):
         
         return sm
     
+    def on_pause(self):
+        """Stop UI work while the app is in the background"""
+        if self.paused:
+            return True
+        self.paused = True
+        self.paused_at = (time.monotonic(), time.process_time())
+        self.root.get_screen('chat').stop_updates()
+        self._set_keepalive(self.BACKGROUND_KEEPALIVE)
+        # Keep the connection open instead of letting Android stop the app
+        return True
+    
+    def on_resume(self):
+        """Bring the chat up to date in one batch and resume UI work"""
+        if not self.paused:
+            return
+        self.paused = False
+        self._set_keepalive(self.FOREGROUND_KEEPALIVE)
+        if self.root.current == 'chat':
+            self.root.get_screen('chat').start_updates()
+        
+        # What the background time cost, for checking idle drain in debug logs
+        wall, cpu = time.monotonic() - self.paused_at[0], time.process_time() - self.paused_at[1]
+        if wall > 0:
+            Logger.debug(f"Messenger: In background for {wall:.0f} s: {cpu:.2f} s CPU ({cpu / wall:.2%} of a core)")
+    
+    def _set_keepalive(self, interval):
+        """Change the client's keepalive interval from the UI thread"""
+        if self.client_loop and self.client.connected:
+            self.client_loop.call_soon_threadsafe(self.client.set_keepalive, interval)
+    
     def start_bluetooth_host(self):
         """Start Bluetooth host"""
-        self.host_pin = self.auth.generate_pin()
+        self.host = BluetoothHost()
+        self.host_pin = self.host.auth.generate_pin()
         threading.Thread(target=self._host_thread, daemon=True).start()
     
     def _host_thread(self):
         """Host thread"""
         try:
-            self.server_socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-            self.server_socket.bind(("", bluetooth.PORT_ANY))
-            self.server_socket.listen(5)
-            
-            bluetooth.advertise_service(
-                self.server_socket,
-                "BluetoothMessenger",
-                service_id="00001101-0000-1000-8000-00805F9B34FB",
-                service_classes=["00001101-0000-1000-8000-00805F9B34FB"],
-                profiles=[("00001101-0000-1000-8000-00805F9B34FB", 0x0100)]
-            )
-            
-            while self.running:
-                client_socket, client_info = self.server_socket.accept()
-                threading.Thread(
-                    target=self._handle_client,
-                    args=(client_socket, client_info),
-                    daemon=True
-                ).start()
-                
+            self.host.serve()
         except Exception as e:
             print(f"Host error: {e}")
     
-    def _handle_client(self, client_socket, client_info):
-        """Handle client connection"""
-        try:
-            # Send auth request
-            client_socket.send("AUTH_REQUEST".encode('utf-8'))
-            
-            # Receive PIN
-            received_pin = client_socket.recv(1024).decode('utf-8')
-            
-            if self.auth.validate_pin(received_pin):
-                client_socket.send("AUTH_SUCCESS".encode('utf-8'))
-                self.clients[client_socket] = f"peer{len(self.clients) + 1}"
-                
-                # Receive messages
-                while self.running:
-                    data = client_socket.recv(1024)
-                    if not data:
-                        break
-                    
-                    message = data.decode('utf-8')
-                    sender = self.clients[client_socket]
-                    self.message_manager.add_message(sender, message)
-                    
-                    # Broadcast to other clients
-                    for cs in self.clients:
-                        if cs != client_socket:
-                            try:
-                                cs.send(f"{sender}: {message}".encode('utf-8'))
-                            except:
-                                pass
-            else:
-                client_socket.send("AUTH_FAILED".encode('utf-8'))
-                client_socket.close()
-                
-        except Exception as e:
-            print(f"Client handler error: {e}")
-    
     def connect_to_host(self):
         """Connect to host as client"""
+        addr, name, port = self.selected_device
+        asyncio.run(self._client_session(BluetoothTransport(addr, port)))
+    
+    async def _client_session(self, transport):
+        """Connect, authenticate and receive messages until disconnected"""
+        self.client_loop = asyncio.get_running_loop()
         try:
-            addr, name = self.selected_device
-            
-            # Find service
-            service_matches = bluetooth.find_service(
-                name="BluetoothMessenger",
-                address=addr
-            )
-            
-            if not service_matches:
-                Clock.schedule_once(lambda dt: self._connection_failed("Service not found"))
-                return
-            
-            port = service_matches[0]["port"]
-            
-            # Connect
-            self.socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-            self.socket.connect((addr, port))
-            
-            # Authenticate
-            data = self.socket.recv(1024).decode('utf-8')
-            if data == "AUTH_REQUEST":
-                self.socket.send(self.pin.encode('utf-8'))
-                
-                response = self.socket.recv(1024).decode('utf-8')
-                if response == "AUTH_SUCCESS":
-                    Clock.schedule_once(lambda dt: self._connection_success())
-                    
-                    # Start receiving messages
-                    threading.Thread(target=self._receive_messages, daemon=True).start()
-                else:
-                    Clock.schedule_once(lambda dt: self._connection_failed("Invalid PIN"))
-                    
-        except Exception as e:
-            Clock.schedule_once(lambda dt: self._connection_failed(str(e)))
+            await self.client.connect(transport, self.pin)
+        except ServiceNotFound:
+            self._schedule_failure("Service not found")
+            return
+        except AuthenticationFailed:
+            self._schedule_failure("Invalid PIN")
+            return
+        except ClientError as e:
+            self._schedule_failure(str(e))
+            return
+        
+        Clock.schedule_once(lambda dt: self._connection_success())
+        
+        # Received messages are stored by the client; the chat screen polls them
+        try:
+            async for msg in self.client.messages():
+                pass
+        except Disconnected as e:
+            print(f"Receive error: {e}")
+    
+    def _schedule_failure(self, error):
+        """Report a connection failure on the UI thread"""
+        Clock.schedule_once(lambda dt: self._connection_failed(error))
     
     def _connection_success(self):
         """Handle successful connection"""
@@ -480,66 +504,36 @@ class BluetoothMessengerApp(App):
         screen = self.root.get_screen('pin_entry')
         screen.status_label.text = f'Connection failed: {error}'
     
-    def _receive_messages(self):
-        """Receive messages from host"""
-        try:
-            while self.running:
-                data = self.socket.recv(1024)
-                if not data:
-                    break
-                
-                message = data.decode('utf-8')
-                if ': ' in message:
-                    sender, content = message.split(': ', 1)
-                    self.message_manager.add_message(sender, content)
-                    
-        except Exception as e:
-            print(f"Receive error: {e}")
-    
     def send_message(self, message):
         """Send a message"""
-        sender = "host" if self.is_host else "me"
-        self.message_manager.add_message(sender, message)
-        
         if self.is_host:
-            # Broadcast to all clients
-            for client_socket in self.clients:
-                try:
-                    client_socket.send(f"host: {message}".encode('utf-8'))
-                except:
-                    pass
+            # Store and broadcast to all clients
+            self.host.send_message(message)
         else:
-            # Send to host
-            try:
-                self.socket.send(message.encode('utf-8'))
-            except Exception as e:
-                print(f"Send error: {e}")
+            # Send to host without blocking the UI; the client stores it
+            future = asyncio.run_coroutine_threadsafe(self.client.send(message), self.client_loop)
+            future.add_done_callback(self._send_done)
+    
+    def _send_done(self, future):
+        """Report a failed send"""
+        if future.exception():
+            print(f"Send error: {future.exception()}")
     
     def get_messages(self):
         """Get all messages"""
+        if self.host:
+            return self.host.message_manager.get_messages()
         return self.message_manager.get_messages()
     
     def on_stop(self):
         """Cleanup when app stops"""
         self.running = False
         
-        if self.socket:
-            try:
-                self.socket.close()
-            except:
-                pass
+        if self.client_loop and self.client.connected:
+            asyncio.run_coroutine_threadsafe(self.client.close(), self.client_loop)
         
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-            except:
-                pass
-        
-        for client_socket in self.clients:
-            try:
-                client_socket.close()
-            except:
-                pass
+        if self.host:
+            self.host.shutdown()
         
         self.message_manager.stop()
 
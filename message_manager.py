@@ -1,21 +1,42 @@
 """
 Message manager for in-memory storage with auto-deletion.
-Messages are stored in RAM and automatically deleted after 5 minutes.
+Messages are stored in RAM and automatically deleted after 5 minutes,
+or after their own time-to-live if one was given.
+Optionally, messages are also written to an append-only segment log so
+history survives a restart.
 """
 
+import heapq
+import secrets
 import threading
 import time
-from datetime import datetime, timedelta
-from collections import deque
+from datetime import datetime
+from search_index import SearchIndex, parse_query
+from segment_log import SegmentLog
 
 
 class Message:
-    """Represents a single message with timestamp."""
+    """Represents a single message with timestamp.
     
-    def __init__(self, sender, content):
+    The content is kept as UTF-8 bytes, exactly as it arrived, and only
+    decoded when it is displayed or searched.
+    """
+    
+    def __init__(self, sender, content, timestamp=None, seq=None, expires_at=None):
         self.sender = sender
-        self.content = content
-        self.timestamp = datetime.now()
+        self.payload = content.encode('utf-8') if isinstance(content, str) else content
+        self.timestamp = timestamp or datetime.now()
+        self.seq = seq
+        # Latest timestamp of this or any earlier stored message. Unlike the
+        # wall clock timestamp, it never goes back as seq goes up.
+        self.latest = self.timestamp
+        self.expires_at = expires_at  # epoch seconds, None for the default expiry
+        self.removed = False
+    
+    @property
+    def content(self):
+        """Message content as text."""
+        return self.payload.decode('utf-8', errors='replace')
     
     def __str__(self):
         time_str = self.timestamp.strftime("%H:%M:%S")
@@ -25,65 +46,502 @@ class Message:
         """Check if message has expired.
         
         Args:
-            expiry_minutes: Number of minutes before expiry (default: 5)
-            
+            expiry_minutes: Number of minutes before expiry (default: 5),
+                used when the message has no deadline of its own
+        
         Returns:
             bool: True if expired, False otherwise
         """
-        return datetime.now() - self.timestamp > timedelta(minutes=expiry_minutes)
+        if self.expires_at is not None:
+            return time.time() >= self.expires_at
+        return time.time() - self.timestamp.timestamp() > expiry_minutes * 60
+
+
+def _bisect_right(messages, value, key):
+    """Index after the last message whose key is <= value.
+    
+    Args:
+        messages: Sequence of messages ordered by key
+        value: Value to search for
+        key: Function returning the sort key of a message
+    """
+    lo, hi = 0, len(messages)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if value < key(messages[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class MessageView:
+    """Immutable, time-ordered sequence of messages.
+    
+    Messages are kept in fixed-size tuples ("chunks") plus a tail list.
+    Appending or dropping leading chunks returns a new view that shares
+    every untouched chunk with the old one, so writers can publish a new
+    view with a single reference assignment and readers can use whatever
+    view they picked up without taking a lock.
+    
+    The tail list is shared too: appending to the newest view adds to the
+    list in place, and each view only covers the first ``size`` messages
+    of it, so views handed out earlier do not change. Appending to an
+    older view copies its part of the tail first.
+    """
+    
+    CHUNK_SIZE = 64
+    
+    __slots__ = ("chunks", "tail", "size")
+    
+    def __init__(self, chunks=(), tail=None, size=0):
+        self.chunks = chunks  # tuple of full CHUNK_SIZE tuples
+        self.tail = [] if tail is None else tail  # list, only the first size messages belong to this view
+        self.size = size  # fewer than CHUNK_SIZE
+    
+    @classmethod
+    def from_messages(cls, messages):
+        """Build a view from an ordered iterable of messages."""
+        items = tuple(messages)
+        size = cls.CHUNK_SIZE
+        full = len(items) - len(items) % size
+        chunks = tuple(items[i:i + size] for i in range(0, full, size))
+        return cls(chunks, list(items[full:]), len(items) - full)
+    
+    def append(self, msg):
+        """Return a new view with msg added at the end."""
+        tail, size = self.tail, self.size
+        if size and len(tail) == size:
+            # Nothing was appended to the list after this view: share it
+            tail.append(msg)
+        else:
+            tail = tail[:size]
+            tail.append(msg)
+        size += 1
+        if size == self.CHUNK_SIZE:
+            return MessageView(self.chunks + (tuple(tail),))
+        return MessageView(self.chunks, tail, size)
+    
+    def extend(self, messages):
+        """Return a new view with an ordered batch of messages added at the end."""
+        items = self.tail[:self.size]
+        items.extend(messages)
+        size = self.CHUNK_SIZE
+        full = len(items) - len(items) % size
+        chunks = tuple(tuple(items[i:i + size]) for i in range(0, full, size))
+        return MessageView(self.chunks + chunks, items[full:], len(items) - full)
+    
+    def drop_removed_chunks(self):
+        """Return a view without leading chunks whose messages are all removed.
+        
+        Returns:
+            tuple: (new view, number of messages dropped)
+        """
+        drop = 0
+        for chunk in self.chunks:
+            if not all(msg.removed for msg in chunk):
+                break
+            drop += 1
+        if not drop:
+            return self, 0
+        return MessageView(self.chunks[drop:], self.tail, self.size), drop * self.CHUNK_SIZE
+    
+    def parts(self, start=0, stop=None):
+        """Return the messages between two positions as a list of sequences.
+        
+        Each part is a chunk, or a slice of one, so callers can copy a
+        range with list.extend() instead of one message at a time.
+        """
+        if stop is None or stop > len(self):
+            stop = len(self)
+        size = self.CHUNK_SIZE
+        parts = []
+        chunk = start // size
+        while start < stop:
+            offset = start - chunk * size
+            end = min(stop - chunk * size, size)
+            messages = self.chunks[chunk] if chunk < len(self.chunks) else self.tail
+            parts.append(messages if offset == 0 and end == size else messages[offset:end])
+            start += end - offset
+            chunk += 1
+        return parts
+    
+    def __len__(self):
+        return len(self.chunks) * self.CHUNK_SIZE + self.size
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0:
+            raise IndexError("MessageView index out of range")
+        chunk, offset = divmod(index, self.CHUNK_SIZE)
+        if chunk < len(self.chunks):
+            return self.chunks[chunk][offset]
+        if chunk == len(self.chunks) and offset < self.size:
+            return self.tail[offset]
+        raise IndexError("MessageView index out of range")
+    
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+        yield from self.tail[:self.size]
+    
+    def __reversed__(self):
+        yield from reversed(self.tail[:self.size])
+        for chunk in reversed(self.chunks):
+            yield from reversed(chunk)
+    
+    def iter_from(self, index):
+        """Iterate over messages starting at a position."""
+        for part in self.parts(index):
+            yield from part
+
+
+EMPTY_VIEW = MessageView()
 
 
 class MessageManager:
-    """Manages in-memory message storage with auto-deletion."""
+    """Manages in-memory message storage with auto-deletion.
+    
+    Writers serialize on ``lock`` and publish immutable MessageView
+    snapshots; readers (get_messages and the range iterators) just pick up
+    the current view and never take the lock.
     
-    def __init__(self, expiry_minutes=5):
-        self.messages = deque()
+    Expiry is driven by a heap of message deadlines. Expired messages are
+    marked removed and dropped from the search index right away; fully
+    removed chunks are dropped from the front of the views, which are
+    compacted once removed messages make up half of them.
+    """
+    
+    # Longest the cleanup thread sleeps without checking deadlines
+    MAX_CLEANUP_WAIT = 30
+    
+    def __init__(self, expiry_minutes=5, log_dir=None):
+        self.messages = EMPTY_VIEW
         self.expiry_minutes = expiry_minutes
         self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
         self.running = True
+        self.next_seq = 1
+        self.latest = None  # latest timestamp stored so far
+        # Sequence numbers start over with every manager, even when the log
+        # is replayed; the epoch tells numberings apart
+        self.epoch = secrets.token_hex(8)
+        self.by_sender = {}  # {sender: MessageView}
+        self.deadlines = []  # heap of (expires_at, seq, Message)
+        self.removed_count = 0  # removed messages still held by self.messages
+        # Highest seq of any removed message and the earliest pending
+        # deadline, so get_messages can skip checking newer messages
+        self.removed_seq = 0
+        self.next_deadline = float('inf')
+        self.index = SearchIndex()
+        
+        # Optional write-ahead log
+        self.log = None
+        if log_dir:
+            self.log = SegmentLog(log_dir, retention_seconds=expiry_minutes * 60)
+            self._replay_log()
         
         # Start cleanup thread
         self.cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
         self.cleanup_thread.start()
     
-    def add_message(self, sender, content):
+    def add_message(self, sender, content, ttl=None):
         """Add a new message to storage.
         
         Args:
             sender: Identifier of the message sender
-            content: Message content
+            content: Message content (str or UTF-8 bytes)
+            ttl: Seconds until this message expires (None for the default expiry)
+        
+        Returns:
+            Message: The stored message, with its sequence number assigned
+        """
+        msg = Message(sender, content)
+        if ttl is None:
+            ttl = self.expiry_minutes * 60
+        msg.expires_at = msg.timestamp.timestamp() + ttl
+        
+        with self.lock:
+            self._store(msg)
+            if self.log:
+                self.log.append(msg.timestamp.timestamp(), sender, msg.payload, msg.expires_at)
+        return msg
+    
+    def add_messages(self, records):
+        """Add a batch of messages, such as a history snapshot, in one call.
+        
+        The lock is taken once and the views are published once for the
+        whole batch.
+        
+        Args:
+            records: Iterable of (timestamp, sender, content, expires_at)
+                tuples, oldest first; times are epoch seconds and
+                expires_at may be None for the default expiry
+        
+        Returns:
+            list: The stored Message objects (already expired records are skipped)
         """
+        now = time.time()
+        batch = []
+        for timestamp, sender, content, expires_at in records:
+            if expires_at is None:
+                expires_at = timestamp + self.expiry_minutes * 60
+            if expires_at > now:
+                batch.append(Message(sender, content, datetime.fromtimestamp(timestamp), expires_at=expires_at))
+        
         with self.lock:
-            msg = Message(sender, content)
-            self.messages.append(msg)
+            self._store_batch(batch)
+            if self.log:
+                for msg in batch:
+                    self.log.append(msg.timestamp.timestamp(), msg.sender, msg.payload, msg.expires_at)
+        return batch
+    
+    def _store(self, msg):
+        """Assign a sequence number and index a message. Caller must hold the lock."""
+        msg.seq = self.next_seq
+        self.next_seq += 1
+        self._stamp(msg)
+        
+        # Wake the cleanup thread if this is now the earliest deadline.
+        # The deadline is published before the views that hold the message.
+        if msg.expires_at < self.next_deadline:
+            self.next_deadline = msg.expires_at
+            self.wakeup.notify()
+        heapq.heappush(self.deadlines, (msg.expires_at, msg.seq, msg))
+        
+        self.messages = self.messages.append(msg)
+        self.by_sender[msg.sender] = self.by_sender.get(msg.sender, EMPTY_VIEW).append(msg)
+        self.index.add(msg)
+        return msg
+    
+    def _stamp(self, msg):
+        """Set msg.latest. Caller must hold the lock."""
+        if self.latest is not None and self.latest > msg.timestamp:
+            msg.latest = self.latest
+        else:
+            msg.latest = self.latest = msg.timestamp
+    
+    def _store_batch(self, batch):
+        """Store ordered messages, publishing the views once. Caller must hold the lock."""
+        if not batch:
+            return
+        by_sender = {}
+        for msg in batch:
+            msg.seq = self.next_seq
+            self.next_seq += 1
+            self._stamp(msg)
+            by_sender.setdefault(msg.sender, []).append(msg)
+            self.index.add(msg)
+            heapq.heappush(self.deadlines, (msg.expires_at, msg.seq, msg))
+        if self.deadlines[0][0] < self.next_deadline:
+            self.next_deadline = self.deadlines[0][0]
+            self.wakeup.notify()
+        
+        self.messages = self.messages.extend(batch)
+        for sender, messages in by_sender.items():
+            self.by_sender[sender] = self.by_sender.get(sender, EMPTY_VIEW).extend(messages)
     
     def get_messages(self, limit=None):
         """Get all non-expired messages.
         
         Args:
             limit: Maximum number of messages to return (None for all)
-            
+        
         Returns:
             list: List of Message objects
         """
+        messages = self.messages
+        now = time.time()
+        if limit:
+            recent = []
+            for msg in reversed(messages):
+                if not msg.removed and msg.expires_at > now:
+                    recent.append(msg)
+                    if len(recent) == limit:
+                        break
+            recent.reverse()
+            return recent
+        if self.next_deadline > now:
+            # Nothing is due yet, so only messages up to the newest removed
+            # one can be dead; everything after it is copied chunk by chunk.
+            # next_deadline is read before removed_seq, the reverse of the
+            # order _cleanup_expired writes them in.
+            start = _bisect_right(messages, self.removed_seq, key=lambda msg: msg.seq)
+            live = [msg for part in messages.parts(0, start) for msg in part if not msg.removed]
+            for part in messages.parts(start):
+                live.extend(part)
+            return live
+        return [msg for part in messages.parts() for msg in part
+                if not msg.removed and msg.expires_at > now]
+    
+    def snapshot(self):
+        """Return the current immutable view of stored messages.
+        
+        The view may still contain removed or expired messages; check
+        ``msg.removed`` and ``msg.expires_at`` when iterating it.
+        
+        Returns:
+            MessageView: Messages in time order
+        """
+        return self.messages
+    
+    def get_messages_after(self, seq, sender=None):
+        """Iterate over messages with a sequence number greater than seq.
+        
+        Iterates over the view published when the call was made, without
+        taking the lock or copying the history.
+        
+        Args:
+            seq: Sequence number to start after (0 for everything)
+            sender: Only yield messages from this sender (optional)
+        
+        Yields:
+            Message: Matching messages, oldest first
+        """
+        if sender is None:
+            messages = self.messages
+        else:
+            messages = self.by_sender.get(sender, EMPTY_VIEW)
+        start = _bisect_right(messages, seq, key=lambda msg: msg.seq)
+        return self._iter_live(messages, start)
+    
+    @staticmethod
+    def _iter_live(messages, start):
+        """Yield unexpired messages of a view from a position onwards."""
+        for msg in messages.iter_from(start):
+            if not msg.removed and msg.expires_at > time.time():
+                yield msg
+    
+    def get_messages_since(self, timestamp, sender=None):
+        """Iterate over messages sent at or after a point in time.
+        
+        Args:
+            timestamp: datetime to start from
+            sender: Only yield messages from this sender (optional)
+        
+        Yields:
+            Message: Matching messages, oldest first
+        """
+        # Timestamps come from the wall clock, which can be set back, so
+        # they are not sorted. Bisect on msg.latest, which is, to skip the
+        # messages that are all older, then check each timestamp.
+        messages = self.messages
+        start = _bisect_right(messages, timestamp, key=lambda msg: msg.latest)
+        # Step back over messages with exactly this timestamp
+        while start > 0 and messages[start - 1].latest >= timestamp:
+            start -= 1
+        if sender is None:
+            matches = self._iter_live(messages, start)
+        else:
+            if start < len(messages):
+                seq = messages[start].seq - 1
+            else:
+                seq = self.next_seq - 1
+            matches = self.get_messages_after(seq, sender)
+        return (msg for msg in matches if msg.timestamp >= timestamp)
+    
+    def get_messages_from(self, sender):
+        """Iterate over all retained messages from one sender.
+        
+        Args:
+            sender: Identifier of the message sender
+        
+        Yields:
+            Message: Messages from sender, oldest first
+        """
+        return self.get_messages_after(0, sender)
+    
+    @property
+    def last_seq(self):
+        """Sequence number of the newest message (0 if none were added)."""
+        return self.next_seq - 1
+    
+    def search(self, query, limit=None):
+        """Search non-expired messages.
+        
+        Args:
+            query: Search terms; ``term*`` matches a prefix and
+                ``from:<sender>`` filters by sender
+            limit: Maximum number of results to return (None for all)
+        
+        Returns:
+            list: Matching Message objects, oldest first
+        """
+        terms, prefixes, sender = parse_query(query)
+        now = time.time()
+        with self.lock:
+            results = self.index.search(terms, prefixes, sender)
+        results = [msg for msg in results if msg.expires_at > now]
+        if limit:
+            return results[-limit:]
+        return results
+    
+    def _replay_log(self):
+        """Load unexpired messages from the segment log."""
+        batch = [Message(sender, content, datetime.fromtimestamp(timestamp), expires_at=expires_at)
+                 for timestamp, sender, content, expires_at in self.log.replay(since=time.time())]
         with self.lock:
-            if limit:
-                return list(self.messages)[-limit:]
-            return list(self.messages)
+            self._store_batch(batch)
     
     def _cleanup_loop(self):
-        """Background thread that removes expired messages."""
+        """Background thread that removes messages as their deadlines pass."""
         while self.running:
-            time.sleep(30)  # Check every 30 seconds
+            with self.lock:
+                timeout = self.MAX_CLEANUP_WAIT
+                if self.deadlines:
+                    timeout = min(self.deadlines[0][0] - time.time(), timeout)
+                if timeout > 0:
+                    self.wakeup.wait(timeout)
             self._cleanup_expired()
     
     def _cleanup_expired(self):
         """Remove expired messages from storage."""
+        now = time.time()
         with self.lock:
-            # Remove expired messages from the front
-            while self.messages and self.messages[0].is_expired(self.expiry_minutes):
-                self.messages.popleft()
+            # Pop every due deadline: O(log n) per expired message
+            while self.deadlines and self.deadlines[0][0] <= now:
+                msg = heapq.heappop(self.deadlines)[2]
+                msg.removed = True
+                self.removed_count += 1
+                self.removed_seq = max(self.removed_seq, msg.seq)
+                self.index.remove(msg)
+            self.next_deadline = self.deadlines[0][0] if self.deadlines else float('inf')
+            
+            # Drop fully removed chunks from the front of the views
+            self.messages, dropped = self.messages.drop_removed_chunks()
+            self.removed_count -= dropped
+            for sender, by_sender in list(self.by_sender.items()):
+                by_sender = by_sender.drop_removed_chunks()[0]
+                if by_sender.size and all(msg.removed for msg in by_sender):
+                    by_sender = EMPTY_VIEW
+                if len(by_sender):
+                    self.by_sender[sender] = by_sender
+                else:
+                    del self.by_sender[sender]
+            
+            # Long-lived messages at the front can pin removed ones behind them
+            if self.removed_count > max(len(self.messages) // 2, 1024):
+                self._compact()
+        
+        if self.log:
+            self.log.expire(now)
+    
+    def _compact(self):
+        """Publish views without removed messages. Caller must hold the lock."""
+        self.messages = MessageView.from_messages(msg for msg in self.messages if not msg.removed)
+        for sender, by_sender in list(self.by_sender.items()):
+            live = MessageView.from_messages(msg for msg in by_sender if not msg.removed)
+            if len(live):
+                self.by_sender[sender] = live
+            else:
+                del self.by_sender[sender]
+        self.removed_count = 0
     
     def stop(self):
         """Stop the cleanup thread."""
-        self.running = False
+        with self.lock:
+            self.running = False
+            self.wakeup.notify()
+        if self.log:
+            self.log.close()
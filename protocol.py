@@ -0,0 +1,297 @@
+"""
+Wire protocol shared by the host and clients.
+Every exchange is a frame: a 1-byte type, a 4-byte big-endian payload
+length, then the payload. Relayed chat messages carry their sequence
+number, timestamps and sender in a small binary header that is encoded
+once per message and reused for every recipient.
+"""
+
+import json
+import struct
+import zlib
+
+
+FRAME_HEADER = struct.Struct("!BI")
+MAX_FRAME_SIZE = 4 * 1024 * 1024
+MAX_CHAT_SIZE = 64 * 1024
+
+# Frame types
+AUTH_REQUEST = 1   # host -> client: JSON {"pake"} (empty if the host does not encrypt)
+AUTH = 2           # client -> host: JSON {"pake", "confirm", "cursor", "epoch", "history", "ack_window"}, or {"pin", ...}
+AUTH_SUCCESS = 3   # host -> client: JSON {"peer", "epoch"}
+AUTH_FAILED = 4    # host -> client
+CHAT = 5           # client -> host: UTF-8 message content
+MESSAGE = 6        # host -> client: MESSAGE_META, sender, content
+HISTORY = 7        # host -> client: zlib-compressed HISTORY_RECORDs
+SEALED = 8         # both ways after the handshake: encrypted frames (see secure_channel.py)
+ROSTER = 9         # host -> client: JSON roster snapshot {"version", "peers"}
+ROSTER_DELTA = 10  # host -> client: JSON {"version", "op", "id", "name"}
+NICK = 11          # client -> host: UTF-8 name to go by
+KEEPALIVE = 12     # client -> host: JSON {"interval"}: seconds until the client's next frame at the latest
+ACK = 13           # both ways: cumulative ACK_RECORD, then the ACK_RECORDs of any dropped messages (see acks.py)
+
+# seq, timestamp, expires_at, sender length
+MESSAGE_META = struct.Struct("!QddH")
+# seq, timestamp, expires_at, sender length, content length
+HISTORY_RECORD = struct.Struct("!QddHI")
+# Client: highest host sequence number received; host: count of the client's CHAT frames handled
+ACK_RECORD = struct.Struct("!Q")
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends data that does not follow the protocol."""
+
+
+def encode_frame(frame_type, payload=b""):
+    """Encode a complete frame.
+    
+    Args:
+        frame_type: One of the frame type constants
+        payload: Frame payload bytes
+    
+    Returns:
+        bytes: Header followed by the payload
+    """
+    return FRAME_HEADER.pack(frame_type, len(payload)) + payload
+
+
+def send_frame(sock, frame_type, payload=b""):
+    """Write a single frame to a socket."""
+    sock.sendall(encode_frame(frame_type, payload))
+
+
+def encode_json(obj):
+    """Encode a control frame payload."""
+    return json.dumps(obj, separators=(",", ":")).encode('utf-8')
+
+
+def decode_json(payload):
+    """Decode a control frame payload.
+    
+    Raises:
+        ProtocolError: If the payload is not a JSON object
+    """
+    try:
+        obj = json.loads(payload.decode('utf-8'))
+    except ValueError as e:
+        raise ProtocolError(f"Invalid control frame: {e}")
+    if not isinstance(obj, dict):
+        raise ProtocolError("Invalid control frame: expected an object")
+    return obj
+
+
+def encode_message(seq, timestamp, expires_at, sender, content):
+    """Encode a MESSAGE frame to relay to any number of peers.
+    
+    Args:
+        seq: Host sequence number (0 for notices that are not stored)
+        timestamp: Time the message was sent (epoch seconds)
+        expires_at: Time the message expires (epoch seconds)
+        sender: Name of the message sender
+        content: Message content as UTF-8 bytes
+    
+    Returns:
+        OutboundMessage: Frame header and metadata, followed by the content
+    """
+    sender_bytes = sender.encode('utf-8')
+    length = MESSAGE_META.size + len(sender_bytes) + len(content)
+    header = (FRAME_HEADER.pack(MESSAGE, length) +
+              MESSAGE_META.pack(seq, timestamp, expires_at, len(sender_bytes)) +
+              sender_bytes)
+    return OutboundMessage(header, content, seq=seq)
+
+
+def decode_message(payload):
+    """Decode the payload of a MESSAGE frame.
+    
+    Returns:
+        tuple: (seq, timestamp, expires_at, sender, content bytes)
+    """
+    if len(payload) < MESSAGE_META.size:
+        raise ProtocolError("Truncated MESSAGE frame")
+    seq, timestamp, expires_at, sender_len = MESSAGE_META.unpack_from(payload)
+    start = MESSAGE_META.size
+    sender = payload[start:start + sender_len].decode('utf-8', errors='replace')
+    return seq, timestamp, expires_at, sender, payload[start + sender_len:]
+
+
+def encode_ack(position, dropped=()):
+    """Encode an ACK payload.
+    
+    Args:
+        position: Everything up to this position was received
+        dropped: Positions among them that the host dropped (host only)
+    
+    Returns:
+        bytes: ACK payload
+    """
+    return b"".join(ACK_RECORD.pack(value) for value in (position, *dropped))
+
+
+def decode_ack(payload):
+    """Decode an ACK payload.
+    
+    Returns:
+        tuple: (position, set of dropped positions)
+    """
+    if not payload or len(payload) % ACK_RECORD.size:
+        raise ProtocolError("Invalid ACK frame")
+    values = [value for value, in ACK_RECORD.iter_unpack(payload)]
+    return values[0], set(values[1:])
+
+
+def encode_history(messages):
+    """Encode stored messages as one compressed HISTORY payload.
+    
+    Args:
+        messages: Message objects, oldest first
+    
+    Returns:
+        bytes: Compressed records
+    """
+    parts = []
+    for msg in messages:
+        sender_bytes = msg.sender.encode('utf-8')
+        parts.append(HISTORY_RECORD.pack(msg.seq, msg.timestamp.timestamp(), msg.expires_at,
+                                         len(sender_bytes), len(msg.payload)))
+        parts.append(sender_bytes)
+        parts.append(msg.payload)
+    return zlib.compress(b"".join(parts))
+
+
+def decode_history(payload):
+    """Decode a HISTORY payload.
+    
+    Returns:
+        list: (seq, timestamp, expires_at, sender, content bytes) tuples, oldest first
+    """
+    try:
+        data = zlib.decompress(payload)
+    except zlib.error as e:
+        raise ProtocolError(f"Invalid HISTORY frame: {e}")
+    
+    records = []
+    offset = 0
+    while offset < len(data):
+        if offset + HISTORY_RECORD.size > len(data):
+            raise ProtocolError("Truncated HISTORY record")
+        seq, timestamp, expires_at, sender_len, content_len = HISTORY_RECORD.unpack_from(data, offset)
+        offset += HISTORY_RECORD.size
+        sender = data[offset:offset + sender_len].decode('utf-8', errors='replace')
+        offset += sender_len
+        records.append((seq, timestamp, expires_at, sender, data[offset:offset + content_len]))
+        offset += content_len
+    return records
+
+
+class FrameParser:
+    """Incremental frame decoder, independent of how the bytes arrive."""
+    
+    def __init__(self, max_size=MAX_FRAME_SIZE):
+        self.max_size = max_size
+        self.buffer = bytearray()
+    
+    def feed(self, data):
+        """Add received bytes and return the frames they complete.
+        
+        Args:
+            data: Bytes received from the peer
+        
+        Returns:
+            list: (frame_type, payload bytes) tuples
+        
+        Raises:
+            ProtocolError: If a frame is larger than max_size
+        """
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            frame_type, length = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > self.max_size:
+                raise ProtocolError(f"Frame of {length} bytes exceeds the {self.max_size} byte limit")
+            end = offset + FRAME_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((frame_type, bytes(self.buffer[offset + FRAME_HEADER.size:end])))
+            offset = end
+        if offset:
+            del self.buffer[:offset]
+        return frames
+
+
+class FrameReader:
+    """Reads whole frames from a blocking socket."""
+    
+    def __init__(self, sock, max_size=MAX_FRAME_SIZE, bufsize=4096):
+        self.sock = sock
+        self.bufsize = bufsize
+        self.parser = FrameParser(max_size)
+        self.pending = []
+    
+    def read_frame(self):
+        """Wait for the next frame.
+        
+        Returns:
+            tuple: (frame_type, payload bytes), or None once the peer
+                closed the connection
+        """
+        while not self.pending:
+            data = self.sock.recv(self.bufsize)
+            if not data:
+                return None
+            self.pending = self.parser.feed(data)
+        return self.pending.pop(0)
+
+
+class OutboundMessage:
+    """A message encoded once and relayed to any number of peers.
+    
+    The header and payload buffers are joined at most once, and the same
+    bytes object is written to every recipient.
+    """
+    
+    __slots__ = ("buffers", "size", "seq", "_joined")
+    
+    def __init__(self, *buffers, seq=0):
+        """
+        Args:
+            *buffers: Parts of the encoded frame, in order
+            seq: Host sequence number of a relayed chat message (0 for other frames)
+        """
+        self.buffers = buffers
+        self.seq = seq
+        self.size = sum(len(buffer) for buffer in buffers)
+        self._joined = None
+    
+    def joined(self):
+        """Return the whole message as a single bytes object."""
+        if self._joined is None:
+            self._joined = b"".join(self.buffers)
+        return self._joined
+    
+    def send(self, sock):
+        """Write the whole message to a socket.
+        
+        Args:
+            sock: Connected socket
+        """
+        sock.sendall(self.joined())
+    
+    def send_vectored(self, sock):
+        """Write the message with a scatter-gather ``sendmsg`` call.
+        
+        Avoids joining the buffers at all, which pays off for large
+        payloads on sockets that support it.
+        
+        Args:
+            sock: Connected socket
+        """
+        sent = sock.sendmsg(self.buffers)
+        if sent == self.size:
+            return
+        # Partial write: continue from where the kernel stopped
+        remaining = memoryview(self.joined())[sent:]
+        while remaining:
+            sent = sock.send(remaining)
+            remaining = remaining[sent:]
@@ -0,0 +1,145 @@
+"""
+Token-bucket rate limiting for incoming peer traffic.
+Each peer gets its own message and byte buckets, and all peers share a
+global pair, so one client pasting in a loop cannot saturate the host.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: refills at ``rate`` per second up to ``burst``."""
+    
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+    
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` tokens are available (0 if they are now)."""
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        # Requests larger than the burst only need a full bucket
+        needed = min(amount, self.burst) - self.tokens
+        return max(needed / self.rate, 0.0)
+    
+    def consume(self, amount):
+        self.tokens -= amount
+
+
+class ThrottleStats:
+    """Counters of delayed and dropped messages."""
+    
+    def __init__(self):
+        self.delayed = 0
+        self.dropped = 0
+        self.delay_seconds = 0.0
+
+
+class RateLimiter:
+    """Per-peer and global limits on messages and bytes per second.
+    
+    Limits left as None (or 0) are not enforced. With the "delay" policy an
+    over-limit message is held back (on the sending peer's own receive
+    thread) for up to ``max_delay`` seconds before it is dropped; with
+    "drop" it is dropped right away.
+    """
+    
+    POLICIES = ("drop", "delay")
+    
+    def __init__(self, message_rate=None, byte_rate=None, global_message_rate=None,
+                 global_byte_rate=None, policy="drop", max_delay=2.0, burst_seconds=2.0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown rate limit policy: {policy}")
+        self.message_rate = message_rate
+        self.byte_rate = byte_rate
+        self.policy = policy
+        self.max_delay = max_delay
+        self.burst_seconds = burst_seconds
+        self.lock = threading.Lock()
+        self.global_buckets = self._buckets(global_message_rate, global_byte_rate)
+        self.peer_buckets = {}  # {peer: [(bucket, counts bytes)]}
+        self.peer_stats = {}  # {peer: ThrottleStats}
+        self.totals = ThrottleStats()
+    
+    def _buckets(self, message_rate, byte_rate):
+        buckets = []
+        if message_rate:
+            buckets.append((TokenBucket(message_rate, message_rate * self.burst_seconds), False))
+        if byte_rate:
+            buckets.append((TokenBucket(byte_rate, byte_rate * self.burst_seconds), True))
+        return buckets
+    
+    @property
+    def enabled(self):
+        return bool(self.global_buckets or self.message_rate or self.byte_rate)
+    
+    def add_peer(self, peer):
+        with self.lock:
+            self.peer_buckets[peer] = self._buckets(self.message_rate, self.byte_rate)
+            self.peer_stats[peer] = ThrottleStats()
+    
+    def remove_peer(self, peer):
+        with self.lock:
+            self.peer_buckets.pop(peer, None)
+            self.peer_stats.pop(peer, None)
+    
+    def admit(self, peer, size):
+        """Decide whether a message from a peer may go through.
+        
+        May sleep the calling thread when the policy is "delay".
+        
+        Args:
+            peer: Key the peer was added with
+            size: Message size in bytes
+        
+        Returns:
+            bool: True to accept the message, False to drop it
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                buckets = self.peer_buckets.get(peer, []) + self.global_buckets
+                now = time.monotonic()
+                wait = max((bucket.wait_time(size if counts_bytes else 1, now)
+                            for bucket, counts_bytes in buckets), default=0.0)
+                if wait == 0.0:
+                    for bucket, counts_bytes in buckets:
+                        bucket.consume(size if counts_bytes else 1)
+                    if waited:
+                        self._count(peer, delayed=waited)
+                    return True
+                
+                if self.policy == "drop" or waited + wait > self.max_delay:
+                    self._count(peer, dropped=True)
+                    return False
+            
+            time.sleep(wait)
+            waited += wait
+    
+    def _count(self, peer, delayed=0.0, dropped=False):
+        """Update throttle counters. Caller must hold the lock."""
+        for stats in (self.peer_stats.get(peer), self.totals):
+            if stats is None:
+                continue
+            if dropped:
+                stats.dropped += 1
+            else:
+                stats.delayed += 1
+                stats.delay_seconds += delayed
+    
+    def stats(self):
+        """Return throttle counters.
+        
+        Returns:
+            tuple: (totals, {peer: ThrottleStats})
+        """
+        with self.lock:
+            return self.totals, dict(self.peer_stats)
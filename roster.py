@@ -0,0 +1,129 @@
+"""
+Versioned roster of the peers that are online.
+The host changes the roster and sends each change to the clients as a
+small delta; a client that joins gets one full snapshot instead. Every
+change bumps the version, and each delta carries the version it creates,
+so clients can skip updates their snapshot already includes.
+"""
+
+import threading
+
+
+MAX_NAME_LENGTH = 32
+# Names the front ends use for themselves
+RESERVED_NAMES = ("host", "me")
+
+JOIN = "join"
+LEAVE = "leave"
+RENAME = "rename"
+
+
+class Roster:
+    """Peers online, by stable peer id, with their current names."""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.peers = {}  # {peer id: name}, in order of joining
+    
+    def join(self, peer_id, name=None):
+        """Add a peer.
+        
+        Returns:
+            dict: Delta to send to the other peers
+        """
+        with self.lock:
+            self.peers[peer_id] = name or peer_id
+            return self._change(JOIN, peer_id, self.peers[peer_id])
+    
+    def leave(self, peer_id):
+        """Remove a peer.
+        
+        Returns:
+            dict: Delta to send to the remaining peers, or None if the peer was not listed
+        """
+        with self.lock:
+            name = self.peers.pop(peer_id, None)
+            if name is None:
+                return None
+            return self._change(LEAVE, peer_id, name)
+    
+    def rename(self, peer_id, name):
+        """Change a peer's name.
+        
+        Returns:
+            dict: Delta to send to every peer
+        
+        Raises:
+            ValueError: If the name is invalid or taken
+        """
+        name = name.strip()
+        if not name or len(name) > MAX_NAME_LENGTH or not name.isprintable():
+            raise ValueError(f"Names must be 1 to {MAX_NAME_LENGTH} printable characters")
+        with self.lock:
+            if peer_id not in self.peers:
+                raise ValueError("Not in the roster")
+            # Other peers' ids stay reserved too, so a name never points at two peers
+            taken = set()
+            for other_id, other in self.peers.items():
+                if other_id != peer_id:
+                    taken.update((other_id.lower(), other.lower()))
+            if name.lower() in taken or name.lower() in RESERVED_NAMES:
+                raise ValueError(f"The name {name} is taken")
+            self.peers[peer_id] = name
+            return self._change(RENAME, peer_id, name)
+    
+    def _change(self, op, peer_id, name):
+        self.version += 1
+        return {"version": self.version, "op": op, "id": peer_id, "name": name}
+    
+    def snapshot(self):
+        """Return the whole roster, to send to a peer that joins.
+        
+        Returns:
+            dict: {"version", "peers": {peer id: name}}
+        """
+        with self.lock:
+            return {"version": self.version, "peers": dict(self.peers)}
+    
+    def load(self, snapshot):
+        """Replace the roster with a snapshot from the host."""
+        peers = snapshot.get("peers")
+        if not isinstance(peers, dict):
+            peers = {}
+        with self.lock:
+            self.peers = {str(peer_id): str(name) for peer_id, name in peers.items()}
+            version = snapshot.get("version")
+            self.version = version if isinstance(version, int) else 0
+    
+    def apply(self, delta):
+        """Apply a delta from the host.
+        
+        Returns:
+            bool: False if the roster already included the change
+        """
+        version = delta.get("version")
+        peer_id = str(delta.get("id"))
+        with self.lock:
+            if not isinstance(version, int) or version <= self.version:
+                return False
+            self.version = version
+            if delta.get("op") == LEAVE:
+                self.peers.pop(peer_id, None)
+            else:
+                self.peers[peer_id] = str(delta.get("name") or peer_id)
+            return True
+    
+    def name(self, peer_id):
+        """Return a peer's current name (its id if it is not listed)."""
+        with self.lock:
+            return self.peers.get(peer_id, peer_id)
+    
+    def entries(self):
+        """Return (peer id, name) pairs in order of joining."""
+        with self.lock:
+            return list(self.peers.items())
+    
+    def __len__(self):
+        with self.lock:
+            return len(self.peers)
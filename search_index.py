@@ -0,0 +1,137 @@
+"""
+Incremental inverted index over message content.
+Supports exact terms, prefix terms (``term*``) and a sender filter.
+"""
+
+import bisect
+import re
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split text into a set of lowercase search tokens."""
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+def parse_query(query):
+    """Parse a search query.
+    
+    Words ending in ``*`` match as prefixes, and ``from:<sender>`` restricts
+    results to one sender.
+    
+    Args:
+        query: Query string, e.g. ``"meet* tomorrow from:peer3"``
+    
+    Returns:
+        tuple: (terms, prefixes, sender)
+    """
+    terms = []
+    prefixes = []
+    sender = None
+    for word in query.split():
+        if word.lower().startswith("from:"):
+            sender = word[5:]
+        elif word.endswith("*"):
+            prefixes.extend(tokenize(word[:-1]))
+        else:
+            terms.extend(tokenize(word))
+    return terms, prefixes, sender
+
+
+class SearchIndex:
+    """Inverted index mapping tokens to the messages that contain them.
+    
+    Posting lists are insertion-ordered dicts keyed by message, so adding
+    and removing a message costs one dict operation per distinct token.
+    Not thread-safe; the owner must serialize access.
+    """
+    
+    def __init__(self):
+        self.postings = {}  # {token: {Message: None}}
+        self.senders = {}  # {sender: {Message: None}}
+        self.vocabulary = []  # sorted tokens, for prefix lookups
+    
+    def add(self, msg):
+        """Index a message."""
+        for token in tokenize(msg.content):
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+            posting[msg] = None
+        self.senders.setdefault(msg.sender, {})[msg] = None
+    
+    def remove(self, msg):
+        """Drop a message from the index."""
+        for token in tokenize(msg.content):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(msg, None)
+            if not posting:
+                del self.postings[token]
+                index = bisect.bisect_left(self.vocabulary, token)
+                if index < len(self.vocabulary) and self.vocabulary[index] == token:
+                    del self.vocabulary[index]
+        
+        posting = self.senders.get(msg.sender)
+        if posting is not None:
+            posting.pop(msg, None)
+            if not posting:
+                del self.senders[msg.sender]
+    
+    def _prefix_matches(self, prefix):
+        """Union of the posting lists of every token starting with prefix."""
+        vocabulary = self.vocabulary
+        matches = {}
+        # Walk the sorted vocabulary in place: slicing it would copy every
+        # token after the prefix on each query
+        for index in range(bisect.bisect_left(vocabulary, prefix), len(vocabulary)):
+            token = vocabulary[index]
+            if not token.startswith(prefix):
+                break
+            matches.update(self.postings[token])
+        return matches
+    
+    def search(self, terms=(), prefixes=(), sender=None, limit=None):
+        """Find messages matching every term and prefix.
+        
+        Args:
+            terms: Tokens that must appear exactly
+            prefixes: Token prefixes that must each match at least one token
+            sender: Only return messages from this sender (optional)
+            limit: Maximum number of results, newest kept (None for all)
+        
+        Returns:
+            list: Matching Message objects, oldest first
+        """
+        candidates = []
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                return []
+            candidates.append(posting)
+        for prefix in prefixes:
+            posting = self._prefix_matches(prefix)
+            if not posting:
+                return []
+            candidates.append(posting)
+        if sender is not None:
+            posting = self.senders.get(sender)
+            if not posting:
+                return []
+            candidates.append(posting)
+        if not candidates:
+            return []
+        
+        # Walk the smallest posting list and probe the others
+        candidates.sort(key=len)
+        smallest, others = candidates[0], candidates[1:]
+        results = [msg for msg in smallest if all(msg in other for other in others)]
+        # Wall clock timestamps can go back; seq follows storage order
+        results.sort(key=lambda msg: msg.seq)
+        if limit:
+            return results[-limit:]
+        return results
@@ -0,0 +1,218 @@
+"""
+Session encryption between the host and its clients.
+The PIN is never sent over the air. During the handshake both sides run
+SPAKE2 with it, which only gives them the same key if they used the same
+PIN, and leaves an eavesdropper or an impostor nothing to test PIN
+guesses against offline. The key is expanded once per session into one
+AES-GCM key per direction; after the handshake every frame travels
+inside a SEALED frame.
+
+Nonces are per-direction frame counters and are never sent: the link
+delivers in order, so a dropped, replayed or reordered frame fails to open.
+"""
+
+import hashlib
+import hmac
+import struct
+import threading
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from spake2 import SPAKE2_A, SPAKE2_B, SPAKEError
+
+from protocol import FRAME_HEADER, MAX_FRAME_SIZE, SEALED, FrameParser, ProtocolError, encode_frame
+
+
+CLIENT_ID = b"BluetoothMessenger client"
+HOST_ID = b"BluetoothMessenger host"
+SESSION_INFO = b"BluetoothMessenger session v1"
+
+TAG_SIZE = 16
+# 4 zero bytes, then the frame counter
+NONCE = struct.Struct("!4xQ")
+# Largest SEALED payload: a whole inner frame plus the tag
+MAX_SEALED_SIZE = FRAME_HEADER.size + MAX_FRAME_SIZE + TAG_SIZE
+# Socket methods that move data SecureSocket does not seal or open; the
+# wrapper refuses them rather than pass them to the raw socket
+UNSEALED_METHODS = frozenset((
+    "recvfrom", "recvfrom_into", "recvmsg", "recvmsg_into",
+    "sendto", "sendfile", "makefile", "dup",
+))
+
+
+class KeyExchange:
+    """One side of the PIN-authenticated key exchange."""
+    
+    def __init__(self, pin, is_host):
+        """
+        Args:
+            pin: The session PIN
+            is_host: True on the host, False on a client
+        """
+        side = SPAKE2_B if is_host else SPAKE2_A
+        self.spake = side(str(pin).encode('utf-8'), idA=CLIENT_ID, idB=HOST_ID)
+        self.is_host = is_host
+        self.message = self.spake.start()  # sent to the other side
+    
+    def finish(self, peer_message):
+        """Derive the session cipher from the other side's message.
+        
+        A wrong PIN is not detected here: both sides get a cipher, but
+        with different keys (see SessionCipher.confirmation).
+        
+        Args:
+            peer_message: The other side's exchange message
+        
+        Returns:
+            SessionCipher: Cipher for this session
+        
+        Raises:
+            ProtocolError: If the message is malformed
+        """
+        try:
+            key = self.spake.finish(peer_message)
+        except (SPAKEError, ValueError) as e:
+            raise ProtocolError(f"Key exchange failed: {e}")
+        return SessionCipher(key, self.is_host)
+
+
+class SessionCipher:
+    """AES-GCM keys and frame counters of one session."""
+    
+    def __init__(self, key, is_host):
+        """
+        Args:
+            key: Shared key from the key exchange
+            is_host: True on the host, False on a client
+        """
+        # Derived once per session; sealing a frame is a single AEAD call
+        okm = HKDF(algorithm=hashes.SHA256(), length=96, salt=None, info=SESSION_INFO).derive(key)
+        to_host, to_client, self.confirm_key = okm[:32], okm[32:64], okm[64:]
+        self.sealer = AESGCM(to_client if is_host else to_host)
+        self.opener = AESGCM(to_host if is_host else to_client)
+        self.sent = 0
+        self.received = 0
+    
+    def confirmation(self):
+        """Return the client's proof that it derived the same key."""
+        return hmac.new(self.confirm_key, b"client", hashlib.sha256).digest()
+    
+    def verify(self, confirmation):
+        """Check a client's confirmation in constant time.
+        
+        Returns:
+            bool: True if the client used the same PIN
+        """
+        return hmac.compare_digest(self.confirmation(), confirmation)
+    
+    def seal(self, data):
+        """Encrypt whole frames into one SEALED frame.
+        
+        Sealed frames must be written in the order they were sealed.
+        
+        Args:
+            data: One or more encoded frames
+        
+        Returns:
+            bytes: Encoded SEALED frame
+        """
+        nonce = NONCE.pack(self.sent)
+        self.sent += 1
+        return encode_frame(SEALED, self.sealer.encrypt(nonce, data, None))
+    
+    def open(self, payload):
+        """Decrypt the payload of the next SEALED frame.
+        
+        Returns:
+            bytes: The frames that were sealed
+        
+        Raises:
+            ProtocolError: If the frame was forged, altered or is out of order
+        """
+        nonce = NONCE.pack(self.received)
+        try:
+            data = self.opener.decrypt(nonce, payload, None)
+        except InvalidTag:
+            raise ProtocolError("Frame failed authentication")
+        self.received += 1
+        return data
+
+
+class SecureSocket:
+    """Socket wrapper that encrypts the connection once a session starts.
+    
+    Until start_encryption() is called data passes through unchanged, so
+    the handshake runs over the same wrapper. recv, recv_into, send,
+    sendall and sendmsg are encrypted; other methods that move data are
+    refused, and the rest are passed through to the wrapped socket.
+    """
+    
+    def __init__(self, sock):
+        self.sock = sock
+        self.cipher = None
+        self.parser = FrameParser(MAX_SEALED_SIZE)
+        self.plaintext = bytearray()
+        self.send_lock = threading.Lock()
+    
+    def start_encryption(self, cipher):
+        """Encrypt everything sent and received from now on.
+        
+        Args:
+            cipher: SessionCipher from the key exchange
+        """
+        self.cipher = cipher
+    
+    def recv(self, bufsize):
+        if self.cipher is None:
+            return self.sock.recv(bufsize)
+        while not self.plaintext:
+            data = self.sock.recv(bufsize)
+            if not data:
+                return b""
+            for frame_type, payload in self.parser.feed(data):
+                if frame_type != SEALED:
+                    raise ProtocolError("Unencrypted frame after the handshake")
+                self.plaintext += self.cipher.open(payload)
+        data = bytes(self.plaintext[:bufsize])
+        del self.plaintext[:bufsize]
+        return data
+    
+    def recv_into(self, buffer, nbytes=0):
+        data = self.recv(nbytes or len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+    
+    def sendall(self, data):
+        if self.cipher is None:
+            self.sock.sendall(data)
+            return
+        # Sealing and sending under one lock keeps the counters in step
+        # when several threads write to the same peer
+        with self.send_lock:
+            self.sock.sendall(self.cipher.seal(data))
+    
+    def send(self, data):
+        """Send all of data, as one sealed frame once encryption is on.
+        
+        Returns:
+            int: Bytes of data sent, always all of them
+        """
+        self.sendall(data)
+        return len(data)
+    
+    def sendmsg(self, buffers, ancdata=(), flags=0, address=None):
+        """Send the buffers joined, as one sealed frame once encryption is on.
+        
+        Returns:
+            int: Bytes sent, always all of them
+        """
+        if ancdata or flags or address is not None:
+            raise OSError("SecureSocket.sendmsg only sends data buffers")
+        return self.send(b"".join(buffers))
+    
+    def __getattr__(self, name):
+        if name in UNSEALED_METHODS:
+            raise AttributeError(f"SecureSocket does not support {name}(): it would bypass encryption")
+        return getattr(self.sock, name)
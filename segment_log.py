@@ -0,0 +1,229 @@
+"""
+Append-only segment log for message history.
+Messages are written to rolling segment files so the host can recover its
+history after a crash or restart. Whole segments are deleted once every
+message in them has expired.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_MAGIC = b"BTMLOG02"
+
+# crc32, timestamp, expiry deadline, sender length, content length
+RECORD_HEADER = struct.Struct("!IddHI")
+RECORD_TIMES = struct.Struct("!dd")
+
+
+class Segment:
+    """Metadata for a single segment file."""
+    
+    def __init__(self, path, first_timestamp, latest_expiry):
+        self.path = path
+        self.first_timestamp = first_timestamp
+        self.latest_expiry = latest_expiry
+        self.size = 0
+
+
+class SegmentLog:
+    """Append-only log split into segment files.
+    
+    Appends are buffered in memory and written with a single write + fsync
+    per batch, either when the buffer fills up or from a background flush
+    thread every ``sync_interval`` seconds.
+    """
+    
+    def __init__(self, directory, retention_seconds=300, segment_bytes=1024 * 1024,
+                 segment_seconds=30, sync_interval=0.2, buffer_bytes=64 * 1024):
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.sync_interval = sync_interval
+        self.buffer_bytes = buffer_bytes
+        
+        self.segments = []  # oldest first, last one is active
+        self.buffer = bytearray()
+        self.file = None
+        self.unsynced = False
+        self.lock = threading.Lock()
+        self.running = True
+        
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(SEGMENT_SUFFIX):
+                # Until replayed, estimate expiry from the last write time
+                path = os.path.join(directory, name)
+                mtime = os.path.getmtime(path)
+                segment = Segment(path, mtime, mtime + retention_seconds)
+                segment.size = os.path.getsize(path)
+                self.segments.append(segment)
+        self.next_index = 0
+        if self.segments:
+            last_name = os.path.basename(self.segments[-1].path)
+            self.next_index = int(last_name[:-len(SEGMENT_SUFFIX)]) + 1
+        
+        self.flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flush_thread.start()
+    
+    def replay(self, since=None):
+        """Read back all records, oldest first.
+        
+        Segments are memory-mapped and parsed in place. A torn or corrupt
+        record ends the segment it was found in.
+        
+        Args:
+            since: Skip records that expired before this time (epoch seconds)
+        
+        Yields:
+            tuple: (timestamp, sender, content bytes, expires_at)
+        """
+        for segment in list(self.segments):
+            latest_expiry = None
+            for record in self._read_segment(segment.path):
+                latest_expiry = max(latest_expiry or 0, record[3])
+                if since is None or record[3] > since:
+                    yield record
+            if latest_expiry is not None:
+                segment.latest_expiry = latest_expiry
+    
+    def _read_segment(self, path):
+        """Parse the records of one segment file."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= len(SEGMENT_MAGIC):
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    return
+                offset = len(SEGMENT_MAGIC)
+                end = len(data)
+                while offset + RECORD_HEADER.size <= end:
+                    crc, timestamp, expires_at, sender_len, content_len = RECORD_HEADER.unpack_from(data, offset)
+                    body_start = offset + RECORD_HEADER.size
+                    body_end = body_start + sender_len + content_len
+                    if body_end > end:
+                        break
+                    body = data[body_start:body_end]
+                    if zlib.crc32(body, zlib.crc32(RECORD_TIMES.pack(timestamp, expires_at))) != crc:
+                        break
+                    sender = body[:sender_len].decode("utf-8")
+                    content = bytes(body[sender_len:])
+                    yield timestamp, sender, content, expires_at
+                    offset = body_end
+    
+    def append(self, timestamp, sender, content, expires_at=None):
+        """Buffer a record for the next batched write.
+        
+        Args:
+            timestamp: Message time (epoch seconds)
+            sender: Identifier of the message sender
+            content: Message content (str or UTF-8 bytes)
+            expires_at: Expiry deadline (epoch seconds, default: timestamp + retention)
+        """
+        if expires_at is None:
+            expires_at = timestamp + self.retention_seconds
+        sender_bytes = sender.encode("utf-8")
+        content_bytes = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+        body = sender_bytes + content_bytes
+        crc = zlib.crc32(body, zlib.crc32(RECORD_TIMES.pack(timestamp, expires_at)))
+        
+        with self.lock:
+            segment = self._active_segment(timestamp)
+            self.buffer += RECORD_HEADER.pack(crc, timestamp, expires_at, len(sender_bytes), len(content_bytes))
+            self.buffer += body
+            segment.latest_expiry = max(segment.latest_expiry, expires_at)
+            segment.size += RECORD_HEADER.size + len(body)
+            self.unsynced = True
+            if len(self.buffer) >= self.buffer_bytes:
+                self._write_buffer(sync=False)
+    
+    def _active_segment(self, timestamp):
+        """Return the segment to append to, rolling over if needed."""
+        if self.file is not None:
+            segment = self.segments[-1]
+            if (segment.size < self.segment_bytes and
+                    timestamp - segment.first_timestamp < self.segment_seconds):
+                return segment
+            self._write_buffer(sync=True)
+            self.file.close()
+            self.file = None
+        
+        path = os.path.join(self.directory, f"{self.next_index:010d}{SEGMENT_SUFFIX}")
+        self.next_index += 1
+        segment = Segment(path, timestamp, timestamp)
+        self.file = open(path, "ab")
+        self.file.write(SEGMENT_MAGIC)
+        segment.size = len(SEGMENT_MAGIC)
+        self.segments.append(segment)
+        return segment
+    
+    def _write_buffer(self, sync):
+        """Write out buffered records. Caller must hold the lock."""
+        if self.file is None:
+            return
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+        self.file.flush()
+        if sync and self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = False
+    
+    def flush(self):
+        """Write and fsync everything appended so far."""
+        with self.lock:
+            self._write_buffer(sync=True)
+    
+    def _flush_loop(self):
+        """Background thread that syncs buffered records in batches."""
+        while self.running:
+            time.sleep(self.sync_interval)
+            self.flush()
+    
+    def expire(self, now=None):
+        """Delete segments whose records have all expired.
+        
+        Each segment tracks its latest expiry deadline, so checking one
+        costs O(1) no matter how many records it holds.
+        
+        Args:
+            now: Current time (epoch seconds, default: time.time())
+        
+        Returns:
+            int: Number of segments deleted
+        """
+        cutoff = now if now is not None else time.time()
+        kept = []
+        removed = 0
+        with self.lock:
+            for i, segment in enumerate(self.segments):
+                if segment.latest_expiry >= cutoff:
+                    kept.append(segment)
+                    continue
+                if i == len(self.segments) - 1 and self.file is not None:
+                    # Active segment: close it so the next append starts a new one
+                    self._write_buffer(sync=True)
+                    self.file.close()
+                    self.file = None
+                try:
+                    os.remove(segment.path)
+                except OSError:
+                    pass
+                removed += 1
+            self.segments = kept
+        return removed
+    
+    def close(self):
+        """Flush outstanding records and close the active segment."""
+        self.running = False
+        with self.lock:
+            if self.file is not None:
+                self._write_buffer(sync=True)
+                self.file.close()
+                self.file = None
@@ -0,0 +1,10 @@
+"""
+Shared setup for the test suite.
+The modules live at the repository root, so it goes on sys.path here,
+the same way the benchmarks find them.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
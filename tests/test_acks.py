@@ -0,0 +1,43 @@
+"""Tests for the ack window."""
+
+from acks import AckWindow
+
+
+def test_cumulative_ack_returns_items_in_order():
+    window = AckWindow(size=4)
+    for position in (1, 2, 3):
+        window.sent(position, f"item {position}")
+    acked, held = window.ack(2)
+    assert acked == [(1, "item 1"), (2, "item 2")]
+    assert not held
+    assert window.outstanding == 1
+    assert window.ack(2) == ([], False)
+    summary = window.summary()
+    assert (summary["outstanding"], summary["acked"], summary["held"]) == (1, 2, 0)
+
+
+def test_full_window_holds_until_acked():
+    window = AckWindow(size=2)
+    assert window.try_send(1)
+    assert window.try_send(2)
+    assert window.full()
+    assert not window.try_send(3)
+    # Later messages queue behind the held one even once there is room
+    assert window.ack(1) == ([(1, None)], True)
+    assert not window.try_send(4)
+    assert window.try_release(3)
+    assert not window.try_release(4)
+    assert window.ack(3)[1]
+    assert window.try_release(4)
+    assert window.summary()["held"] == 0
+    assert window.try_send(5)
+
+
+def test_drop_held_and_clear():
+    window = AckWindow(size=1)
+    window.sent(1, "kept")
+    assert not window.try_send(2)
+    window.drop_held()
+    assert window.summary()["held"] == 0
+    assert window.clear() == ["kept"]
+    assert window.outstanding == 0
@@ -0,0 +1,50 @@
+"""Tests for balancing peers over the host's adapters."""
+
+import socket
+
+from adapters import Adapter
+
+
+class PairTransport:
+    """Transport whose accept() hands out one end of a fresh socket pair."""
+    
+    def __init__(self):
+        self.remotes = []
+    
+    def listen(self, backlog=5):
+        return None
+    
+    def accept(self, server_socket):
+        local, remote = socket.socketpair()
+        self.remotes.append(remote)
+        return local, "peer"
+
+
+def make_group(count, capacity=None):
+    adapters = [Adapter(PairTransport(), capacity=capacity) for _ in range(count)]
+    for adapter in adapters:
+        adapter.group = adapters
+    return adapters
+
+
+def test_busier_adapter_sends_peers_elsewhere():
+    first, second = make_group(2)
+    sock, _ = first.accept()
+    assert sock is not None
+    assert first.accept()[0] is None
+    assert first.stats.redirected == 1
+    assert second.accept()[0] is not None
+    
+    # Once a peer leaves the first adapter it is the least loaded again
+    sock.close()
+    assert second.accept()[0] is None
+    assert first.accept()[0] is not None
+    assert [first.peers, second.peers] == [1, 1]
+
+
+def test_full_adapter_refuses():
+    adapter, = make_group(1, capacity=1)
+    assert adapter.accept()[0] is not None
+    assert adapter.accept()[0] is None
+    assert adapter.full
+    assert (adapter.stats.refused, adapter.stats.redirected) == (1, 0)
@@ -0,0 +1,27 @@
+"""Tests for the console renderer."""
+
+import io
+
+from console import Console
+from message_manager import Message
+
+
+def test_write_message_object():
+    stream = io.StringIO()
+    console = Console(stream=stream, interval=0)
+    msg = Message("alice", "hello")
+    console.write(msg)
+    console.write("after")
+    console.stop()
+    assert stream.getvalue() == f"{msg}\nafter\n"
+    assert not console.thread.is_alive()
+
+
+def test_write_coalesces_and_skips_beyond_max_pending():
+    stream = io.StringIO()
+    console = Console(stream=stream, interval=0, max_pending=2)
+    with console.cond:  # hold the renderer back while queueing
+        for i in range(5):
+            console.write(f"line {i}")
+    console.stop()
+    assert stream.getvalue() == "(3 lines not shown)\nline 3\nline 4\n"
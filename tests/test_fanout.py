@@ -0,0 +1,95 @@
+"""Tests for the broadcast fan-out pool."""
+
+import socket
+
+import pytest
+
+from acks import AckWindow
+from fanout import FanoutPool
+from lanes import CONTROL
+from protocol import FrameParser, decode_message, encode_message
+
+
+@pytest.fixture
+def pool():
+    pool = FanoutPool(workers=2)
+    yield pool
+    pool.stop()
+
+
+@pytest.fixture
+def peers():
+    """Connected (host end, peer end) socket pairs."""
+    pairs = [socket.socketpair() for _ in range(3)]
+    for host_end, peer_end in pairs:
+        peer_end.settimeout(5)
+    yield pairs
+    for pair in pairs:
+        for sock in pair:
+            sock.close()
+
+
+def read_seqs(sock, count, parser):
+    frames = []
+    while len(frames) < count:
+        frames.extend(parser.feed(sock.recv(65536)))
+    return [decode_message(payload)[0] for frame_type, payload in frames]
+
+
+def assert_nothing_more(sock):
+    sock.settimeout(0.2)
+    with pytest.raises(socket.timeout):
+        sock.recv(65536)
+    sock.settimeout(5)
+
+
+def chat(seq):
+    return encode_message(seq, 1.0, 2.0, "alice", f"message {seq}".encode('utf-8'))
+
+
+def test_broadcast_reaches_every_peer_but_the_excluded_one(pool, peers):
+    for host_end, peer_end in peers:
+        pool.add_peer(host_end)
+    fanouts = [pool.broadcast(chat(seq), exclude=peers[0][0]) for seq in range(1, 4)]
+    assert all(fanout.wait(5) for fanout in fanouts)
+    for host_end, peer_end in peers[1:]:
+        assert read_seqs(peer_end, 3, FrameParser()) == [1, 2, 3]
+    assert_nothing_more(peers[0][1])
+    assert pool.stats.summary()["broadcasts"] == 3
+
+
+def test_full_ack_window_holds_chat_until_acknowledged(pool, peers):
+    (slow, slow_end), (fast, fast_end) = peers[:2]
+    pool.add_peer(slow, AckWindow(size=2))
+    pool.add_peer(fast)
+    fanouts = [pool.broadcast(chat(seq)) for seq in range(1, 6)]
+    parser = FrameParser()
+    assert read_seqs(fast_end, 5, FrameParser()) == [1, 2, 3, 4, 5]
+    assert read_seqs(slow_end, 2, parser) == [1, 2]
+    assert_nothing_more(slow_end)
+    assert not fanouts[2].wait(0)
+    
+    # Control frames are not held behind the window
+    pool.broadcast(encode_message(0, 1.0, 2.0, "host", b"notice"), lane=CONTROL)
+    assert read_seqs(slow_end, 1, parser) == [0]
+    
+    pool.acknowledged(slow, 2)
+    assert read_seqs(slow_end, 2, parser) == [3, 4]
+    assert_nothing_more(slow_end)
+    pool.acknowledged(slow, 4)
+    assert read_seqs(slow_end, 1, parser) == [5]
+    assert all(fanout.wait(5) for fanout in fanouts)
+    assert pool.delivery_summary()[slow]["acked"] == 4
+
+
+def test_removing_a_peer_completes_its_held_fanouts(pool, peers):
+    slow, slow_end = peers[0]
+    pool.add_peer(slow, AckWindow(size=1))
+    fanouts = [pool.broadcast(chat(seq)) for seq in (1, 2, 3)]
+    assert fanouts[0].wait(5)
+    assert not fanouts[2].wait(0.1)
+    pool.remove_peer(slow)
+    assert all(fanout.wait(5) for fanout in fanouts)
+    assert pool.delivery_summary() == {}
+    # No peers left: the broadcast is complete as soon as it is made
+    assert pool.broadcast(chat(4)).wait(0)
@@ -0,0 +1,94 @@
+"""Loopback round trips between BluetoothHost and AsyncClient."""
+
+import asyncio
+import io
+
+import pytest
+
+pytest.importorskip("bluetooth")
+
+from async_client import AsyncClient, AuthenticationFailed
+from console import Console
+from host import BluetoothHost
+from message_manager import MessageManager
+from transport import LoopbackTransport
+
+
+@pytest.fixture
+def chat():
+    """A serving host, its transport and the PIN to join with."""
+    transport = LoopbackTransport()
+    host = BluetoothHost(transport=transport, console=Console(stream=io.StringIO()))
+    pin = host.auth.generate_pin()
+    host.serve()
+    yield host, transport, pin
+    host.shutdown()
+
+
+async def next_message(client):
+    return await asyncio.wait_for(client.messages().__anext__(), 5)
+
+
+def test_wrong_pin_is_rejected(chat):
+    host, transport, pin = chat
+    wrong = "000000" if pin != "000000" else "111111"
+    
+    async def main():
+        client = AsyncClient()
+        with pytest.raises(AuthenticationFailed):
+            await client.connect(transport, wrong)
+        await client.close()
+    
+    asyncio.run(main())
+
+
+def test_chat_ack_history_and_search(chat):
+    host, transport, pin = chat
+    
+    async def main():
+        store = MessageManager()
+        alice, bob = AsyncClient(history=0), AsyncClient(history=0, message_manager=store)
+        await alice.connect(transport, pin)
+        await bob.connect(transport, pin)
+        assert {name for peer_id, name in bob.roster.entries()} == {alice.peer_name, bob.peer_name}
+        
+        delivery = await alice.send("meeting at noon")
+        assert await asyncio.wait_for(delivery, 5)
+        msg = await next_message(bob)
+        assert (msg.sender, msg.content) == (alice.peer_name, "meeting at noon")
+        assert alice.delivery_stats()["acked"] == 1
+        
+        host.send_message("from the host")
+        assert (await next_message(alice)).content == "from the host"
+        assert (await next_message(bob)).content == "from the host"
+        
+        # A peer that joins later gets both messages as history
+        carol = AsyncClient()
+        await carol.connect(transport, pin)
+        assert [msg.content for msg in carol.history] == ["meeting at noon", "from the host"]
+        
+        assert [msg.sender for msg in host.message_manager.search("meet*")] == [alice.peer_name]
+        assert [msg.content for msg in store.search(f"noon from:{alice.peer_name}")] == ["meeting at noon"]
+        for client in (alice, bob, carol):
+            await client.close()
+        store.stop()
+    
+    asyncio.run(main())
+
+
+def test_reconnect_stops_the_previous_tasks(chat):
+    host, transport, pin = chat
+    
+    async def main():
+        client = AsyncClient(history=0)
+        await client.connect(transport, pin)
+        old_tasks = [client.receive_task, client.send_task, client.keepalive_task]
+        await client.connect(transport, pin)
+        assert all(task.done() for task in old_tasks)
+        assert not any(task in old_tasks for task in (client.receive_task, client.send_task, client.keepalive_task))
+        
+        host.send_message("after reconnect")
+        assert (await next_message(client)).content == "after reconnect"
+        await client.close()
+    
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""Tests for the priority lanes."""
+
+import threading
+
+from lanes import BULK, CONTROL, LaneQueue, LaneScheduler, LaneStats
+
+
+def test_control_first_without_starving_bulk():
+    scheduler = LaneScheduler(weights=(2, 1))
+    for i in range(3):
+        scheduler.push(BULK, f"b{i}")
+    for i in range(5):
+        scheduler.push(CONTROL, f"c{i}")
+    order = []
+    while True:
+        entry = scheduler.pop()
+        if entry is None:
+            break
+        order.append(entry)
+    assert order == [
+        (CONTROL, "c0"), (CONTROL, "c1"), (BULK, "b0"),
+        (CONTROL, "c2"), (CONTROL, "c3"), (BULK, "b1"),
+        (CONTROL, "c4"), (BULK, "b2"),
+    ]
+    assert len(scheduler) == 0
+
+
+def test_stats_drain_and_pop_item():
+    stats = LaneStats()
+    scheduler = LaneScheduler(stats=stats)
+    scheduler.push(BULK, "bulk")
+    scheduler.push(CONTROL, "control")
+    assert scheduler.pop_item() == "control"
+    summary = stats.summary()
+    assert summary["control"][0] == 1 and summary["bulk"][0] == 0
+    scheduler.push(BULK, "later")
+    assert scheduler.drain() == ["bulk", "later"]
+    assert scheduler.pop() is None
+
+
+def test_queue_get_many_and_close():
+    queue = LaneQueue()
+    for i in range(5):
+        queue.put(BULK, i)
+    queue.put(CONTROL, "c")
+    assert queue.get_many(3) == ["c", 0, 1]
+    assert queue.get() == (BULK, 2)
+    queue.close()
+    assert queue.get_many(10) == [3, 4]
+    assert queue.get_many(10) == []
+    assert queue.get() is None
+
+
+def test_queue_get_waits_for_put():
+    queue = LaneQueue()
+    results = []
+    thread = threading.Thread(target=lambda: results.append(queue.get()))
+    thread.start()
+    queue.put(CONTROL, "wake")
+    thread.join(5)
+    assert results == [(CONTROL, "wake")]
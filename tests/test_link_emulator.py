@@ -0,0 +1,33 @@
+"""Tests for the emulated Bluetooth link."""
+
+import time
+
+import pytest
+
+pytest.importorskip("bluetooth")
+
+from link_emulator import EmulatedLinkTransport, LinkConditions
+
+
+def test_closed_links_are_dropped_and_keep_their_counters():
+    transport = EmulatedLinkTransport(conditions=LinkConditions(latency=0, jitter=0, stall_probability=0))
+    server_socket = transport.inner.listen()
+    client = transport.inner.connect()
+    local, _ = transport.accept(server_socket)
+    
+    local.sendall(b"hello")
+    data = b""
+    while len(data) < 5:
+        data += client.recv(5)
+    assert data == b"hello"
+    assert len(transport.links) == 1
+    
+    client.close()
+    local.close()
+    deadline = time.monotonic() + 5
+    while transport.links and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert transport.links == []
+    stats = transport.stats()
+    assert (stats.bytes, stats.packets) == (5, 1)
+    server_socket.close()
@@ -0,0 +1,92 @@
+"""Tests for frame encoding and the payload codecs."""
+
+import socket
+from datetime import datetime
+
+import pytest
+
+from message_manager import Message
+from protocol import (
+    CHAT, FRAME_HEADER, MESSAGE, FrameParser, FrameReader, ProtocolError, decode_ack,
+    decode_history, decode_json, decode_message, encode_ack, encode_frame, encode_history,
+    encode_json, encode_message,
+)
+
+
+def test_parser_reassembles_frames_split_anywhere():
+    data = encode_frame(CHAT, b"first") + encode_frame(CHAT, b"") + encode_frame(MESSAGE, b"x" * 300)
+    for step in (1, 3, 7, len(data)):
+        parser = FrameParser()
+        frames = []
+        for start in range(0, len(data), step):
+            frames.extend(parser.feed(data[start:start + step]))
+        assert frames == [(CHAT, b"first"), (CHAT, b""), (MESSAGE, b"x" * 300)]
+        assert not parser.buffer
+
+
+def test_parser_rejects_oversized_frames():
+    parser = FrameParser(max_size=16)
+    with pytest.raises(ProtocolError):
+        parser.feed(FRAME_HEADER.pack(CHAT, 17))
+
+
+def test_frame_reader_returns_none_at_end_of_stream():
+    a, b = socket.socketpair()
+    a.sendall(encode_frame(CHAT, b"one") + encode_frame(CHAT, b"two"))
+    a.close()
+    reader = FrameReader(b)
+    assert reader.read_frame() == (CHAT, b"one")
+    assert reader.read_frame() == (CHAT, b"two")
+    assert reader.read_frame() is None
+    b.close()
+
+
+def test_message_round_trip():
+    outbound = encode_message(7, 1000.5, 1300.5, "alice", "héllo".encode('utf-8'))
+    assert outbound.seq == 7
+    assert outbound.size == len(outbound.joined())
+    [(frame_type, payload)] = FrameParser().feed(outbound.joined())
+    assert frame_type == MESSAGE
+    assert decode_message(payload) == (7, 1000.5, 1300.5, "alice", "héllo".encode('utf-8'))
+    with pytest.raises(ProtocolError):
+        decode_message(payload[:5])
+
+
+def test_send_vectored_writes_the_same_bytes():
+    outbound = encode_message(1, 1.0, 2.0, "bob", b"payload")
+    a, b = socket.socketpair()
+    outbound.send_vectored(a)
+    outbound.send(a)
+    frames = []
+    parser = FrameParser()
+    while len(frames) < 2:
+        frames.extend(parser.feed(b.recv(4096)))
+    assert frames[0] == frames[1]
+    a.close()
+    b.close()
+
+
+def test_ack_round_trip():
+    assert decode_ack(encode_ack(42)) == (42, set())
+    assert decode_ack(encode_ack(42, [40, 41])) == (42, {40, 41})
+    for payload in (b"", b"\x00" * 5):
+        with pytest.raises(ProtocolError):
+            decode_ack(payload)
+
+
+def test_history_round_trip():
+    messages = [Message("alice", "hi", datetime.fromtimestamp(1000), seq=1, expires_at=1300.0),
+                Message("bob", "", datetime.fromtimestamp(1001), seq=2, expires_at=1301.0)]
+    assert decode_history(encode_history(messages)) == [
+        (1, 1000.0, 1300.0, "alice", b"hi"),
+        (2, 1001.0, 1301.0, "bob", b""),
+    ]
+    with pytest.raises(ProtocolError):
+        decode_history(b"not compressed")
+
+
+def test_json_payloads():
+    assert decode_json(encode_json({"peer": "p1", "epoch": "e"})) == {"peer": "p1", "epoch": "e"}
+    for payload in (b"[1, 2]", b"{", b"\xff"):
+        with pytest.raises(ProtocolError):
+            decode_json(payload)
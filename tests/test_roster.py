@@ -0,0 +1,47 @@
+"""Tests for the versioned roster and its deltas."""
+
+import pytest
+
+from roster import JOIN, LEAVE, RENAME, Roster
+
+
+def test_deltas_keep_a_mirror_in_sync():
+    host = Roster()
+    alice = host.join("p1", "alice")
+    host.join("p2")
+    mirror = Roster()
+    mirror.load(host.snapshot())
+    assert alice == {"version": 1, "op": JOIN, "id": "p1", "name": "alice"}
+    
+    rename = host.rename("p2", "bob")
+    leave = host.leave("p1")
+    assert rename["op"] == RENAME and leave["op"] == LEAVE
+    assert mirror.apply(rename)
+    assert mirror.apply(leave)
+    assert mirror.entries() == host.entries() == [("p2", "bob")]
+    assert mirror.version == host.version == 4
+
+
+def test_deltas_already_in_the_snapshot_are_skipped():
+    host = Roster()
+    join = host.join("p1", "alice")
+    mirror = Roster()
+    mirror.load(host.snapshot())
+    assert not mirror.apply(join)
+    assert not mirror.apply({"version": "2", "op": JOIN, "id": "p2"})
+    assert len(mirror) == 1
+    assert host.leave("p9") is None
+
+
+def test_rename_rejects_taken_and_invalid_names():
+    roster = Roster()
+    roster.join("p1", "alice")
+    roster.join("p2", "bob")
+    for name in ("Alice", "p1", "host", " ", "x" * 33, "tab\there"):
+        with pytest.raises(ValueError):
+            roster.rename("p2", name)
+    with pytest.raises(ValueError):
+        roster.rename("p9", "carol")
+    assert roster.rename("p2", " carol ")["name"] == "carol"
+    assert roster.name("p2") == "carol"
+    assert roster.name("p9") == "p9"
@@ -0,0 +1,51 @@
+"""Tests for the inverted search index."""
+
+from datetime import datetime, timedelta
+
+from message_manager import Message
+from search_index import SearchIndex, parse_query
+
+
+def make_index(*messages):
+    index = SearchIndex()
+    for seq, msg in enumerate(messages, 1):
+        msg.seq = seq
+        index.add(msg)
+    return index
+
+
+def test_results_follow_seq_when_the_clock_goes_back():
+    now = datetime.now()
+    first = Message("alice", "meet at noon", now)
+    second = Message("bob", "meet later", now - timedelta(hours=1))
+    index = make_index(first, second)
+    assert index.search(["meet"]) == [first, second]
+    assert index.search(["meet"], limit=1) == [second]
+
+
+def test_terms_prefixes_and_sender():
+    hello = Message("alice", "Hello world")
+    help_ = Message("bob", "Need help with the world map")
+    other = Message("alice", "nothing here")
+    index = make_index(hello, help_, other)
+    assert index.search(*parse_query("WORLD")) == [hello, help_]
+    assert index.search(*parse_query("hel* world")) == [hello, help_]
+    assert index.search(*parse_query("world from:bob")) == [help_]
+    assert index.search(*parse_query("from:alice")) == [hello, other]
+    assert index.search(*parse_query("missing")) == []
+    assert index.search(*parse_query("zz*")) == []
+    assert index.search() == []
+
+
+def test_removed_messages_leave_the_vocabulary():
+    hello = Message("alice", "hello there")
+    index = make_index(hello, Message("bob", "there"))
+    index.remove(hello)
+    assert index.search(["hello"]) == []
+    assert "hello" not in index.vocabulary
+    assert index.search(*parse_query("from:alice")) == []
+    assert [msg.sender for msg in index.search(["there"])] == ["bob"]
+
+
+def test_parse_query():
+    assert parse_query("Meet* tomorrow from:peer3") == (["tomorrow"], ["meet"], "peer3")
@@ -0,0 +1,115 @@
+"""Tests for the key exchange, SEALED frames and SecureSocket."""
+
+import socket
+
+import pytest
+
+from protocol import CHAT, MESSAGE, SEALED, FrameParser, OutboundMessage, ProtocolError, encode_frame
+from secure_channel import KeyExchange, SecureSocket
+
+
+def session_ciphers(host_pin="123456", client_pin="123456"):
+    host = KeyExchange(host_pin, is_host=True)
+    client = KeyExchange(client_pin, is_host=False)
+    return host.finish(client.message), client.finish(host.message)
+
+
+@pytest.fixture
+def secure_pair():
+    """Connected (host, client) SecureSockets with encryption on."""
+    a, b = socket.socketpair()
+    host, client = SecureSocket(a), SecureSocket(b)
+    host_cipher, client_cipher = session_ciphers()
+    host.start_encryption(host_cipher)
+    client.start_encryption(client_cipher)
+    yield host, client
+    a.close()
+    b.close()
+
+
+def read_frames(sock, count):
+    parser = FrameParser()
+    frames = []
+    while len(frames) < count:
+        frames.extend(parser.feed(sock.recv(65536)))
+    return frames
+
+
+def test_matching_pins_confirm():
+    host, client = session_ciphers()
+    assert host.verify(client.confirmation())
+
+
+def test_wrong_pin_fails_confirmation():
+    host, client = session_ciphers(client_pin="654321")
+    assert not host.verify(client.confirmation())
+
+
+def test_seal_and_open_several_frames():
+    host, client = session_ciphers()
+    frames = encode_frame(CHAT, b"one") + encode_frame(CHAT, b"two")
+    parser = FrameParser()
+    (frame_type, payload), = parser.feed(host.seal(frames))
+    assert frame_type == SEALED
+    assert frames not in payload
+    assert client.open(payload) == frames
+
+
+def test_replayed_frame_fails_to_open():
+    host, client = session_ciphers()
+    (frame_type, payload), = FrameParser().feed(host.seal(encode_frame(CHAT, b"hi")))
+    client.open(payload)
+    with pytest.raises(ProtocolError):
+        client.open(payload)
+
+
+def test_tampered_frame_fails_to_open():
+    host, client = session_ciphers()
+    (frame_type, payload), = FrameParser().feed(host.seal(encode_frame(CHAT, b"hi")))
+    tampered = bytes([payload[0] ^ 1]) + payload[1:]
+    with pytest.raises(ProtocolError):
+        client.open(tampered)
+
+
+def test_sendall_and_recv(secure_pair):
+    host, client = secure_pair
+    frame = encode_frame(MESSAGE, b"x" * 1000)
+    host.sendall(frame)
+    assert read_frames(client, 1) == [(MESSAGE, b"x" * 1000)]
+
+
+def test_send_and_sendmsg_are_sealed(secure_pair):
+    host, client = secure_pair
+    OutboundMessage(encode_frame(CHAT, b"vectored")).send_vectored(host)
+    frame = encode_frame(CHAT, b"send")
+    assert host.send(frame) == len(frame)
+    # What actually crossed the wire
+    sealed = read_frames(client.sock, 2)
+    assert [frame_type for frame_type, payload in sealed] == [SEALED, SEALED]
+    assert not any(b"vectored" in payload or b"send" in payload for frame_type, payload in sealed)
+    opened = b"".join(client.cipher.open(payload) for frame_type, payload in sealed)
+    assert opened == encode_frame(CHAT, b"vectored") + frame
+
+
+def test_recv_into_opens_frames(secure_pair):
+    host, client = secure_pair
+    frame = encode_frame(CHAT, b"into")
+    host.sendall(frame)
+    buffer = bytearray(len(frame))
+    assert client.recv_into(buffer) == len(frame)
+    assert bytes(buffer) == frame
+
+
+def test_unsealed_methods_are_refused(secure_pair):
+    host, client = secure_pair
+    for name in ("sendto", "recvmsg", "recvfrom", "makefile", "sendfile", "dup"):
+        with pytest.raises(AttributeError):
+            getattr(host, name)
+    assert host.fileno() == host.sock.fileno()
+
+
+def test_unsealed_frame_after_handshake_is_rejected(secure_pair):
+    host, client = secure_pair
+    host.sock.sendall(encode_frame(CHAT, b"cleartext"))
+    with pytest.raises(ProtocolError):
+        client.recv(65536)
@@ -0,0 +1,58 @@
+"""Tests for the append-only segment log."""
+
+import os
+
+from segment_log import SegmentLog
+
+
+def make_log(directory, **kwargs):
+    kwargs.setdefault("sync_interval", 60)  # flushed explicitly by the tests
+    return SegmentLog(str(directory), **kwargs)
+
+
+def test_replay_after_reopening(tmp_path):
+    log = make_log(tmp_path)
+    log.append(1000.0, "alice", "hello", expires_at=2000.0)
+    log.append(1001.0, "bob", "wörld".encode('utf-8'))
+    log.close()
+    
+    reopened = make_log(tmp_path)
+    assert list(reopened.replay()) == [
+        (1000.0, "alice", b"hello", 2000.0),
+        (1001.0, "bob", "wörld".encode('utf-8'), 1301.0),
+    ]
+    assert [record[1] for record in reopened.replay(since=1500.0)] == ["alice"]
+    reopened.close()
+
+
+def test_torn_record_ends_the_segment(tmp_path):
+    log = make_log(tmp_path)
+    log.append(1000.0, "alice", "kept", expires_at=2000.0)
+    log.append(1001.0, "bob", "torn", expires_at=2000.0)
+    log.close()
+    [path] = [segment.path for segment in log.segments]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 2)
+    
+    reopened = make_log(tmp_path)
+    assert [record[2] for record in reopened.replay()] == [b"kept"]
+    reopened.close()
+
+
+def test_expire_deletes_only_fully_expired_segments(tmp_path):
+    log = make_log(tmp_path, segment_seconds=10)
+    log.append(1000.0, "alice", "old", expires_at=1100.0)
+    log.append(1020.0, "bob", "new", expires_at=1300.0)  # starts a second segment
+    log.flush()
+    assert len(log.segments) == 2
+    
+    assert log.expire(now=1200.0) == 1
+    assert len(os.listdir(tmp_path)) == 1
+    assert [record[2] for record in log.replay()] == [b"new"]
+    
+    # Expiring the active segment closes it, so the next append starts a new one
+    assert log.expire(now=1400.0) == 1
+    log.append(1500.0, "carol", "later", expires_at=1800.0)
+    log.flush()
+    assert [record[2] for record in log.replay()] == [b"later"]
+    log.close()
@@ -0,0 +1,148 @@
+"""
+Traffic traces: a compact binary record of every frame a host sends and
+receives, for reproducing real traffic in performance tests.
+
+A trace file starts with TRACE_MAGIC, followed by one record per frame:
+microseconds since recording started, connection id, direction, frame
+type and payload length, then the payload. A record with frame type
+CLOSED marks the end of a connection. PINs are removed from AUTH frames
+before they are written, but message content is kept, so treat traces
+like chat logs.
+"""
+
+import struct
+import threading
+import time
+
+from protocol import AUTH, FrameParser, ProtocolError, decode_json, encode_json
+
+
+TRACE_MAGIC = b"BTMTRC01"
+# microseconds since start, connection id, direction, frame type, payload length
+TRACE_RECORD = struct.Struct("!QIBBI")
+
+INBOUND = 0
+OUTBOUND = 1
+
+# Frame type of the record written when a connection closes
+CLOSED = 0
+
+
+class TraceRecorder:
+    """Writes frames from any number of connections to one trace file."""
+    
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(TRACE_MAGIC)
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.next_connection = 1
+    
+    def wrap(self, sock):
+        """Record the traffic of a newly accepted connection.
+        
+        Args:
+            sock: Client socket
+        
+        Returns:
+            RecordedSocket: Wrapper to use in place of sock
+        """
+        with self.lock:
+            connection = self.next_connection
+            self.next_connection += 1
+        return RecordedSocket(sock, self, connection)
+    
+    def record(self, connection, direction, frame_type, payload=b""):
+        """Append one frame to the trace.
+        
+        Args:
+            connection: Connection id
+            direction: INBOUND or OUTBOUND
+            frame_type: Frame type, or CLOSED
+            payload: Frame payload
+        """
+        if direction == INBOUND and frame_type == AUTH:
+            payload = _redact_pin(payload)
+        elapsed = int((time.monotonic() - self.started) * 1_000_000)
+        header = TRACE_RECORD.pack(elapsed, connection, direction, frame_type, len(payload))
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(header)
+                self.file.write(payload)
+    
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def _redact_pin(payload):
+    try:
+        request = decode_json(payload)
+    except ProtocolError:
+        return b""
+    request.pop("pin", None)
+    return encode_json(request)
+
+
+class RecordedSocket:
+    """Socket wrapper that records every frame sent or received.
+    
+    Anything other than recv, sendall and close is passed through to the
+    wrapped socket.
+    """
+    
+    def __init__(self, sock, recorder, connection):
+        self.sock = sock
+        self.recorder = recorder
+        self.connection = connection
+        self.inbound = FrameParser()
+        self.outbound = FrameParser()
+        self.send_lock = threading.Lock()
+        self.closed = False
+    
+    def recv(self, bufsize):
+        data = self.sock.recv(bufsize)
+        for frame_type, payload in self.inbound.feed(data):
+            self.recorder.record(self.connection, INBOUND, frame_type, payload)
+        return data
+    
+    def sendall(self, data):
+        with self.send_lock:
+            self.sock.sendall(data)
+            for frame_type, payload in self.outbound.feed(data):
+                self.recorder.record(self.connection, OUTBOUND, frame_type, payload)
+    
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.recorder.record(self.connection, INBOUND, CLOSED)
+        self.sock.close()
+    
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def read_trace(path):
+    """Iterate over the records of a trace file.
+    
+    Args:
+        path: Trace file written by TraceRecorder
+    
+    Yields:
+        tuple: (seconds since start, connection id, direction, frame type, payload)
+    
+    Raises:
+        ValueError: If the file is not a trace
+    """
+    with open(path, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a traffic trace")
+        while True:
+            header = f.read(TRACE_RECORD.size)
+            if len(header) < TRACE_RECORD.size:
+                break  # end of file, or a record cut short by a crash
+            elapsed, connection, direction, frame_type, length = TRACE_RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                break
+            yield elapsed / 1_000_000, connection, direction, frame_type, payload
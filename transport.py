@@ -0,0 +1,123 @@
+"""
+Listening and connecting endpoints for the host and clients.
+BluetoothTransport is the advertised RFCOMM service; LoopbackTransport
+stands in for it on 127.0.0.1 in benchmarks and trace replays, so they
+run without Bluetooth hardware.
+"""
+
+import asyncio
+import socket
+
+import bluetooth
+
+from async_client import SERVICE_NAME, open_bluetooth
+
+
+SERVICE_UUID = "00001101-0000-1000-8000-00805F9B34FB"
+
+
+class BluetoothTransport:
+    """RFCOMM endpoint advertised over SDP."""
+    
+    def __init__(self, address="", port=None):
+        """
+        Args:
+            address: Local adapter to listen on ("" for the default one),
+                or the host's address when connecting as a client
+            port: Host's RFCOMM port when connecting, if already known
+                from discovery (looked up with SDP if None); the channel to
+                listen on when listening (None for any free one)
+        """
+        self.address = address
+        self.port = port
+    
+    def listen(self, backlog=5):
+        """Open and advertise the server socket; the channel is stored in ``port``.
+        
+        Returns:
+            BluetoothSocket: Listening socket
+        """
+        server_socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+        server_socket.bind((self.address, bluetooth.PORT_ANY if self.port is None else self.port))
+        server_socket.listen(backlog)
+        self.port = server_socket.getsockname()[1]
+        
+        bluetooth.advertise_service(
+            server_socket,
+            SERVICE_NAME,
+            service_id=SERVICE_UUID,
+            service_classes=[SERVICE_UUID],
+            profiles=[(SERVICE_UUID, 0x0100)]
+        )
+        return server_socket
+    
+    def accept(self, server_socket):
+        """Wait for a connection.
+        
+        Returns:
+            tuple: (client socket, client address)
+        """
+        return server_socket.accept()
+    
+    async def open(self):
+        """Connect to the host as a client.
+        
+        Returns:
+            tuple: (StreamReader, StreamWriter)
+        """
+        return await open_bluetooth(self.address, self.port)
+
+
+class LoopbackTransport:
+    """TCP endpoint on the local machine that stands in for a radio."""
+    
+    def __init__(self, host="127.0.0.1", port=0):
+        """
+        Args:
+            host: Interface to listen on
+            port: TCP port (0 picks a free one when listening)
+        """
+        self.host = host
+        self.port = port
+    
+    def listen(self, backlog=5):
+        """Open the server socket; the chosen port is stored in ``port``.
+        
+        Returns:
+            socket.socket: Listening socket
+        """
+        # Benchmarks open many connections at once; a short queue would drop them
+        server_socket = socket.create_server((self.host, self.port), backlog=max(backlog, 128))
+        self.port = server_socket.getsockname()[1]
+        return server_socket
+    
+    def accept(self, server_socket):
+        """Wait for a connection.
+        
+        Returns:
+            tuple: (client socket, client address)
+        """
+        client_socket, client_info = server_socket.accept()
+        # Frames are small; do not let Nagle's algorithm hold them back
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return client_socket, client_info
+    
+    def connect(self):
+        """Connect with a blocking socket.
+        
+        Returns:
+            socket.socket: Connected socket
+        """
+        sock = socket.create_connection((self.host, self.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+    
+    async def open(self):
+        """Connect as an asyncio client.
+        
+        Returns:
+            tuple: (StreamReader, StreamWriter)
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return reader, writer